@@ -0,0 +1 @@
+"""Benchmarks of the bot. Run them from the lichess-bot directory with `python -m benchmarks.<name>`."""
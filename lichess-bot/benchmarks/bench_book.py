@@ -0,0 +1,114 @@
+"""
+Compare the latency of opening book lookups when the books are opened on every move and when they stay open.
+
+Run from the lichess-bot directory:
+    python -m benchmarks.bench_book [--book engines/book1.bin ...] [--entries 1000000] [--lookups 2000]
+
+Without `--book`, books of random entries are written to a temporary directory, with the positions of a few openings
+mixed in so that some lookups find a move.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import chess
+import chess.polyglot
+from collections.abc import Callable
+from lib.book import BookManager, encode_move, write_book
+
+OPENINGS = ["e2e4 e7e5 g1f3 b8c6 f1b5 a7a6 b5a4 g8f6 e1g1 f8e7",
+            "e2e4 c7c5 g1f3 d7d6 d2d4 c5d4 f3d4 g8f6 b1c3 a7a6",
+            "d2d4 g8f6 c2c4 e7e6 b1c3 f8b4 e2e3 e8g8 f1d3 d7d5",
+            "c2c4 e7e5 b1c3 g8f6 g1f3 b8c6 g2g3 d7d5 c4d5 f6d5"]
+
+
+def positions() -> list[chess.Board]:
+    """Get the positions of the openings, and the positions one random move away from them, which the books miss."""
+    generator = random.Random(1)
+    boards = []
+    for opening in OPENINGS:
+        board = chess.Board()
+        for uci in opening.split():
+            boards.append(board.copy())
+            missed = board.copy()
+            missed.push(generator.choice(list(missed.legal_moves)))
+            boards.append(missed)
+            board.push_uci(uci)
+    return boards
+
+
+def make_books(directory: str, count: int, entries: int) -> list[str]:
+    """Write `count` books of `entries` random entries each, plus the entries of the openings."""
+    generator = random.Random(0)
+    paths = []
+    for number in range(count):
+        rows = [(generator.getrandbits(64), generator.getrandbits(12), generator.randint(1, 100), 0)
+                for _ in range(entries)]
+        for opening in OPENINGS[number::count]:
+            board = chess.Board()
+            for uci in opening.split():
+                move = chess.Move.from_uci(uci)
+                rows.append((chess.polyglot.zobrist_hash(board), encode_move(board, move), 10, 0))
+                board.push(move)
+        path = os.path.join(directory, f"book{number}.bin")
+        write_book(path, rows)
+        paths.append(path)
+    return paths
+
+
+def reopen_lookup(books: list[str], board: chess.Board) -> bool:
+    """Look a position up the way get_book_move did: open, search and close every book."""
+    for book in books:
+        with chess.polyglot.open_reader(book) as reader:
+            if reader.get(board) is not None:
+                return True
+    return False
+
+
+def measure(lookup: Callable[[chess.Board], bool], boards: list[chess.Board], lookups: int) -> tuple[list[float], int]:
+    """Time `lookups` lookups, cycling through the positions, and count the hits."""
+    times = []
+    hits = 0
+    for index in range(lookups):
+        board = boards[index % len(boards)]
+        start = time.perf_counter()
+        hits += lookup(board)
+        times.append(time.perf_counter() - start)
+    return times, hits
+
+
+def main() -> None:
+    """Run the benchmark and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--book", action="append", help="A polyglot book to use instead of the random books.")
+    parser.add_argument("--books", type=int, default=2, help="The number of random books.")
+    parser.add_argument("--entries", type=int, default=500_000, help="The number of entries of each random book.")
+    parser.add_argument("--lookups", type=int, default=2000, help="The number of lookups to time.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        books = args.book or make_books(directory, args.books, args.entries)
+        boards = positions()
+        manager = BookManager()
+        start = time.perf_counter()
+        readers = [manager.book(book) for book in books]
+        open_time = time.perf_counter() - start
+
+        def managed_lookup(board: chess.Board) -> bool:
+            return any(reader.get(board) is not None for reader in readers)
+
+        sizes = ", ".join(f"{len(reader)} entries" for reader in readers)
+        print(f"{len(books)} books ({sizes}), {len(boards)} positions, opened and indexed in {open_time * 1000:.0f} ms")
+        print(f"{'path':<14}{'mean (us)':>12}{'median (us)':>14}{'p99 (us)':>12}{'hits':>8}")
+        for name, lookup in [("reopen", lambda board: reopen_lookup(books, board)), ("book manager", managed_lookup)]:
+            times, hits = measure(lookup, boards, args.lookups)
+            p99 = statistics.quantiles(times, n=100)[98]
+            print(f"{name:<14}{statistics.mean(times) * 1e6:>12.1f}{statistics.median(times) * 1e6:>14.1f}"
+                  f"{p99 * 1e6:>12.1f}{hits:>8}")
+        manager.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Compare the cost of a game state update when the prior game is a deep copy of the `Game` and when it is a snapshot.
+
+Run from the lichess-bot directory:
+    python -m benchmarks.bench_game_snapshot [--plies 20 100 300 600] [--updates 2000]
+
+For each game length, the benchmark times what the bot does with the prior game after every `gameState` event of a
+correspondence game: record it, then compare it with the next game state.
+"""
+import argparse
+import copy
+import datetime
+import random
+import time
+import chess
+from collections.abc import Callable
+from typing import Any
+from lib import model
+from lib.types import GameStateType
+
+
+def game_moves(plies: int) -> str:
+    """Get the moves of a random game of `plies` half moves (or fewer, if it ends earlier)."""
+    generator = random.Random(plies)
+    board = chess.Board()
+    while len(board.move_stack) < plies and not board.is_game_over():
+        board.push(generator.choice(list(board.legal_moves)))
+    return " ".join(move.uci() for move in board.move_stack)
+
+
+def correspondence_game(moves: str) -> model.Game:
+    """Make a correspondence game with these moves."""
+    state: GameStateType = {"type": "gameState", "moves": moves, "wtime": 259200000, "btime": 259200000, "winc": 0, "binc": 0,
+                            "status": "started"}
+    return model.Game({"id": "zzzzzzzz", "variant": {"key": "standard", "name": "Standard", "short": "Std"},
+                       "speed": "correspondence", "perf": {"name": "Correspondence"}, "rated": True,
+                       "createdAt": 1600000000000, "white": {"id": "bo", "name": "bo", "title": "BOT", "rating": 3000},
+                       "black": {"id": "b", "name": "b", "title": "BOT", "rating": 3000}, "initialFen": "startpos",
+                       "type": "gameFull", "state": state}, "bo", "https://lichess.org/", datetime.timedelta(seconds=20))
+
+
+def time_per_update(record: Callable[[model.Game], Any], compare: Callable[[model.Game, Any], bool], game: model.Game,
+                    updates: int) -> float:
+    """Get the average time to record the prior game and to compare the next game state with it."""
+    prior = record(game)
+    start = time.perf_counter()
+    for _ in range(updates):
+        game.state = game.state.copy()  # Each event of the stream is a new dict.
+        compare(game, prior)
+        prior = record(game)
+    return (time.perf_counter() - start) / updates
+
+
+def main() -> None:
+    """Run the benchmark and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--plies", type=int, nargs="+", default=[20, 100, 300, 600], help="The lengths of the games.")
+    parser.add_argument("--updates", type=int, default=2000, help="The number of game states timed for each game.")
+    args = parser.parse_args()
+
+    methods: dict[str, tuple[Callable[[model.Game], Any], Callable[[model.Game, Any], bool]]] = {
+        "copy.deepcopy(game)": (copy.deepcopy, lambda game, prior: bool(game.state["moves"] != prior.state["moves"])),
+        "game.snapshot()": (model.Game.snapshot, lambda game, prior: bool(game.state["moves"] != prior.moves))}
+    print(f"{'method':<22}{'plies':>8}{'us/update':>12}")
+    for plies in args.plies:
+        game = correspondence_game(game_moves(plies))
+        for name, (record, compare) in methods.items():
+            seconds = time_per_update(record, compare, game, args.updates)
+            print(f"{name:<22}{len(game.state['moves'].split()):>8}{seconds * 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Compare the event dispatch of the `multiprocessing.Manager` queues with the native queues the bot uses.
+
+Run from the lichess-bot directory:
+    python -m benchmarks.bench_ipc [--events 20000] [--rates 1000 10000 0] [--challenges 20]
+
+A producer process sends lichess-like events to the main process, as the control stream and the game processes do. At
+each rate (events per second, 0 for as fast as possible), the benchmark measures the throughput and the latency from
+`put` to `get`. It then measures the accesses the event loop makes to the challenge queue after every event.
+"""
+import argparse
+import multiprocessing
+import statistics
+import time
+from collections.abc import Callable
+from types import SimpleNamespace
+from typing import Any
+from lib.ipc import ChallengerNames
+
+EVENT = {"type": "gameState", "moves": "e2e4 e7e5 g1f3 b8c6 f1b5 a7a6", "wtime": 180000, "btime": 180000, "winc": 2000,
+         "binc": 2000, "status": "started"}
+
+
+def produce(queue: Any, events: int, rate: float) -> None:
+    """Send the events with the time they were sent, then `None`."""
+    interval = 1 / rate if rate else 0
+    start = time.perf_counter()
+    for index in range(events):
+        # Sleeping, like a producer waiting for the network, lets the feeder thread of a native queue run.
+        delay = start + index * interval - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        queue.put({**EVENT, "sent": time.perf_counter()})
+    queue.put(None)
+
+
+def dispatch(queue: Any, events: int, rate: float, task_done: bool) -> tuple[float, list[float]]:
+    """Receive the events of a producer process. Get the events per second and the latency of each event."""
+    producer = multiprocessing.Process(target=produce, args=(queue, events, rate))
+    latencies = []
+    producer.start()
+    start = time.perf_counter()
+    while (event := queue.get()) is not None:
+        latencies.append(time.perf_counter() - event["sent"])
+        if task_done:
+            queue.task_done()
+    elapsed = time.perf_counter() - start
+    producer.join()
+    return len(latencies) / elapsed, latencies
+
+
+def time_per_call(function: Callable[[], object], repeat: int) -> float:
+    """Get the average time of a call."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+def main() -> None:
+    """Run the benchmark and print tables."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=20000, help="The number of events sent at each rate.")
+    parser.add_argument("--rates", type=float, nargs="+", default=[1000, 10000, 0],
+                        help="The events per second sent by the producer. 0 sends them as fast as possible.")
+    parser.add_argument("--challenges", type=int, default=20, help="The number of challenges in the challenge queue.")
+    args = parser.parse_args()
+
+    manager = multiprocessing.Manager()
+    queues = {"Manager().Queue()": (manager.Queue(), True), "multiprocessing.Queue()": (multiprocessing.Queue(), False),
+              "multiprocessing.SimpleQueue()": (multiprocessing.SimpleQueue(), False)}
+    print(f"{'queue':<30}{'rate':>10}{'events/s':>12}{'p50 (us)':>12}{'p99 (us)':>12}{'max (us)':>12}")
+    for rate in args.rates:
+        for name, (queue, task_done) in queues.items():
+            throughput, latencies = dispatch(queue, args.events, rate, task_done)
+            percentiles = statistics.quantiles(latencies, n=100)
+            print(f"{name:<30}{rate or 'max':>10}{throughput:>12.0f}{percentiles[49] * 1e6:>12.0f}"
+                  f"{percentiles[98] * 1e6:>12.0f}{max(latencies) * 1e6:>12.0f}")
+
+    challenges = [SimpleNamespace(challenger=SimpleNamespace(name=f"challenger{index}")) for index in range(args.challenges)]
+    managed_list = manager.list(challenges)
+    plain_list = list(challenges)
+    names = ChallengerNames()
+    repeat = 2000
+
+    def managed_loop() -> None:
+        # The accesses of the event loop: `accept_challenges`, `matchmaker.challenge` and `check_in_on_correspondence_games`.
+        bool(managed_list)
+        len(managed_list)
+        bool(managed_list)
+
+    def native_loop() -> None:
+        bool(plain_list)
+        len(plain_list)
+        bool(plain_list)
+        names.publish(plain_list)  # type: ignore[arg-type]
+
+    print()
+    print(f"{'challenge queue':<25}{'per event (us)':>16}")
+    print(f"{'Manager().list()':<25}{time_per_call(managed_loop, repeat) * 1e6:>16.1f}")
+    print(f"{'list + ChallengerNames':<25}{time_per_call(native_loop, repeat) * 1e6:>16.1f}")
+    print(f"{'!queue, Manager().list()':<25}{time_per_call(lambda: list(reversed(managed_list)), repeat) * 1e6:>16.1f}")
+    print(f"{'!queue, ChallengerNames':<25}{time_per_call(names.names, repeat) * 1e6:>16.1f}")
+    manager.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Compare the time a game's thread spends logging the transcript of an LLM move with `QueueHandler` and with the lazy handler.
+
+Run from the lichess-bot directory:
+    python -m benchmarks.bench_logging [--rationale 4000] [--moves 2000]
+
+For each move, the homemade engines log the board state, the possible moves and the answers of the LLMs. The benchmark
+times these calls in the game's thread, up to the record being put in the logging queue. Sending the record to the
+logging listener and writing it are done by other threads and processes.
+"""
+import argparse
+import logging
+import logging.handlers
+import pprint
+import queue
+import time
+import chess
+from collections.abc import Callable
+from lib.structured_logging import GameFilter, LazyPformat, LazyQueueHandler, current_game, is_sampled
+
+
+def log_move_eagerly(logger: logging.Logger, board_state: dict[str, object], possible_moves: list[chess.Move],
+                     rationale: str) -> None:
+    """Log a move the way the homemade engines did: the values are pretty-printed before the call."""
+    logger.info("\n\nBOARD STATE: %s", pprint.pformat(board_state))
+    logger.info("POSSIBLE MOVES: %s", pprint.pformat(possible_moves))
+    logger.info("\n\n AGGREGATOR: %s", rationale)
+
+
+def log_move_lazily(logger: logging.Logger, board_state: dict[str, object], possible_moves: list[chess.Move],
+                    rationale: str) -> None:
+    """Log a move the way the homemade engines do: the values are pretty-printed when they are written."""
+    logger.info("\n\nBOARD STATE: %s", LazyPformat(board_state))
+    logger.info("POSSIBLE MOVES: %s", LazyPformat(possible_moves))
+    logger.info("\n\n AGGREGATOR: %s", rationale)
+
+
+def time_per_move(handler: logging.Handler, log_move: Callable[..., None], moves: int, rationale: str) -> float:
+    """Get the average time to log a move."""
+    logger = logging.getLogger("benchmark")
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    board = chess.Board("r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3")
+    board_state: dict[str, object] = {"type": "gameState", "moves": "e2e4 e7e5 g1f3 b8c6", "wtime": 60000,
+                                      "btime": 60000, "winc": 2000, "binc": 2000, "status": "started"}
+    possible_moves = list(board.legal_moves)
+    start = time.perf_counter()
+    for _ in range(moves):
+        log_move(logger, board_state, possible_moves, rationale)
+    return (time.perf_counter() - start) / moves
+
+
+def main() -> None:
+    """Run the benchmark and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rationale", type=int, default=4000, help="The characters of the answer of the LLM.")
+    parser.add_argument("--moves", type=int, default=2000, help="The number of moves timed.")
+    args = parser.parse_args()
+    rationale = ("The knight on c6 defends e5, so the best plan is to develop the bishop. " * args.rationale)[:args.rationale]
+
+    sample_rate = 0.1
+    unsampled_game = next(f"game{index}" for index in range(1000) if not is_sampled(f"game{index}", sample_rate))
+    current_game.set(unsampled_game)
+
+    records: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    lazy_handler = LazyQueueHandler(records)
+    sampled_handler = LazyQueueHandler(records)
+    sampled_handler.addFilter(GameFilter(sample_rate))
+    methods: dict[str, tuple[logging.Handler, Callable[..., None]]] = {
+        "QueueHandler + pformat": (logging.handlers.QueueHandler(records), log_move_eagerly),
+        "LazyQueueHandler": (lazy_handler, log_move_lazily),
+        f"game not sampled ({sample_rate})": (sampled_handler, log_move_lazily)}
+    print(f"{'method':<28}{'us/move':>10}")
+    for name, (handler, log_move) in methods.items():
+        seconds = time_per_move(handler, log_move, args.moves, rationale)
+        print(f"{name:<28}{seconds * 1e6:>10.1f}")
+        while not records.empty():
+            records.get_nowait()
+
+
+if __name__ == "__main__":
+    main()
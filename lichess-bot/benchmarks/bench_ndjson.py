@@ -0,0 +1,145 @@
+"""
+Compare the throughput of `Response.iter_lines` with `json.loads` and of the NDJSON reader the bot uses.
+
+Run from the lichess-bot directory:
+    python -m benchmarks.bench_ndjson [--stream game.ndjson ...] [--plies 300] [--repeat 20]
+
+The streams are replayed through a `requests.Response`, one chunk per line like the chunked streams of lichess.org. A
+stream can be recorded with e.g.
+    curl -N -H "Authorization: Bearer $TOKEN" https://lichess.org/api/bot/game/stream/GAME_ID > game.ndjson
+Without `--stream`, a game stream of `--plies` half moves is made up, with chat lines and keep-alive lines, and an event
+stream of challenges and game starts.
+"""
+import argparse
+import json
+import random
+import time
+import chess
+import requests
+from collections.abc import Callable, Iterable, Iterator
+from typing import Any
+from lib import ndjson
+
+
+class RecordedStream:
+    """The raw stream of a chunked response, which gives each chunk as it arrives."""
+
+    def __init__(self, chunks: list[bytes]) -> None:
+        """:param chunks: The chunks of the response."""
+        self.chunks = chunks
+
+    def stream(self, chunk_size: int, decode_content: bool = True) -> Iterator[bytes]:
+        """Give the chunks, cut at `chunk_size` bytes."""
+        for chunk in self.chunks:
+            for start in range(0, len(chunk), chunk_size):
+                yield chunk[start:start + chunk_size]
+
+
+def game_stream(plies: int) -> list[bytes]:
+    """Make up the stream of a game of `plies` half moves (or fewer, if it ends earlier)."""
+    generator = random.Random(plies)
+    board = chess.Board()
+    state = {"type": "gameState", "moves": "", "wtime": 180000, "btime": 180000, "winc": 2000, "binc": 2000,
+             "status": "started"}
+    events: list[dict[str, Any]] = [
+        {"id": "zzzzzzzz", "variant": {"key": "standard", "name": "Standard", "short": "Std"},
+         "clock": {"initial": 180000, "increment": 2000}, "speed": "blitz", "perf": {"name": "Blitz"}, "rated": True,
+         "createdAt": 1600000000000, "white": {"id": "bo", "name": "bo", "title": "BOT", "rating": 3000},
+         "black": {"id": "b", "name": "b", "title": "BOT", "rating": 3000}, "initialFen": "startpos", "type": "gameFull",
+         "state": state}]
+    while len(board.move_stack) < plies and not board.is_game_over():
+        board.push(generator.choice(list(board.legal_moves)))
+        events.append({**state, "moves": " ".join(move.uci() for move in board.move_stack),
+                       "wtime": 180000 - 500 * len(board.move_stack)})
+        if generator.random() < 0.1:
+            events.append({"type": "chatLine", "room": "player", "username": "b", "text": "Good move!"})
+    chunks = []
+    for event in events:
+        chunks.append(json.dumps(event).encode() + b"\n")
+        if generator.random() < 0.2:
+            chunks.append(b"\n")
+    return chunks
+
+
+def event_stream(events: int) -> list[bytes]:
+    """Make up an event stream of challenges and game starts, with keep-alive lines."""
+    chunks = []
+    for index in range(events):
+        if index % 3:
+            chunks.append(b"\n")
+        challenger = {"id": f"bot{index}", "name": f"Bot{index}", "title": "BOT", "rating": 2000 + index, "online": True}
+        chunks.append(json.dumps({"type": "challenge", "challenge": {
+            "id": f"c{index:07}", "url": f"https://lichess.org/c{index:07}", "status": "created", "challenger": challenger,
+            "destUser": {"id": "bo", "name": "bo", "title": "BOT", "rating": 3000}, "variant": {"key": "standard"},
+            "rated": True, "speed": "blitz", "timeControl": {"type": "clock", "limit": 180, "increment": 2},
+            "color": "random", "perf": {"name": "Blitz"}}}).encode() + b"\n")
+    return chunks
+
+
+def response(chunks: list[bytes]) -> requests.Response:
+    """Replay a recorded stream as a response."""
+    replay = requests.Response()
+    replay.raw = RecordedStream(chunks)
+    return replay
+
+
+def with_iter_lines(chunks: list[bytes]) -> int:
+    """Read a stream the way the bot used to: `iter_lines`, then `json.loads` on the decoded line."""
+    events = 0
+    for line in response(chunks).iter_lines():
+        if line:
+            json.loads(line.decode("utf-8"))
+        events += 1
+    return events
+
+
+def with_reader(decoder: Callable[[bytes], Any]) -> Callable[[list[bytes]], int]:
+    """Read a stream with the NDJSON reader and `decoder`."""
+    def read(chunks: list[bytes]) -> int:
+        return sum(1 for _ in ndjson.read_events(response(chunks).iter_content(ndjson.CHUNK_SIZE), decoder))
+    return read
+
+
+def time_reads(read: Callable[[list[bytes]], int], chunks: list[bytes], repeat: int) -> tuple[float, int]:
+    """Get the best time to read a stream, and the number of events read."""
+    best = float("inf")
+    events = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        events = read(chunks)
+        best = min(best, time.perf_counter() - start)
+    return best, events
+
+
+def read_recordings(paths: Iterable[str]) -> dict[str, list[bytes]]:
+    """Read recorded streams, one chunk per line."""
+    streams = {}
+    for path in paths:
+        with open(path, "rb") as recording:
+            streams[path] = [line if line.endswith(b"\n") else line + b"\n" for line in recording]
+    return streams
+
+
+def main() -> None:
+    """Run the benchmark and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stream", nargs="+", default=[], help="Recorded NDJSON streams to replay.")
+    parser.add_argument("--plies", type=int, default=300, help="The length of the made up game.")
+    parser.add_argument("--repeat", type=int, default=20, help="The number of times each stream is read.")
+    args = parser.parse_args()
+
+    streams = read_recordings(args.stream) or {f"game of {args.plies} plies": game_stream(args.plies),
+                                               "event stream": event_stream(2000)}
+    readers = {"iter_lines + json.loads": with_iter_lines, "read_events (json)": with_reader(ndjson.json_loads)}
+    if ndjson.json_decoder is not ndjson.json_loads:
+        readers["read_events (orjson)"] = with_reader(ndjson.json_decoder)
+    print(f"{'stream':<24}{'reader':<28}{'events':>8}{'MB':>8}{'events/s':>12}{'MB/s':>10}")
+    for name, chunks in streams.items():
+        size = sum(map(len, chunks)) / 1e6
+        for reader_name, read in readers.items():
+            seconds, events = time_reads(read, chunks, args.repeat)
+            print(f"{name[-24:]:<24}{reader_name:<28}{events:>8}{size:>8.2f}{events / seconds:>12.0f}{size / seconds:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
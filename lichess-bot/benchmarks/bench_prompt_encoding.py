@@ -0,0 +1,123 @@
+"""
+Compare the size of the LLM prompts, and the time to build them, for each prompt encoding.
+
+Run from the lichess-bot directory:
+    python -m benchmarks.bench_prompt_encoding [--pgn games.pgn] [--live openai|claude]
+
+Without `--pgn`, a few famous games are used. With `--live`, every prompt is also sent to the provider to measure the
+answer latency (this needs the API keys in llm_agents/api_keys.yaml and costs money).
+"""
+import argparse
+import io
+import statistics
+import time
+import chess
+import chess.pgn
+from collections import defaultdict
+from llm_agents.prompt_encoding import ENCODINGS, encode_position, count_tokens, get_token_encoder
+from llm_agents.prompts import chess_engine_prompt, master1_template, aggregator_moa_template
+
+GAMES = """
+[Event "Opera Game"]
+1. e4 e5 2. Nf3 d6 3. d4 Bg4 4. dxe5 Bxf3 5. Qxf3 dxe5 6. Bc4 Nf6 7. Qb3 Qe7 8. Nc3 c6 9. Bg5 b5 10. Nxb5 cxb5
+11. Bxb5+ Nbd7 12. O-O-O Rd8 13. Rxd7 Rxd7 14. Rd1 Qe6 15. Bxd7+ Nxd7 16. Qb8+ Nxb8 17. Rd8# 1-0
+
+[Event "Immortal Game"]
+1. e4 e5 2. f4 exf4 3. Bc4 Qh4+ 4. Kf1 b5 5. Bxb5 Nf6 6. Nf3 Qh6 7. d3 Nh5 8. Nh4 Qg5 9. Nf5 c6 10. g4 Nf6 11. Rg1 cxb5
+12. h4 Qg6 13. h5 Qg5 14. Qf3 Ng8 15. Bxf4 Qf6 16. Nc3 Bc5 17. Nd5 Qxb2 18. Bd6 Bxg1 19. e5 Qxa1+ 20. Ke2 Na6
+21. Nxg7+ Kd8 22. Qf6+ Nxf6 23. Be7# 1-0
+
+[Event "Game of the Century"]
+1. Nf3 Nf6 2. c4 g6 3. Nc3 Bg7 4. d4 O-O 5. Bf4 d5 6. Qb3 dxc4 7. Qxc4 c6 8. e4 Nbd7 9. Rd1 Nb6 10. Qc5 Bg4 11. Bg5 Na4
+12. Qa3 Nxc3 13. bxc3 Nxe4 14. Bxe7 Qb6 15. Bc4 Nxc3 16. Bc5 Rfe8+ 17. Kf1 Be6 18. Bxb6 Bxc4+ 19. Kg1 Ne2+ 20. Kf1 Nxd4+
+21. Kg1 Ne2+ 22. Kf1 Nc3+ 23. Kg1 axb6 24. Qb4 Ra4 25. Qxb6 Nxd1 26. h3 Rxa2 27. Kh2 Nxf2 28. Re1 Rxe1 29. Qd8+ Bf8
+30. Nxe1 Bd5 31. Nf3 Ne4 32. Qb8 b5 33. h4 h5 34. Ne5 Kg7 35. Kg1 Bc5+ 36. Kf1 Ng3+ 37. Ke1 Bb4+ 38. Kd1 Bb3+ 39. Kc1 Ne2+
+40. Kb1 Nc3+ 41. Kc1 Rc2# 0-1
+"""
+
+TEMPLATES = {"single agent": chess_engine_prompt, "proposer": master1_template, "aggregator": aggregator_moa_template}
+
+
+def read_games(pgn_text: str) -> list[chess.pgn.Game]:
+    """Parse all the games of a PGN text."""
+    games = []
+    pgn = io.StringIO(pgn_text)
+    while (game := chess.pgn.read_game(pgn)) is not None:
+        games.append(game)
+    return games
+
+
+def positions(games: list[chess.pgn.Game], step: int) -> list[chess.Board]:
+    """Get every `step`-th position of the games, with the moves that led to it."""
+    boards = []
+    for game in games:
+        board = game.board()
+        for ply, move in enumerate(game.mainline_moves(), start=1):
+            board.push(move)
+            if ply % step == 0 and not board.is_game_over():
+                boards.append(board.copy())
+    return boards
+
+
+def game_state(board: chess.Board) -> dict[str, object]:
+    """Make a lichess gameState event for a position, as the verbose encoding sends it."""
+    return {"type": "gameState", "moves": " ".join(move.uci() for move in board.move_stack), "wtime": 180000,
+            "btime": 180000, "winc": 2000, "binc": 2000, "status": "started"}
+
+
+def main() -> None:
+    """Run the benchmark and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pgn", help="A PGN file with the games to take the positions from.")
+    parser.add_argument("--step", type=int, default=4, help="Use every n-th position of each game.")
+    parser.add_argument("--live", choices=["openai", "claude"], help="Also measure the answer latency of a provider.")
+    args = parser.parse_args()
+
+    pgn_text = GAMES
+    if args.pgn:
+        with open(args.pgn) as pgn_file:
+            pgn_text = pgn_file.read()
+    boards = positions(read_games(pgn_text), args.step)
+    counted = "from tiktoken" if get_token_encoder() else "estimated (4 characters/token)"
+    print(f"{len(boards)} positions, token counts {counted}")
+
+    tokens: defaultdict[tuple[str, str], list[int]] = defaultdict(list)
+    build_times: defaultdict[str, list[float]] = defaultdict(list)
+    latencies: defaultdict[str, list[float]] = defaultdict(list)
+    for board in boards:
+        possible_moves = list(board.legal_moves)
+        for encoding in ENCODINGS:
+            start = time.perf_counter()
+            fields = encode_position(board, game_state(board), possible_moves, encoding)
+            prompts = {name: template.format(playing_as="White" if board.turn else "Black", previous_responses="",
+                                             **fields)
+                       for name, template in TEMPLATES.items()}
+            build_times[encoding].append(time.perf_counter() - start)
+            for name, prompt in prompts.items():
+                tokens[(encoding, name)].append(count_tokens(prompt))
+            if args.live:
+                # Imported here because llm_agents.llms reads the API keys of llm_agents/api_keys.yaml.
+                from llm_agents.llms import get_llm_response_claude, get_llm_response_openai
+                ask = get_llm_response_openai if args.live == "openai" else get_llm_response_claude
+                model = "gpt-4o" if args.live == "openai" else "claude-3-5-sonnet-20240620"
+                start = time.perf_counter()
+                ask(json_mode=True, system_prompt=prompts["single agent"], model=model)
+                latencies[encoding].append(time.perf_counter() - start)
+
+    header = f"{'encoding':<10}" + "".join(f"{name + ' tokens':>25}" for name in TEMPLATES) + f"{'build (us)':>12}"
+    if args.live:
+        header += f"{'latency (s)':>13}"
+    print(header)
+    for encoding in ENCODINGS:
+        row = f"{encoding:<10}"
+        for name in TEMPLATES:
+            counts = tokens[(encoding, name)]
+            row += f"{statistics.mean(counts):>14.0f} (max {max(counts):>4})"
+        row += f"{statistics.mean(build_times[encoding]) * 1e6:>12.0f}"
+        if args.live:
+            row += f"{statistics.mean(latencies[encoding]):>13.2f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
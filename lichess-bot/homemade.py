@@ -3,17 +3,21 @@ Some example classes for people who want to create a homemade bot.
 
 With these classes, bot makers will not have to implement the UCI or XBoard interfaces themselves.
 """
-import pprint
-import os
 import requests
-import json
 import yaml
 import chess
 from chess.engine import PlayResult, Limit
 import random
 from lib.engine_wrapper import MinimalEngine
-from lib.types import MOVE, HOMEMADE_ARGS_TYPE
+from lib.types import MOVE, HOMEMADE_ARGS_TYPE, COMMANDS_TYPE, OPTIONS_GO_EGTB_TYPE
+from lib.config import Configuration
+from lib import model as lichess_model
+from lib.move_history import MoveHistory
+from lib.structured_logging import TRANSCRIPT_LOGGER, LazyPformat
+from collections.abc import Callable
+from typing import Any, Optional
 import logging
+import threading
 from llm_agents.prompts import (
     chess_engine_prompt,
     master1_template, 
@@ -21,9 +25,17 @@ from llm_agents.prompts import (
     master3_template,
     proposer_moa_layer_n_template,
     aggregator_moa_template,
+    requery_template,
 )
 
-from llm_agents.llms import get_llm_response_groq, get_llm_response_openai, get_llm_response_claude
+from llm_agents.llms import get_llm_response_groq, get_llm_response_openai, get_llm_response_claude, get_llm_best_move_claude
+from llm_agents.executor import ProposerExecutor
+from llm_agents.budget import MoveBudget, OutOfTime, latencies, plan_layers, timed, time_for_move
+from llm_agents.alphabeta import Searcher, INFINITY
+from llm_agents.move_validation import LegalMoveIndex, validation_stats, answer_text
+from llm_agents.ponder import Ponderer
+from llm_agents.prompt_encoding import ENCODINGS, encode_position, token_stats
+from llm_agents.move_cache import MoveCache, open_move_cache, DEFAULT_PATH, DEFAULT_MAX_ENTRIES, DEFAULT_TTL
 
 
 
@@ -31,11 +43,20 @@ from llm_agents.llms import get_llm_response_groq, get_llm_response_openai, get_
 # logger.info("message") will always print "message" to the console or log file.
 # logger.debug("message") will only print "message" if verbose logging is enabled.
 logger = logging.getLogger(__name__)
+# The board states and the answers of the LLMs, which can be several KB for each move. They are only formatted when they
+# are written, and go to their own gzip file when `logging:transcript_file` is set.
+transcript_logger = logging.getLogger(TRANSCRIPT_LOGGER)
 
 global lichess_id 
 
 lichess_id = 'llmchess'
 
+# Expected seconds per call until the latency of a model has been measured.
+DEFAULT_LATENCY = {'gpt-4o': 8.0, 'claude-3-5-sonnet-20240620': 6.0}
+
+# The number of opponent replies the LLM agents prepare an answer for when pondering.
+DEFAULT_PONDER_MOVES = 2
+
 
 class ExampleEngine(MinimalEngine):
     """An example engine that all homemade engines inherit."""
@@ -43,163 +64,329 @@ class ExampleEngine(MinimalEngine):
     pass
 
 
-def load_game_state():
-    if os.path.exists("game_state.json"):
-        with open("game_state.json", "r") as file:
-            return json.load(file)
-    return {}
+class AlphaBetaEngine(ExampleEngine):
+    """A pure-Python alpha-beta search. It is also the fallback of the LLM agents."""
 
+    max_search_time = 10.0
 
-class SingleAgentLLM(MinimalEngine):
+    def __init__(self, commands: COMMANDS_TYPE, options: OPTIONS_GO_EGTB_TYPE, stderr: Optional[int],
+                 draw_or_resign: Configuration, game: Optional[lichess_model.Game] = None, name: Optional[str] = None,
+                 **popen_args: str) -> None:
+        """Start the engine with an empty transposition table, which is kept between the moves of the game."""
+        super().__init__(commands, options, stderr, draw_or_resign, game, name, **popen_args)
+        self.searcher = Searcher()
+
+    def search(self, board: chess.Board, time_limit: Limit, ponder: bool, draw_offered: bool, root_moves: MOVE) -> PlayResult:
+        """Search for at most `max_search_time` seconds, or less if the clock doesn't allow it."""
+        seconds = min(time_for_move(time_limit, board), self.max_search_time)
+        result = self.searcher.search(board, seconds, max_depth=time_limit.depth or 64, max_nodes=time_limit.nodes,
+                                      root_moves=root_moves if isinstance(root_moves, list) else None)
+        info: chess.engine.InfoDict = {"score": chess.engine.PovScore(chess.engine.Cp(result.score), board.turn),
+                                       "depth": result.depth,
+                                       "nodes": result.nodes}
+        return PlayResult(result.move, None, info, draw_offered=draw_offered)
+
+
+class LLMEngine(MinimalEngine):
+    """
+    The parent of the LLM agents.
+
+    Positions the agent has already answered are played from the move cache without asking the LLMs again.
+    The cache is configured in `homemade_options` with `llm_move_cache` (a file, or false to disable it),
+    `llm_move_cache_size` and `llm_move_cache_ttl` (in seconds).
+
+    Answers that are not exactly a possible UCI move are repaired if the move can be recognized (SAN, wrong case, extra
+    punctuation...), and otherwise the LLM is asked once more with a stricter prompt.
+    If the LLMs fail or answer with a move that can't be played, a short local alpha-beta search chooses the move.
+    With `llm_prefilter_moves: N` in `homemade_options`, the same search shortlists the N best moves that are shown to the
+    LLMs.
+    When pondering is enabled, the LLMs are asked about the positions after the `llm_ponder_moves` replies of the opponent
+    that the local search likes best, while the opponent is thinking.
+    """
+
+    prefilter_time = 0.1
+    requery_model = 'claude-3-5-sonnet-20240620'
+
+    model_id = ""
+
+    def __init__(self, commands: COMMANDS_TYPE, options: OPTIONS_GO_EGTB_TYPE, stderr: Optional[int],
+                 draw_or_resign: Configuration, game: Optional[lichess_model.Game] = None, name: Optional[str] = None,
+                 **popen_args: str) -> None:
+        """Open the move cache and read the `llm_*` options of `homemade_options`."""
+        super().__init__(commands, options, stderr, draw_or_resign, game, name, **popen_args)
+        cache_path = options.get("llm_move_cache", DEFAULT_PATH)
+        self.move_cache: Optional[MoveCache] = None
+        if cache_path:
+            self.move_cache = open_move_cache(str(cache_path),
+                                              int(str(options.get("llm_move_cache_size") or DEFAULT_MAX_ENTRIES)),
+                                              float(str(options.get("llm_move_cache_ttl") or DEFAULT_TTL)))
+        self.prefilter_moves = int(str(options.get("llm_prefilter_moves") or 0))
+        self.prompt_encoding = str(options.get("llm_prompt_encoding") or "compact")
+        if self.prompt_encoding not in ENCODINGS:
+            raise ValueError(f"Unknown llm_prompt_encoding {self.prompt_encoding!r}. Expected one of {', '.join(ENCODINGS)}.")
+        self.searcher = Searcher()
+        self.history: Optional[MoveHistory] = None
+        # The ponder threads share the searcher and the history with the main thread.
+        self.searcher_lock = threading.Lock()
+        self.history_lock = threading.Lock()
+        ponder_moves = int(str(options.get("llm_ponder_moves", DEFAULT_PONDER_MOVES) or 0))
+        self.ponderer = Ponderer(ponder_moves) if ponder_moves > 0 else None
+        # Each game has its own proposer threads, so the calls of one game (the game runner plays hundreds in one process)
+        # never wait for the calls of the others. Calls that missed a deadline may still be running when the next layer
+        # starts, so there are workers for two layers of proposers.
+        self.proposer_executor = ProposerExecutor(max_workers=6)
 
     def search(self, board: chess.Board, time_limit: Limit, ponder: bool, draw_offered: bool, root_moves: MOVE) -> PlayResult:
+        """Play the cached or pondered move of the position if there is one, else ask the LLMs with `think`."""
+        budget = MoveBudget(time_limit, board)
+        logger.info("Time budget for this move: %.1f seconds", budget.seconds)
+        # Only cache the answers to unrestricted searches. The tablebases may restrict the moves to choose from.
+        use_cache = self.move_cache is not None and not isinstance(root_moves, list)
+        agent = self.__class__.__name__
+        move: Optional[chess.Move] = None
+        if use_cache and self.move_cache is not None:
+            move = self.move_cache.get(board, agent, self.model_id)
+            logger.info("LLM move cache %s: %s", "hit" if move else "miss", self.move_cache.stats())
 
         possible_moves = root_moves if isinstance(root_moves, list) else list(board.legal_moves)
-        logging.info("POSSIBLE MOVES: %s", pprint.pformat(possible_moves))
-        move_history = list(board.move_stack)
-        white_moves = [move for index, move in enumerate(move_history) if index % 2 == 0]
-        black_moves = [move for index, move in enumerate(move_history) if index % 2 == 1]
-        playing_as = 'White' if board.turn == chess.WHITE else 'Black'
-        board_state = load_game_state()
-        logger.info("\n\nBOARD STATE ♟️: %s", pprint.pformat(board_state))
-        model = 'claude-3-5-sonnet-20240620'
-        master1_system_prompt = chess_engine_prompt.format(playing_as=playing_as, 
-                                                        board_state=board_state, 
-                                                        white_moves=white_moves, 
-                                                        black_moves=black_moves, 
-                                                        possible_moves=possible_moves
-                                                        )
-        
-        master1_response = get_llm_response_claude(json_mode=True, system_prompt=master1_system_prompt, temperature=0, model=model)
-        logger.info("\n\n CHESS MASTER ♞: %s", master1_response)
-
-        move = master1_response['best_move']
+        if move is None and self.ponderer is not None:
+            move = self.ponderer.take(board, budget.remaining())
+            if move is not None and move in possible_moves:
+                logger.info("Ponder hit: %s", board.san(move))
+                if use_cache and self.move_cache is not None:
+                    self.move_cache.put(board, agent, self.model_id, move.uci())
+            else:
+                move = None
+
+        if move is None:
+            possible_moves = self.shortlist(board, possible_moves)
+            move = self.think(board, possible_moves, budget)
+            if move is None:
+                move = budget.fallback_move(board, possible_moves)
+            elif use_cache and self.move_cache is not None:
+                self.move_cache.put(board, agent, self.model_id, move.uci())
+
+        if ponder and self.ponderer is not None:
+            position = board.copy()
+            position.push(move)
+            self.ponderer.start(position, lambda guess: self.ponder_on(guess, time_limit))
         return PlayResult(move, None, draw_offered=draw_offered)
-    
-
 
-# Agent
-class LLMMultiAgent(MinimalEngine):
+    def ponder_on(self, board: chess.Board, time_limit: Limit) -> Optional[chess.Move]:
+        """Prepare the answer to a guessed move of the opponent. This runs while the opponent is thinking."""
+        return self.think(board, self.shortlist(board, list(board.legal_moves)), MoveBudget(time_limit, board))
+
+    def think(self, board: chess.Board, possible_moves: list[chess.Move], budget: MoveBudget) -> Optional[chess.Move]:
+        """Ask the LLMs for a move. Return `None` if they fail, run out of time or don't choose one of the possible moves."""
+        try:
+            answer = self.choose_move(board, possible_moves, budget)
+        except OutOfTime:
+            logger.warning("No time left for the LLMs.")
+            return None
+        except Exception:
+            logger.exception("The LLMs failed to choose a move.")
+            return None
+
+        move, outcome = self.validate(board, LegalMoveIndex(board, possible_moves), answer, budget)
+        validation_stats.add(outcome)
+        return move
+
+    def validate(self, board: chess.Board, index: LegalMoveIndex, answer: object,
+                 budget: MoveBudget) -> tuple[Optional[chess.Move], str]:
+        """
+        Turn the LLMs' answer into one of the possible moves.
+
+        :return: The move (`None` if the answer can't be used) and how it was found: "valid", "repaired", "requeried" or
+            "failed".
+        """
+        text = answer_text(answer)
+        move = index.exact(text)
+        if move is not None:
+            return move, "valid"
+        move = index.repair(text)
+        if move is not None:
+            logger.info("Repaired the LLM answer %r to %s.", text, move.uci())
+            return move, "repaired"
+
+        logger.warning("The LLMs chose %r, which is not one of the possible moves.", text)
+        model = self.requery_model
+        if not budget.can_afford(self.expected_latency(model)):
+            return None, "failed"
+        requery_prompt = requery_template.format(playing_as='White' if board.turn == chess.WHITE else 'Black',
+                                                 fen=board.fen(),
+                                                 answer=text,
+                                                 legal_moves=" ".join(move.uci() for move in index.possible_moves))
+        try:
+            requery_answer = timed(model, lambda: get_llm_best_move_claude(requery_prompt, index.possible_moves, model=model,
+                                                                           timeout=budget.call_timeout()))
+        except Exception:
+            logger.exception("The LLM failed to answer the re-query.")
+            return None, "failed"
+        requery_text = answer_text(requery_answer)
+        move = index.exact(requery_text) or index.repair(requery_text)
+        return (move, "requeried") if move is not None else (None, "failed")
+
+    def get_stats(self, for_chat: bool = False) -> list[str]:
+        """Get the stats of the engine, and of the LLM answers, prompts and pondering in the logs."""
+        stats = super().get_stats(for_chat)
+        if not for_chat:
+            stats.append(f"LLM answers: {validation_stats}")
+            stats.append(f"LLM prompts: {token_stats}")
+            if self.ponderer is not None:
+                stats.append(f"LLM ponder: {self.ponderer}")
+        return stats
+
+    def quit(self) -> None:
+        """Stop pondering and the proposer threads."""
+        if self.ponderer is not None:
+            self.ponderer.shutdown()
+        self.proposer_executor.shutdown()
+        super().quit()
+
+    def shortlist(self, board: chess.Board, possible_moves: list[chess.Move]) -> list[chess.Move]:
+        """Keep the `llm_prefilter_moves` moves that a short local search likes best."""
+        if not self.prefilter_moves or len(possible_moves) <= self.prefilter_moves:
+            return possible_moves
+        with self.searcher_lock:
+            result = self.searcher.search(board, self.prefilter_time, root_moves=possible_moves)
+        ranked = sorted(possible_moves, key=lambda move: (move == result.move, result.root_scores.get(move, -INFINITY)),
+                        reverse=True)
+        return ranked[:self.prefilter_moves]
+
+    def choose_move(self, board: chess.Board, possible_moves: list[chess.Move], budget: MoveBudget) -> str:
+        """Ask the LLMs for a move. Raise `OutOfTime` if the next call can't finish before `budget.deadline`."""
+        raise NotImplementedError("The choose_move method is not implemented")
+
+    def expected_latency(self, model: str) -> float:
+        """Get how long a call to the model is expected to take."""
+        return latencies.estimate(model, DEFAULT_LATENCY.get(model, 10.0))
+
+    def prompt_fields(self, board: chess.Board, possible_moves: list[chess.Move]) -> dict[str, Any]:
+        """Get the fields shared by all the prompt templates, encoded with `llm_prompt_encoding`."""
+        board_state = self.game_state()
+        transcript_logger.info("\n\nBOARD STATE ♟️: %s", LazyPformat(board_state))
+        with self.history_lock:
+            if self.history is None:
+                self.history = MoveHistory(board.root())
+            position = encode_position(board, board_state, possible_moves, self.prompt_encoding, self.history)
+        return dict(playing_as='White' if board.turn == chess.WHITE else 'Black', **position)
+
+    def render(self, template: str, fields: dict[str, Any], **extra_fields: Any) -> str:
+        """Fill in a prompt template and count its tokens."""
+        prompt = template.format(**fields, **extra_fields)
+        tokens = token_stats.add(self.prompt_encoding, prompt)
+        logger.debug("Prompt of %d tokens (%s encoding)", tokens, self.prompt_encoding)
+        return prompt
+
+
+class SingleAgentLLM(LLMEngine):
+
+    model_id = 'claude-3-5-sonnet-20240620'
+
+    def choose_move(self, board: chess.Board, possible_moves: list[chess.Move], budget: MoveBudget) -> str:
+
+        transcript_logger.info("POSSIBLE MOVES: %s", LazyPformat(possible_moves))
+        fields = self.prompt_fields(board, possible_moves)
+        model = 'claude-3-5-sonnet-20240620'
+        master1_system_prompt = self.render(chess_engine_prompt, fields)
 
-    def search(self, board: chess.Board, time_limit: Limit, ponder: bool, draw_offered: bool, root_moves: MOVE) -> PlayResult:
+        if not budget.can_afford(self.expected_latency(model)):
+            raise OutOfTime()
+        return timed(model, lambda: get_llm_best_move_claude(
+            master1_system_prompt, possible_moves, temperature=0, model=model, timeout=budget.call_timeout(),
+            on_complete=lambda response: transcript_logger.info("\n\n CHESS MASTER ♞: %s", response)))
 
-        possible_moves = root_moves if isinstance(root_moves, list) else list(board.legal_moves)
-        move_history = list(board.move_stack)
-        white_moves = [move for index, move in enumerate(move_history) if index % 2 == 0]
-        black_moves = [move for index, move in enumerate(move_history) if index % 2 == 1]
-        playing_as = 'White' if board.turn == chess.WHITE else 'Black'
-        board_state = load_game_state()
-        logger.info("\n\nBOARD STATE ♟️: %s", pprint.pformat(board_state))
 
+# Agent
+class LLMMultiAgent(LLMEngine):
 
-        model = 'claude-3-5-sonnet-20240620'
-        master1_system_prompt = master1_template.format(playing_as=playing_as, 
-                                                        board_state=board_state, 
-                                                        white_moves=white_moves, 
-                                                        black_moves=black_moves, 
-                                                        possible_moves=possible_moves
-                                                        )
-        
-        master1_response = get_llm_response_claude(json_mode=False, system_prompt=master1_system_prompt, model=model)
-        logger.info("\n\n CHESS MASTER 1 ♟️: %s", master1_response)
-
-        master2_system_prompt = master2_template.format(playing_as=playing_as, 
-                                                        board_state=board_state, 
-                                                        white_moves=white_moves, 
-                                                        black_moves=black_moves, 
-                                                        proposed_moves=master1_response
-                                                        )
-        master2_response = get_llm_response_claude(json_mode=False, system_prompt=master2_system_prompt, model=model)
-        logger.info("\n\n CHESS MASTER 2 ♟️: %s", master2_response)
-
-        master3_response = master3_template.format(playing_as=playing_as,
-                                                    board_state=board_state,
-                                                    white_moves=white_moves,
-                                                    black_moves=black_moves,
-                                                    proposed_moves=master1_response,
-                                                    possible_moves=possible_moves,
-                                                    responses=master2_response
-                                                    )
-        
-        master3_response = get_llm_response_claude(json_mode=True, system_prompt=master3_response, model=model)
-        logger.info("\n\n CHESS MASTER 3 ♟️: %s", master3_response)
-
-        move = master3_response['best_move']
-        return PlayResult(move, None, draw_offered=draw_offered)
-    
-class LLMMixtureofAgents(MinimalEngine):
+    model_id = 'claude-3-5-sonnet-20240620'
 
-    def search(self, board: chess.Board, time_limit: Limit, ponder: bool, draw_offered: bool, root_moves: MOVE) -> PlayResult:
+    def choose_move(self, board: chess.Board, possible_moves: list[chess.Move], budget: MoveBudget) -> str:
 
-        possible_moves = root_moves if isinstance(root_moves, list) else list(board.legal_moves)
-        move_history = list(board.move_stack)
-        white_moves = [move for index, move in enumerate(move_history) if index % 2 == 0]
-        black_moves = [move for index, move in enumerate(move_history) if index % 2 == 1]
-        playing_as = 'White' if board.turn == chess.WHITE else 'Black'
-        board_state = load_game_state()
-        logger.info("\n\nBOARD STATE ♟️: %s", pprint.pformat(board_state))
-
-        proposer_layer1_prompt = master1_template.format(playing_as=playing_as, 
-                                                        board_state=board_state, 
-                                                        white_moves=white_moves, 
-                                                        black_moves=black_moves, 
-                                                        possible_moves=possible_moves
-                                       )
-        
-        
-        model = 'gpt-4o'
-        proposer_1_1 = get_llm_response_openai(json_mode=False, system_prompt=proposer_layer1_prompt, model=model, temperature=0.5)
-        logger.info("\n\n PROPOSER 1_1 ♟️: %s", proposer_1_1)
-        proposer_1_2 = get_llm_response_openai(json_mode=False, system_prompt=proposer_layer1_prompt, model=model, temperature=0.5)
-        logger.info("\n\n PROPOSER 1_2 ♟️: %s", proposer_1_2)
-        proposer_1_3 = get_llm_response_openai(json_mode=False, system_prompt=proposer_layer1_prompt, model=model, temperature=0.5)
-        logger.info("\n\n PROPOSER 1_3 ♟️: %s", proposer_1_3)
-
-        proposer_2_1_prompt = proposer_moa_layer_n_template.format(playing_as=playing_as, 
-                                                        board_state=board_state, 
-                                                        white_moves=white_moves, 
-                                                        black_moves=black_moves, 
-                                                        possible_moves=possible_moves,
-                                                        previous_responses=proposer_1_1
-                                                        )
-        proposer_2_2_prompt = proposer_moa_layer_n_template.format(playing_as=playing_as,
-                                                        board_state=board_state, 
-                                                        white_moves=white_moves, 
-                                                        black_moves=black_moves, 
-                                                        possible_moves=possible_moves,
-                                                        previous_responses=proposer_1_2
-                                                        )
-        proposer_2_3_prompt = proposer_moa_layer_n_template.format(playing_as=playing_as,
-                                                        board_state=board_state, 
-                                                        white_moves=white_moves, 
-                                                        black_moves=black_moves, 
-                                                        possible_moves=possible_moves,
-                                                        previous_responses=proposer_1_3
-                                                        )
-        
-        proposer_2_1 = get_llm_response_openai(json_mode=False, system_prompt=proposer_2_1_prompt, model=model, temperature=0.5)
-        logger.info("\n\n PROPOSER 2_1 ♟️: %s", proposer_2_1)
-        proposer_2_2 = get_llm_response_openai(json_mode=False, system_prompt=proposer_2_2_prompt, model=model, temperature=0.5)
-        logger.info("\n\n PROPOSER 2_2 ♟️: %s", proposer_2_2)
-        proposer_2_3 = get_llm_response_openai(json_mode=False, system_prompt=proposer_2_3_prompt, model=model, temperature=0.5)
-        logger.info("\n\n PROPOSER 2_3 ♟️: %s", proposer_2_3)
-
-
-        final_layers_concatenated_responses = proposer_2_1 + proposer_2_2 + proposer_2_3
-
-
-        aggregator_prompt = aggregator_moa_template.format(playing_as=playing_as,
-                                                        board_state=board_state, 
-                                                        white_moves=white_moves, 
-                                                        black_moves=black_moves, 
-                                                        previous_responses=final_layers_concatenated_responses
-                                                        )
-        
+        fields = self.prompt_fields(board, possible_moves)
         model = 'claude-3-5-sonnet-20240620'
-        aggregator_response = get_llm_response_claude(json_mode=True, system_prompt=aggregator_prompt, model=model)
-        logger.info("\n\n AGGREGATOR ♟️: %s", aggregator_response)
-        
-
-  
-        move = aggregator_response['best_move']
-        return PlayResult(move, None, draw_offered=draw_offered)
\ No newline at end of file
+        latency = self.expected_latency(model)
+
+        # The three masters run one after the other. Without time for at least two calls, a single master answers.
+        if not budget.can_afford(2 * latency):
+            if not budget.can_afford(latency):
+                raise OutOfTime()
+            single_agent_prompt = self.render(chess_engine_prompt, fields)
+            return timed(model, lambda: get_llm_best_move_claude(
+                single_agent_prompt, possible_moves, model=model, timeout=budget.call_timeout(),
+                on_complete=lambda response: transcript_logger.info("\n\n CHESS MASTER ♞: %s", response)))
+
+        master1_system_prompt = self.render(master1_template, fields)
+        master1_response = str(timed(model, lambda: get_llm_response_claude(
+            json_mode=False, system_prompt=master1_system_prompt, model=model, timeout=budget.call_timeout())))
+        transcript_logger.info("\n\n CHESS MASTER 1 ♟️: %s", master1_response)
+        budget.add_candidates(master1_response, possible_moves)
+
+        # Master 2 predicts the opponent's responses. It is skipped if there is only time left for master 3.
+        if budget.can_afford(2 * self.expected_latency(model)):
+            master2_system_prompt = self.render(master2_template, fields, proposed_moves=master1_response)
+            master2_response = str(timed(model, lambda: get_llm_response_claude(
+                json_mode=False, system_prompt=master2_system_prompt, model=model, timeout=budget.call_timeout())))
+            transcript_logger.info("\n\n CHESS MASTER 2 ♟️: %s", master2_response)
+        else:
+            master2_response = "There was no time to analyse the opponent's responses."
+            transcript_logger.info("\n\n CHESS MASTER 2 ♟️: skipped to save time")
+
+        if not budget.can_afford(self.expected_latency(model)):
+            raise OutOfTime()
+        master3_prompt = self.render(master3_template, fields,
+                                     proposed_moves=master1_response,
+                                     responses=master2_response
+                                     )
+        return timed(model, lambda: get_llm_best_move_claude(
+            master3_prompt, possible_moves, model=model, timeout=budget.call_timeout(),
+            on_complete=lambda response: transcript_logger.info("\n\n CHESS MASTER 3 ♟️: %s", response)))
+
+
+class LLMMixtureofAgents(LLMEngine):
+
+    model_id = 'gpt-4o+claude-3-5-sonnet-20240620'
+
+    def choose_move(self, board: chess.Board, possible_moves: list[chess.Move], budget: MoveBudget) -> str:
+
+        fields = self.prompt_fields(board, possible_moves)
+        proposer_model = 'gpt-4o'
+        aggregator_model = 'claude-3-5-sonnet-20240620'
+        aggregator_latency = self.expected_latency(aggregator_model)
+
+        # Up to two layers of three proposers, as many as fit before the aggregator has to start.
+        layers, proposers = plan_layers(budget, self.expected_latency(proposer_model), aggregator_latency,
+                                        max_layers=2, max_proposers=3)
+        logger.info("Running %d proposer layer(s) of %d proposer(s)", layers, proposers)
+
+        prompts = [self.render(master1_template, fields)] * proposers
+        responses: list[str] = []
+        for layer in range(1, layers + 1):
+            if layer > 1:
+                prompts = [self.render(proposer_moa_layer_n_template, fields, previous_responses=previous_response)
+                           for previous_response in responses]
+                if not budget.can_afford(aggregator_latency + self.expected_latency(proposer_model)):
+                    break
+
+            def propose(prompt: str) -> Callable[[], str]:
+                return lambda: str(timed(proposer_model, lambda: get_llm_response_openai(
+                    json_mode=False, system_prompt=prompt, model=proposer_model, temperature=0.5,
+                    timeout=budget.call_timeout())))
+
+            # The proposers of a layer don't depend on each other, so they are sent at the same time.
+            layer_responses = self.proposer_executor.gather_until([propose(prompt) for prompt in prompts],
+                                                                  budget.deadline - aggregator_latency)
+            for index, proposer_response in enumerate(layer_responses, start=1):
+                transcript_logger.info("\n\n PROPOSER %d_%d ♟️: %s", layer, index, proposer_response)
+                budget.add_candidates(proposer_response, possible_moves)
+            if not layer_responses:
+                break
+            responses = layer_responses
+
+        if not budget.can_afford(aggregator_latency):
+            raise OutOfTime()
+        aggregator_prompt = self.render(aggregator_moa_template, fields, previous_responses="".join(responses))
+        return timed(aggregator_model, lambda: get_llm_best_move_claude(
+            aggregator_prompt, possible_moves, model=aggregator_model, timeout=budget.call_timeout(),
+            on_complete=lambda response: transcript_logger.info("\n\n AGGREGATOR ♟️: %s", response)))
@@ -0,0 +1,116 @@
+"""
+Read newline-delimited JSON streams (such as the game streams of lichess.org) with asyncio.
+
+`requests` blocks a thread per stream, so many games can't share one thread when their streams are read with it. This
+is a minimal HTTP/1.1 client on top of `asyncio.open_connection`, enough for the streaming GETs of the lichess API: it
+sends the request, checks the status and yields the lines of the (chunked or not) body as they arrive, the empty
+keep-alive lines included.
+"""
+import asyncio
+import ssl
+from collections.abc import AsyncIterator, Mapping
+from typing import Optional
+from urllib.parse import urlsplit
+
+MAX_LINE_LENGTH = 2 ** 20
+"""The longest line of a response. A longer one is an error."""
+
+
+class StreamError(ConnectionError):
+    """The server answered with an error, or broke the HTTP protocol."""
+
+    def __init__(self, message: str, status: Optional[int] = None) -> None:
+        """
+        Describe the error.
+
+        :param message: What went wrong.
+        :param status: The HTTP status of the response, if it was read.
+        """
+        super().__init__(message)
+        self.status = status
+
+
+async def read_line(reader: asyncio.StreamReader, timeout: float) -> bytes:
+    """Read a line, with its line ending, waiting at most `timeout` seconds for it."""
+    return await asyncio.wait_for(reader.readuntil(b"\n"), timeout)
+
+
+async def read_headers(reader: asyncio.StreamReader, timeout: float) -> tuple[int, dict[str, str]]:
+    """Read the status and the headers of a response. The header names are lower case."""
+    status_line = await read_line(reader, timeout)
+    try:
+        _, status, *_ = status_line.decode("latin-1").split()
+        status_code = int(status)
+    except ValueError:
+        raise StreamError(f"Invalid status line: {status_line!r}")
+    headers = {}
+    while (line := await read_line(reader, timeout)) not in (b"\r\n", b"\n"):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return status_code, headers
+
+
+async def read_body(reader: asyncio.StreamReader, headers: Mapping[str, str], timeout: float) -> AsyncIterator[bytes]:
+    """Yield the data of the body of a response as it arrives."""
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        while True:
+            size_line = await read_line(reader, timeout)
+            try:
+                size = int(size_line.split(b";")[0], 16)
+            except ValueError:
+                raise StreamError(f"Invalid chunk size: {size_line!r}")
+            if size == 0:
+                return
+            chunk = await asyncio.wait_for(reader.readexactly(size + 2), timeout)
+            yield chunk[:-2]
+    elif "content-length" in headers:
+        remaining = int(headers["content-length"])
+        while remaining > 0:
+            data = await asyncio.wait_for(reader.read(min(remaining, 65536)), timeout)
+            if not data:
+                raise asyncio.IncompleteReadError(data, remaining)
+            remaining -= len(data)
+            yield data
+    else:
+        while data := await asyncio.wait_for(reader.read(65536), timeout):
+            yield data
+
+
+async def stream_lines(url: str, headers: Mapping[str, str], timeout: float) -> AsyncIterator[bytes]:
+    """
+    Send a GET request and yield the lines of the response, without their line endings.
+
+    :param url: The url, with its query string.
+    :param headers: The headers of the request (e.g. `Authorization`).
+    :param timeout: The seconds to wait for the connection and for each read.
+    """
+    parts = urlsplit(url)
+    secure = parts.scheme == "https"
+    port = parts.port or (443 if secure else 80)
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(parts.hostname, port,
+                                                                    ssl=ssl.create_default_context() if secure else None,
+                                                                    limit=MAX_LINE_LENGTH),
+                                            timeout)
+    try:
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        request_headers = {"Host": parts.netloc, "Accept": "application/x-ndjson", "Connection": "close", **headers}
+        request = f"GET {target} HTTP/1.1\r\n" + "".join(f"{name}: {value}\r\n" for name, value in request_headers.items())
+        writer.write(f"{request}\r\n".encode("latin-1"))
+        await writer.drain()
+
+        status, response_headers = await read_headers(reader, timeout)
+        if status >= 400:
+            raise StreamError(f"{status} error for url: {url}", status)
+
+        pending = b""
+        async for data in read_body(reader, response_headers, timeout):
+            pending += data
+            *lines, pending = pending.split(b"\n")
+            if len(pending) > MAX_LINE_LENGTH:
+                raise StreamError(f"A line of {url} is longer than {MAX_LINE_LENGTH} bytes.")
+            for line in lines:
+                yield line.rstrip(b"\r")
+        if pending:
+            yield pending.rstrip(b"\r")
+    finally:
+        writer.close()
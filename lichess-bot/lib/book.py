@@ -0,0 +1,105 @@
+"""
+Keep the polyglot opening books open for the whole process.
+
+`BookManager` maps each book to memory once, instead of opening and closing every book on every move. It also keeps the
+keys of the entries in an array, so that the binary search of a lookup runs in C instead of unpacking an entry at each
+step. The moves are still read from the mapped file, so only the keys use memory.
+"""
+import bisect
+import sys
+import threading
+import logging
+import chess
+import chess.polyglot
+from array import array
+from collections.abc import Iterable
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+ENTRY_STRUCT = chess.polyglot.ENTRY_STRUCT
+
+
+class IndexedReader(chess.polyglot.MemoryMappedReader):
+    """A memory mapped polyglot book with all of its keys in memory."""
+
+    def __init__(self, filename: str) -> None:
+        """:param filename: The path to the polyglot book."""
+        super().__init__(filename)
+        self.keys = array("Q")
+        if len(self):
+            # The key is the first big-endian 64-bit word of each 16-byte entry.
+            with memoryview(self.mmap) as view, view.cast("Q") as words, words[::2] as keys:
+                self.keys.frombytes(keys.tobytes())
+            if sys.byteorder == "little":
+                self.keys.byteswap()
+
+    def bisect_key_left(self, key: int) -> int:
+        """Find the first entry with the key."""
+        return bisect.bisect_left(self.keys, key)
+
+
+class BookManager:
+    """Open each polyglot book once and keep it open."""
+
+    def __init__(self) -> None:
+        """Start without any open book."""
+        self.books: dict[str, IndexedReader] = {}
+        self.lock = threading.Lock()
+
+    def book(self, path: str) -> IndexedReader:
+        """Get the reader of a book, opening it the first time it is needed."""
+        with self.lock:
+            reader = self.books.get(path)
+            if reader is None:
+                reader = self.books[path] = IndexedReader(path)
+                logger.info(f"Opened the book {path} with {len(reader)} entries.")
+            return reader
+
+    def close(self) -> None:
+        """Close all the books."""
+        with self.lock:
+            for reader in self.books.values():
+                reader.close()
+            self.books.clear()
+
+
+book_manager = BookManager()
+
+
+def encode_move(board: chess.Board, move: chess.Move) -> int:
+    """Encode a move the way polyglot books store it. Castling is written as the king taking its own rook."""
+    to_square = move.to_square
+    if board.is_castling(move) and not board.chess960:
+        rook_file = 7 if board.is_kingside_castling(move) else 0
+        to_square = chess.square(rook_file, chess.square_rank(move.from_square))
+    promotion = move.promotion - 1 if move.promotion else 0
+    return to_square | move.from_square << 6 | promotion << 12
+
+
+def write_book(path: str, entries: Iterable[tuple[int, int, int, Optional[int]]]) -> int:
+    """
+    Write a polyglot book.
+
+    :param path: The file to write.
+    :param entries: The key, move (from `encode_move`), weight and learn value of each entry. A learn value of `None`
+        is written as 0.
+    :return: The number of entries written.
+    """
+    return write_sorted_book(path, sorted((key, raw_move, weight, learn or 0) for key, raw_move, weight, learn in entries))
+
+
+def write_sorted_book(path: str, entries: Iterable[tuple[int, int, int, int]]) -> int:
+    """
+    Write a polyglot book from entries that are already sorted by key, without keeping them in memory.
+
+    :param path: The file to write.
+    :param entries: The key, move (from `encode_move`), weight and learn value of each entry.
+    :return: The number of entries written.
+    """
+    count = 0
+    with open(path, "wb") as book:
+        for entry in entries:
+            book.write(ENTRY_STRUCT.pack(*entry))
+            count += 1
+    return count
@@ -7,9 +7,13 @@ import math
 from abc import ABCMeta
 from typing import Any, Union, ItemsView
 from lib.types import CONFIG_DICT_TYPE, FilterType
+from lib import online_cache
 
 logger = logging.getLogger(__name__)
 
+ONLINE_OPENING_BOOKS = ("chessdb_book", "lichess_cloud_analysis", "lichess_opening_explorer")
+"""The online opening books, in their default order of priority."""
+
 
 class Configuration:
     """The config or a sub-config that the bot uses."""
@@ -135,6 +139,24 @@ def change_value_to_list(config: CONFIG_DICT_TYPE, *sections: str, key: str) ->
         subconfig[key] = [subconfig[key]]
 
 
+def add_unlisted_online_books(config: CONFIG_DICT_TYPE) -> None:
+    """
+    Add the enabled online opening books that are missing from `engine:online_moves:priority` to its end.
+
+    :param config: The bot's config, with the default values of `engine:online_moves` already inserted.
+    """
+    online_moves_config = config["engine"]["online_moves"]
+    online_priority = online_moves_config["priority"]
+    if not isinstance(online_priority, list):
+        return  # Reported by `validate_config`.
+    unlisted_books = [source for source in ONLINE_OPENING_BOOKS
+                      if source not in online_priority and online_moves_config[source]["enabled"]]
+    config_warn(not unlisted_books,
+                f"The online opening books {unlisted_books} are enabled but not in `engine:online_moves:priority`. "
+                "They will be used after the books listed.")
+    online_priority.extend(unlisted_books)
+
+
 def insert_default_values(CONFIG: CONFIG_DICT_TYPE) -> None:
     """
     Insert the default values of most keys to the config if they are missing.
@@ -148,8 +170,17 @@ def insert_default_values(CONFIG: CONFIG_DICT_TYPE) -> None:
     set_config_default(CONFIG, key="pgn_directory", default=None)
     set_config_default(CONFIG, key="pgn_file_grouping", default="game", force_empty_values=True)
     set_config_default(CONFIG, key="max_takebacks_accepted", default=0, force_empty_values=True)
+    set_config_default(CONFIG, "async_games", key="enabled", default=False)
+    set_config_default(CONFIG, "async_games", key="threads", default=32)
+    set_config_default(CONFIG, "logging", key="format", default="text")
+    set_config_default(CONFIG, "logging", key="game_sample_rate", default=1)
+    set_config_default(CONFIG, "logging", key="transcript_file", default=None)
+    set_config_default(CONFIG, "move_timings", key="directory", default=None)
+    set_config_default(CONFIG, "move_timings", key="format", default="prometheus")
     set_config_default(CONFIG, "engine", key="working_dir", default=os.getcwd(), force_empty_values=True)
     set_config_default(CONFIG, "engine", key="silence_stderr", default=False)
+    set_config_default(CONFIG, "engine", "warm_pool", key="enabled", default=False)
+    set_config_default(CONFIG, "engine", "warm_pool", key="max_idle", default=1)
     set_config_default(CONFIG, "engine", "draw_or_resign", key="offer_draw_enabled", default=False)
     set_config_default(CONFIG, "engine", "draw_or_resign", key="offer_draw_for_egtb_zero", default=True)
     set_config_default(CONFIG, "engine", "draw_or_resign", key="resign_enabled", default=False)
@@ -162,6 +193,14 @@ def insert_default_values(CONFIG: CONFIG_DICT_TYPE) -> None:
     set_config_default(CONFIG, "engine", "online_moves", key="max_out_of_book_moves", default=10)
     set_config_default(CONFIG, "engine", "online_moves", key="max_retries", default=2, force_empty_values=True)
     set_config_default(CONFIG, "engine", "online_moves", key="max_depth", default=math.inf, force_empty_values=True)
+    set_config_default(CONFIG, "engine", "online_moves", key="racing", default=False)
+    set_config_default(CONFIG, "engine", "online_moves", key="race_deadline", default=3)
+    set_config_default(CONFIG, "engine", "online_moves", key="priority", force_empty_values=True,
+                       default=list(ONLINE_OPENING_BOOKS))
+    set_config_default(CONFIG, "engine", "online_moves", "cache", key="path", default=online_cache.DEFAULT_PATH)
+    set_config_default(CONFIG, "engine", "online_moves", "cache", key="max_entries", default=online_cache.DEFAULT_MAX_ENTRIES)
+    for site, ttl in online_cache.DEFAULT_TTLS.items():
+        set_config_default(CONFIG, "engine", "online_moves", "cache", "ttl", key=site, default=ttl)
     set_config_default(CONFIG, "engine", "online_moves", "online_egtb", key="enabled", default=False)
     set_config_default(CONFIG, "engine", "online_moves", "online_egtb", key="source", default="lichess")
     set_config_default(CONFIG, "engine", "online_moves", "online_egtb", key="min_time", default=20)
@@ -183,6 +222,7 @@ def insert_default_values(CONFIG: CONFIG_DICT_TYPE) -> None:
     set_config_default(CONFIG, "engine", "online_moves", "lichess_opening_explorer", key="player_name", default="")
     set_config_default(CONFIG, "engine", "online_moves", "lichess_opening_explorer", key="sort", default="winrate")
     set_config_default(CONFIG, "engine", "online_moves", "lichess_opening_explorer", key="min_games", default=10)
+    add_unlisted_online_books(CONFIG)
     set_config_default(CONFIG, "engine", "lichess_bot_tbs", "syzygy", key="enabled", default=False)
     set_config_default(CONFIG, "engine", "lichess_bot_tbs", "syzygy", key="max_pieces", default=7)
     set_config_default(CONFIG, "engine", "lichess_bot_tbs", "syzygy", key="move_quality", default="best")
@@ -229,6 +269,8 @@ def insert_default_values(CONFIG: CONFIG_DICT_TYPE) -> None:
     set_config_default(CONFIG, "matchmaking", key="opponent_allow_tos_violation", default=True)
     set_config_default(CONFIG, "matchmaking", key="challenge_variant", default="random")
     set_config_default(CONFIG, "matchmaking", key="challenge_mode", default="random")
+    set_config_default(CONFIG, "matchmaking", key="online_bots_refresh", default=5, force_empty_values=True)
+    set_config_default(CONFIG, "matchmaking", key="bot_profile_cache_time", default=60, force_empty_values=True)
     set_config_default(CONFIG, "matchmaking", key="overrides", default={}, force_empty_values=True)
     for override_config in CONFIG["matchmaking"]["overrides"].values():
         for parameter in ["challenge_initial_time", "challenge_increment", "challenge_days"]:
@@ -301,6 +343,24 @@ def validate_config(CONFIG: CONFIG_DICT_TYPE) -> None:
                                                     "you accessing the saved files and can lead to disk "
                                                     "saturation.".format(pgn_directory))
 
+    max_idle = CONFIG["engine"]["warm_pool"]["max_idle"]
+    config_assert(isinstance(max_idle, int) and max_idle >= 0, "`engine:warm_pool:max_idle` must be 0 or a positive number.")
+
+    async_games = CONFIG["async_games"]
+    config_assert(isinstance(async_games["threads"], int) and async_games["threads"] > 0,
+                  "`async_games:threads` must be a positive number.")
+    config_warn(not async_games["enabled"] or CONFIG["engine"]["protocol"] == "homemade",
+                "`async_games` only runs homemade engines. The games of UCI and XBoard engines are played in the process "
+                "pool.")
+
+    logging_section = CONFIG["logging"]
+    config_assert(logging_section["format"] in ["text", "json"], "`logging:format` can be either `text` or `json`.")
+    sample_rate = logging_section["game_sample_rate"]
+    config_assert(isinstance(sample_rate, (int, float)) and 0 < sample_rate <= 1,
+                  "`logging:game_sample_rate` must be a number greater than 0 and at most 1.")
+    config_assert(CONFIG["move_timings"]["format"] in ["prometheus", "json"],
+                  "`move_timings:format` can be either `prometheus` or `json`.")
+
     valid_pgn_grouping_options = ["game", "opponent", "all"]
     config_pgn_choice = CONFIG["pgn_file_grouping"]
     config_assert(config_pgn_choice in valid_pgn_grouping_options,
@@ -330,6 +390,11 @@ def validate_config(CONFIG: CONFIG_DICT_TYPE) -> None:
                   f"{matchmaking.get('rating_preference')} is not a valid `matchmaking:rating_preference` option. "
                   f"Valid options are 'none', 'high', or 'low'.")
 
+    for minutes_option in ["online_bots_refresh", "bot_profile_cache_time"]:
+        minutes_value = matchmaking.get(minutes_option)
+        config_assert(isinstance(minutes_value, (int, float)) and minutes_value > 0,
+                      f"`matchmaking:{minutes_option}` must be a positive number of minutes.")
+
     selection_choices = {"polyglot": ["weighted_random", "uniform_random", "best_move"],
                          "chessdb_book": ["all", "good", "best"],
                          "lichess_cloud_analysis": ["good", "best"],
@@ -353,6 +418,21 @@ def validate_config(CONFIG: CONFIG_DICT_TYPE) -> None:
                       f"`{selection}` is not a valid choice for `engine:lichess_bot_tbs:{tb}:move_quality`. "
                       f"Please choose from {quality_selections}.")
 
+    online_moves_config = CONFIG["engine"].get("online_moves") or {}
+    online_priority = online_moves_config.get("priority") or []
+    config_assert(isinstance(online_priority, list) and all(source in ONLINE_OPENING_BOOKS for source in online_priority),
+                  f"`{online_priority}` is not a valid `engine:online_moves:priority` value. "
+                  f"Please list some of {list(ONLINE_OPENING_BOOKS)}.")
+    config_assert(len(set(online_priority)) == len(online_priority),
+                  f"`engine:online_moves:priority` lists an online opening book more than once: {online_priority}.")
+    online_cache_ttls = ((CONFIG["engine"].get("online_moves") or {}).get("cache") or {}).get("ttl") or {}
+    for site, ttl in online_cache_ttls.items():
+        config_assert(site in online_cache.DEFAULT_TTLS,
+                      f"`{site}` is not a valid key in `engine:online_moves:cache:ttl`. "
+                      f"Please choose from {list(online_cache.DEFAULT_TTLS)}.")
+        config_assert(isinstance(ttl, (int, float)) and ttl >= 0,
+                      f"`engine:online_moves:cache:ttl:{site}` must be a number of seconds.")
+
     explorer_choices = {"source": ["lichess", "masters", "player"],
                         "sort": ["winrate", "games_played"]}
     explorer_config = (CONFIG["engine"].get("online_moves") or {}).get("lichess_opening_explorer")
@@ -4,11 +4,10 @@ import test_bot.lichess
 from lib import model
 from lib.engine_wrapper import EngineWrapper
 from lib import lichess
+from lib.ipc import ChallengerNames
 from lib.types import GameEventType
-from collections.abc import Sequence
 from lib.timer import seconds
 from typing import Union
-MULTIPROCESSING_LIST_TYPE = Sequence[model.Challenge]
 LICHESS_TYPE = Union[lichess.Lichess, test_bot.lichess.Lichess]
 
 logger = logging.getLogger(__name__)
@@ -31,7 +30,7 @@ class Conversation:
     """Enables the bot to communicate with its opponent and the spectators."""
 
     def __init__(self, game: model.Game, engine: EngineWrapper, li: LICHESS_TYPE, version: str,
-                 challenge_queue: MULTIPROCESSING_LIST_TYPE) -> None:
+                 challenger_names: ChallengerNames) -> None:
         """
         Communication between lichess-bot and the game chats.
 
@@ -39,13 +38,13 @@ class Conversation:
         :param engine: The engine playing the game.
         :param li: A class that is used for communication with lichess.
         :param version: The lichess-bot version.
-        :param challenge_queue: The active challenges the bot has.
+        :param challenger_names: The names of the challengers of the active challenges the bot has.
         """
         self.game = game
         self.engine = engine
         self.li = li
         self.version = version
-        self.challengers = challenge_queue
+        self.challenger_names = challenger_names
 
     command_prefix = "!"
 
@@ -84,8 +83,9 @@ class Conversation:
         elif is_eval:
             self.send_reply(line, "I don't tell that to my opponent, sorry.")
         elif cmd == "queue":
-            if self.challengers:
-                challengers = ", ".join([f"@{challenger.challenger.name}" for challenger in reversed(self.challengers)])
+            names = self.challenger_names.names()
+            if names:
+                challengers = ", ".join([f"@{name}" for name in reversed(names)])
                 self.send_reply(line, f"Challenge queue: {challengers}")
             else:
                 self.send_reply(line, "No challenges queued.")
@@ -0,0 +1,138 @@
+"""
+Run the slow side tasks of the main loop in worker threads, and measure how long the main loop takes for each event.
+
+The main loop of `lichess_bot_main` handles the events of the control queue one at a time. Accepting and declining
+challenges, checking whether lichess.org sees the bot online and matchmaking are HTTP requests (which are retried for up
+to a minute), and saving a PGN record writes to the disk, so doing them in the loop held up the next events (e.g. a
+`gameStart`). `SideTasks` runs them in worker threads:
+- "http": the requests that don't depend on each other, in a few threads.
+- "disk": the PGN records, in one thread, so the records of a file are written in order.
+- "matchmaking": the calls to `Matchmaking`, in one thread, so its state is only changed by one thread at a time.
+
+Only the main thread changes the state of the main loop (the active games, the challenge queue). A side task that must
+change it puts an event in the control queue.
+
+`DispatchStats` keeps a histogram of the time the main loop took for each type of event, and of the time each kind of
+side task took, which lichess-bot logs when the main loop ends.
+"""
+import bisect
+import logging
+import threading
+from collections import defaultdict
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any
+from lib.timer import Timer, to_seconds
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0)
+"""The upper bounds (in seconds) of the buckets of the histograms. The last bucket has the longer times."""
+
+HTTP_WORKERS = 4
+"""The threads that send the requests of the side tasks."""
+
+
+class LatencyHistogram:
+    """Count the times that fell in each bucket of `LATENCY_BUCKETS`."""
+
+    def __init__(self) -> None:
+        """Start with no times."""
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.longest = 0.0
+
+    @property
+    def count(self) -> int:
+        """Count the times recorded."""
+        return sum(self.counts)
+
+    def record(self, seconds: float) -> None:
+        """Add a time."""
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.longest = max(self.longest, seconds)
+
+    def quantile(self, fraction: float) -> float:
+        """Get the upper bound of the bucket of the time that `fraction` of the times don't exceed (e.g. 0.99 for p99)."""
+        remaining = fraction * self.count
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            remaining -= count
+            if remaining <= 0:
+                return min(bound, self.longest)
+        return self.longest
+
+    def summary(self) -> str:
+        """Describe the histogram in a log line."""
+        mean = self.total / self.count if self.count else 0.0
+        return (f"{self.count} times, mean {mean * 1000:.1f} ms, p50 <= {self.quantile(0.5) * 1000:.1f} ms, "
+                f"p99 <= {self.quantile(0.99) * 1000:.1f} ms, max {self.longest * 1000:.1f} ms")
+
+
+class DispatchStats:
+    """The histograms of the time the main loop took for each type of event, and of the time of each kind of side task."""
+
+    def __init__(self) -> None:
+        """Start with no times."""
+        self.lock = threading.Lock()
+        self.histograms: defaultdict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+
+    def record(self, name: str, seconds: float) -> None:
+        """
+        Add a time.
+
+        :param name: The type of the event (e.g. "gameStart"), or "task:" and the name of the side task.
+        :param seconds: The time it took.
+        """
+        with self.lock:
+            self.histograms[name].record(seconds)
+
+    def summary(self) -> list[str]:
+        """Describe each histogram in a log line, the events first."""
+        with self.lock:
+            names = sorted(self.histograms, key=lambda name: (name.startswith("task:"), name))
+            return [f"{name}: {self.histograms[name].summary()}" for name in names]
+
+
+class SideTasks:
+    """The worker threads that run the side tasks of the main loop."""
+
+    def __init__(self, stats: DispatchStats) -> None:
+        """:param stats: Where the time of each side task is recorded."""
+        self.stats = stats
+        self.executors = {"http": ThreadPoolExecutor(max_workers=HTTP_WORKERS, thread_name_prefix="side-http"),
+                          "disk": ThreadPoolExecutor(max_workers=1, thread_name_prefix="side-disk"),
+                          "matchmaking": ThreadPoolExecutor(max_workers=1, thread_name_prefix="side-matchmaking")}
+        self.running: dict[str, Future[None]] = {}
+
+    def submit(self, kind: str, task: Callable[..., object], *args: Any) -> Future[None]:
+        """
+        Run a task in a worker thread. Its errors are logged.
+
+        :param kind: "http", "disk" or "matchmaking".
+        :param task: The function to call.
+        :param args: The arguments of the function.
+        """
+        name = f"task:{getattr(task, '__name__', kind)}"
+
+        def run() -> None:
+            timer = Timer()
+            try:
+                task(*args)
+            except Exception:
+                logger.exception(f"Error in the side task {name.removeprefix('task:')}:")
+            finally:
+                self.stats.record(name, to_seconds(timer.time_since_reset()))
+
+        return self.executors[kind].submit(run)
+
+    def submit_once(self, key: str, kind: str, task: Callable[..., object], *args: Any) -> None:
+        """Run a task in a worker thread, unless the last task submitted with the same `key` hasn't finished yet."""
+        running = self.running.get(key)
+        if running is None or running.done():
+            self.running[key] = self.submit(kind, task, *args)
+
+    def close(self) -> None:
+        """Wait for the PGN records to be written. Cancel the other side tasks that haven't started."""
+        for kind, executor in self.executors.items():
+            executor.shutdown(wait=kind == "disk", cancel_futures=kind != "disk")
@@ -0,0 +1,157 @@
+"""
+Keep the UCI and XBoard engines of finished games running, and give them to the next games of the process.
+
+Starting an engine for every game means starting its process, allocating its hash and loading its network again, which
+takes longer than many bullet moves. When `engine:warm_pool` is enabled, an engine whose game ended normally goes back
+to `engine_pool`, and the next game started with the same command and options leases it instead of starting a new one.
+The engine is told that a new game started (`ucinewgame` or `new`) by python-chess on the first move, because each game
+passes its own `game` object to `play`.
+
+The pool only holds the engines of its own process: the game processes and the game runner each have one.
+"""
+import logging
+import threading
+import multiprocessing.util
+import chess.engine
+from collections.abc import Callable, Hashable
+from dataclasses import dataclass
+from typing import Optional
+from lib.timer import Timer, to_seconds
+
+logger = logging.getLogger(__name__)
+
+DEAD_ENGINE_ERRORS = (chess.engine.EngineError, chess.engine.EngineTerminatedError, TimeoutError)
+"""The errors of an engine that isn't able to play anymore."""
+
+
+@dataclass
+class EnginePoolStats:
+    """The leases of the engines of the pool and the time they took."""
+
+    starts: int = 0
+    reuses: int = 0
+    discarded: int = 0
+    start_seconds: float = 0.0
+    reuse_seconds: float = 0.0
+
+    @property
+    def leases(self) -> int:
+        """Count the engines given to games."""
+        return self.starts + self.reuses
+
+    def average_wait(self) -> float:
+        """Get the average seconds a game waited for its engine."""
+        return (self.start_seconds + self.reuse_seconds) / self.leases if self.leases else 0.0
+
+    def saved_seconds(self) -> float:
+        """Estimate the seconds saved by reusing engines: the average start time of an engine for each reuse."""
+        if not self.starts:
+            return 0.0
+        return max(0.0, self.reuses * self.start_seconds / self.starts - self.reuse_seconds)
+
+    def summary(self) -> str:
+        """Describe the stats in a log line."""
+        return (f"Engine pool: {self.starts} started, {self.reuses} reused, {self.discarded} discarded, "
+                f"average wait for an engine {self.average_wait() * 1000:.1f} ms, "
+                f"about {self.saved_seconds():.1f} s of engine startup saved.")
+
+
+class EnginePool:
+    """The idle engines of this process, by the command and the options they were started with."""
+
+    def __init__(self) -> None:
+        """Start without idle engines."""
+        self.lock = threading.Lock()
+        self.idle: dict[Hashable, list[chess.engine.SimpleEngine]] = {}
+        self.stats = EnginePoolStats()
+        self.finalizer_registered = False
+
+    def lease(self, key: Hashable, start: Callable[[], chess.engine.SimpleEngine]) -> chess.engine.SimpleEngine:
+        """
+        Get an idle engine started with `key`, or start a new one.
+
+        :param key: What the engine was started with: its protocol, command, working directory and options.
+        :param start: Starts a new engine.
+        :return: The engine. It must be given back with `release`, or closed.
+        """
+        timer = Timer()
+        while (engine := self.pop(key)) is not None:
+            try:
+                engine.ping()
+            except DEAD_ENGINE_ERRORS:
+                self.discard(engine)
+                continue
+            with self.lock:
+                self.stats.reuses += 1
+                self.stats.reuse_seconds += to_seconds(timer.time_since_reset())
+            logger.debug(f"Reusing an engine of the pool after {timer.time_since_reset()}.")
+            return engine
+
+        engine = start()
+        with self.lock:
+            self.stats.starts += 1
+            self.stats.start_seconds += to_seconds(timer.time_since_reset())
+        return engine
+
+    def pop(self, key: Hashable) -> Optional[chess.engine.SimpleEngine]:
+        """Take an idle engine started with `key` out of the pool."""
+        with self.lock:
+            engines = self.idle.get(key)
+            return engines.pop() if engines else None
+
+    def release(self, key: Hashable, engine: chess.engine.SimpleEngine, max_idle: int) -> None:
+        """
+        Give back the engine of a game that ended normally. It is quit if the pool is full or if it doesn't answer.
+
+        :param key: What the engine was started with.
+        :param engine: The engine.
+        :param max_idle: The number of idle engines the pool can hold.
+        """
+        try:
+            engine.ping()  # This also stops the search of an engine that was pondering.
+        except DEAD_ENGINE_ERRORS:
+            self.discard(engine)
+            return
+
+        with self.lock:
+            kept = sum(len(engines) for engines in self.idle.values()) < max_idle
+            if kept:
+                self.idle.setdefault(key, []).append(engine)
+                self.register_finalizer()
+        if not kept:
+            quit_engine(engine)
+        logger.info(self.stats.summary())
+
+    def discard(self, engine: chess.engine.SimpleEngine) -> None:
+        """Close an engine that can't be used anymore."""
+        with self.lock:
+            self.stats.discarded += 1
+        logger.debug("Closing an engine of the pool that doesn't answer.")
+        engine.close()
+
+    def register_finalizer(self) -> None:
+        """Quit the idle engines when the process exits normally. The game processes don't run the `atexit` handlers."""
+        if not self.finalizer_registered:
+            multiprocessing.util.Finalize(self, self.close, exitpriority=10)
+            self.finalizer_registered = True
+
+    def close(self) -> None:
+        """Quit all the idle engines."""
+        with self.lock:
+            engines = [engine for key_engines in self.idle.values() for engine in key_engines]
+            self.idle.clear()
+        for engine in engines:
+            quit_engine(engine)
+
+
+def quit_engine(engine: chess.engine.SimpleEngine) -> None:
+    """Quit an engine, and close it even if it doesn't answer."""
+    try:
+        engine.quit()
+    except DEAD_ENGINE_ERRORS:
+        pass
+    finally:
+        engine.close()
+
+
+engine_pool = EnginePool()
@@ -1,10 +1,9 @@
 """Provides communication with the engine."""
 from __future__ import annotations
 import os
+import json
+import concurrent.futures
 import chess.engine
-import chess.polyglot
-import chess.syzygy
-import chess.gaviota
 import chess
 import subprocess
 import logging
@@ -14,17 +13,23 @@ import random
 import math
 import test_bot.lichess
 from collections import Counter
-from collections.abc import Callable
+from collections.abc import Callable, Hashable
 from lib import model, lichess
+from lib.book import book_manager
+from lib.engine_pool import engine_pool
+from lib.move_timing import MoveTrace, MoveTimings, current_trace, move_timings
+from lib.tablebases import tablebase_service, CachedTablebase
 from lib.config import Configuration, change_value_to_list
 from lib.timer import Timer, msec, seconds, msec_str, sec_str, to_seconds
 from lib.types import (ReadableType, ChessDBMoveType, LichessEGTBMoveType, OPTIONS_GO_EGTB_TYPE, OPTIONS_TYPE,
                        COMMANDS_TYPE, MOVE, InfoStrDict, InfoDictKeys, InfoDictValue, GO_COMMANDS_TYPE, EGTPATH_TYPE,
-                       ENGINE_INPUT_ARGS_TYPE, ENGINE_INPUT_KWARGS_TYPE)
+                       ENGINE_INPUT_ARGS_TYPE, ENGINE_INPUT_KWARGS_TYPE, GameStateType)
 from extra_game_handlers import game_specific_options
 from typing import Any, Optional, Union, Literal, Type, cast
 from types import TracebackType
 LICHESS_TYPE = Union[lichess.Lichess, test_bot.lichess.Lichess]
+ONLINE_SOURCE_TYPE = Callable[[LICHESS_TYPE, chess.Board, model.Game, Configuration],
+                              tuple[Optional[str], chess.engine.InfoDict]]
 
 
 logger = logging.getLogger(__name__)
@@ -63,6 +68,10 @@ def create_engine(engine_config: Configuration, game: Optional[model.Game] = Non
             f"    Invalid engine type: {engine_type}. Expected xboard, uci, or homemade.")
     options = remove_managed_options(cfg.lookup(f"{engine_type}_options") or Configuration({}))
     logger.debug(f"Starting engine: {commands}")
+    if Engine is UCIEngine or Engine is XBoardEngine:
+        # The engine checking the config (without a game) isn't kept: it runs in the main process, which plays no games.
+        max_idle = cfg.warm_pool.max_idle if cfg.warm_pool.enabled and game is not None else 0
+        return Engine(commands, options, stderr, cfg.draw_or_resign, game, max_idle=max_idle, cwd=cfg.working_dir)
     return Engine(commands, options, stderr, cfg.draw_or_resign, game, cwd=cfg.working_dir)
 
 
@@ -93,6 +102,9 @@ class EngineWrapper:
         self.go_commands = Configuration(cast(GO_COMMANDS_TYPE, options.pop("go_commands", {})) or {})
         self.move_commentary: list[InfoStrDict] = []
         self.comment_start_index = -1
+        self.pool_key: Optional[Hashable] = None
+        self.max_idle = 0
+        self.move_timings = MoveTimings()
 
     def configure(self, options: OPTIONS_GO_EGTB_TYPE, game: Optional[model.Game]) -> None:
         """
@@ -109,6 +121,31 @@ class EngineWrapper:
             self.engine.close()
             raise
 
+    def lease_engine(self, protocol: str, commands: COMMANDS_TYPE, options: OPTIONS_GO_EGTB_TYPE, stderr: Optional[int],
+                     game: Optional[model.Game], max_idle: int, popen_args: dict[str, str],
+                     start: Callable[[], chess.engine.SimpleEngine]) -> chess.engine.SimpleEngine:
+        """
+        Start the engine, or take an engine with the same command and options from the warm pool.
+
+        :param protocol: "uci" or "xboard".
+        :param commands: The engine path and its arguments.
+        :param options: The options to send to the engine.
+        :param stderr: Whether we should silence the stderr.
+        :param game: The game the engine will play. Its specific options (see `extra_game_handlers.py`) are part of the key
+            of the engine in the pool.
+        :param max_idle: The number of idle engines kept by the pool. If 0, the engine is started and quit as usual.
+        :param popen_args: The cwd of the engine.
+        :param start: Starts a new engine.
+        :return: The engine.
+        """
+        if not max_idle:
+            return start()
+        game_options = {} if game is None else game_specific_options(game)
+        self.pool_key = (protocol, tuple(commands), stderr, json.dumps(popen_args, sort_keys=True),
+                         json.dumps(options | game_options, sort_keys=True, default=str))
+        self.max_idle = max_idle
+        return engine_pool.lease(self.pool_key, start)
+
     def __enter__(self) -> EngineWrapper:
         """Enter context so engine communication will be properly shutdown."""
         self.engine.__enter__()
@@ -118,6 +155,9 @@ class EngineWrapper:
                  exc_value: Optional[BaseException],
                  traceback: Optional[TracebackType]) -> None:
         """Exit context and allow engine to shutdown nicely if there was no exception."""
+        if exc_type is None and self.pool_key is not None and isinstance(self.engine, chess.engine.SimpleEngine):
+            engine_pool.release(self.pool_key, self.engine, self.max_idle)
+            return
         if exc_type is None:
             self.ping()
             self.quit()
@@ -149,26 +189,54 @@ class EngineWrapper:
         :param min_time: Minimum time to spend, in seconds.
         :return: The move to play.
         """
+        trace = MoveTrace()
+        trace.add("setup", to_seconds(setup_timer.time_since_reset()))
+        token = current_trace.set(trace)
+        try:
+            with trace.span("total"):
+                self.play_traced_move(board, game, li, setup_timer, move_overhead, can_ponder, is_correspondence,
+                                      correspondence_move_time, engine_cfg, min_time, trace)
+        finally:
+            current_trace.reset(token)
+            self.move_timings.record(trace)
+            move_timings.record(trace)
+
+    def play_traced_move(self,
+                         board: chess.Board,
+                         game: model.Game,
+                         li: LICHESS_TYPE,
+                         setup_timer: Timer,
+                         move_overhead: datetime.timedelta,
+                         can_ponder: bool,
+                         is_correspondence: bool,
+                         correspondence_move_time: datetime.timedelta,
+                         engine_cfg: Configuration,
+                         min_time: datetime.timedelta,
+                         trace: MoveTrace) -> None:
+        """Play a move, and time each of its stages in `trace`. See `play_move` for the other parameters."""
         polyglot_cfg = engine_cfg.polyglot
         online_moves_cfg = engine_cfg.online_moves
         draw_or_resign_cfg = engine_cfg.draw_or_resign
         lichess_bot_tbs = engine_cfg.lichess_bot_tbs
 
         best_move: MOVE
-        best_move = get_book_move(board, game, polyglot_cfg)
+        with trace.span("book"):
+            best_move = get_book_move(board, game, polyglot_cfg)
 
         if best_move.move is None:
-            best_move = get_egtb_move(board,
-                                      game,
-                                      lichess_bot_tbs,
-                                      draw_or_resign_cfg)
+            with trace.span("egtb"):
+                best_move = get_egtb_move(board,
+                                          game,
+                                          lichess_bot_tbs,
+                                          draw_or_resign_cfg)
 
         if not isinstance(best_move, list) and best_move.move is None:
-            best_move = get_online_move(li,
-                                        board,
-                                        game,
-                                        online_moves_cfg,
-                                        draw_or_resign_cfg)
+            with trace.span("online"):
+                best_move = get_online_move(li,
+                                            board,
+                                            game,
+                                            online_moves_cfg,
+                                            draw_or_resign_cfg)
 
         if isinstance(best_move, list) or best_move.move is None:
             draw_offered = check_for_draw_offer(game)
@@ -178,7 +246,8 @@ class EngineWrapper:
                                                is_correspondence, correspondence_move_time)
 
             try:
-                best_move = self.search(board, time_limit, can_ponder, draw_offered, best_move)
+                with trace.span("search"):
+                    best_move = self.search(board, time_limit, can_ponder, draw_offered, best_move)
             except chess.engine.EngineError as error:
                 BadMove = (chess.IllegalMoveError, chess.InvalidMoveError)
                 if any(isinstance(e, BadMove) for e in error.args):
@@ -190,14 +259,16 @@ class EngineWrapper:
         # Heed min_time
         elapsed = setup_timer.time_since_reset()
         if elapsed < min_time:
-            time.sleep(to_seconds(min_time - elapsed))
+            with trace.span("fake_think_time"):
+                time.sleep(to_seconds(min_time - elapsed))
 
         self.add_comment(best_move, board)
         self.print_stats()
-        if best_move.resigned and len(board.move_stack) >= 2:
-            li.resign(game.id)
-        else:
-            li.make_move(game.id, best_move)
+        with trace.span("make_move"):
+            if best_move.resigned and len(board.move_stack) >= 2:
+                li.resign(game.id)
+            else:
+                li.make_move(game.id, best_move)
 
     def add_go_commands(self, time_limit: chess.engine.Limit) -> chess.engine.Limit:
         """Add extra commands to send to the engine. For example, to search for 1000 nodes or up to depth 10."""
@@ -256,6 +327,7 @@ class EngineWrapper:
         time_limit = self.add_go_commands(time_limit)
         result = self.engine.play(board,
                                   time_limit,
+                                  game=self,  # A new wrapper for each game, so an engine of the pool gets `ucinewgame`.
                                   info=chess.engine.INFO_ALL,
                                   ponder=ponder,
                                   draw_offered=draw_offered,
@@ -396,8 +468,9 @@ class EngineWrapper:
                                       for (key, value) in info.items()))
         if "Source" not in info:
             info["Source"] = "Engine"
+        self.move_timings.add_stages(info)
 
-        stats = ["Source", "Evaluation", "Winrate", "Depth", "Nodes", "Speed", "Pv"]
+        stats = ["Source", "Evaluation", "Winrate", "Depth", "Nodes", "Speed", "Stages", "Pv"]
         if for_chat and "Pv" in info:
             bot_stats = [f"{stat}: {self.to_readable_value(cast(InfoDictKeys, stat), info)}"
                          for stat in stats if stat in info and stat != "Pv"]
@@ -478,7 +551,7 @@ class UCIEngine(EngineWrapper):
     """The class used to communicate with UCI engines."""
 
     def __init__(self, commands: COMMANDS_TYPE, options: OPTIONS_GO_EGTB_TYPE, stderr: Optional[int],
-                 draw_or_resign: Configuration, game: Optional[model.Game], **popen_args: str) -> None:
+                 draw_or_resign: Configuration, game: Optional[model.Game], max_idle: int = 0, **popen_args: str) -> None:
         """
         Communicate with UCI engines.
 
@@ -487,11 +560,16 @@ class UCIEngine(EngineWrapper):
         :param stderr: Whether we should silence the stderr.
         :param draw_or_resign: Options on whether the bot should resign or offer draws.
         :param game: The first Game message from the game stream.
+        :param max_idle: The number of idle engines kept by the warm pool. If 0, the engine isn't kept after the game.
         :param popen_args: The cwd of the engine.
         """
         super().__init__(options, draw_or_resign)
-        self.engine = chess.engine.SimpleEngine.popen_uci(commands, timeout=10., debug=False, setpgrp=True, stderr=stderr,
-                                                          **popen_args)
+
+        def start() -> chess.engine.SimpleEngine:
+            return chess.engine.SimpleEngine.popen_uci(commands, timeout=10., debug=False, setpgrp=True, stderr=stderr,
+                                                       **popen_args)
+
+        self.engine = self.lease_engine("uci", commands, options, stderr, game, max_idle, popen_args, start)
         self.configure(options, game)
 
 
@@ -499,7 +577,7 @@ class XBoardEngine(EngineWrapper):
     """The class used to communicate with XBoard engines."""
 
     def __init__(self, commands: COMMANDS_TYPE, options: OPTIONS_GO_EGTB_TYPE, stderr: Optional[int],
-                 draw_or_resign: Configuration, game: Optional[model.Game], **popen_args: str) -> None:
+                 draw_or_resign: Configuration, game: Optional[model.Game], max_idle: int = 0, **popen_args: str) -> None:
         """
         Communicate with XBoard engines.
 
@@ -508,11 +586,16 @@ class XBoardEngine(EngineWrapper):
         :param stderr: Whether we should silence the stderr.
         :param draw_or_resign: Options on whether the bot should resign or offer draws.
         :param game: The first Game message from the game stream.
+        :param max_idle: The number of idle engines kept by the warm pool. If 0, the engine isn't kept after the game.
         :param popen_args: The cwd of the engine.
         """
         super().__init__(options, draw_or_resign)
-        self.engine = chess.engine.SimpleEngine.popen_xboard(commands, timeout=10., debug=False, setpgrp=True,
-                                                             stderr=stderr, **popen_args)
+
+        def start() -> chess.engine.SimpleEngine:
+            return chess.engine.SimpleEngine.popen_xboard(commands, timeout=10., debug=False, setpgrp=True, stderr=stderr,
+                                                          **popen_args)
+
+        self.engine = self.lease_engine("xboard", commands, options, stderr, game, max_idle, popen_args, start)
         egt_paths: EGTPATH_TYPE = cast(EGTPATH_TYPE, options.pop("egtpath", {}) or {})
         features = self.engine.protocol.features if isinstance(self.engine.protocol, chess.engine.XBoardProtocol) else {}
         egt_features = features.get("egt", "")
@@ -547,10 +630,13 @@ class MinimalEngine(EngineWrapper):
 
         :param options: The options to send to the engine.
         :param draw_or_resign: Options on whether the bot should resign or offer draws.
+        :param game: The game being played. `play_game` updates its `state` in place, so `self.game_state()` is always
+            the latest state of this game.
         """
         super().__init__(options, draw_or_resign)
 
         self.engine_name = self.__class__.__name__ if name is None else name
+        self.game = game
 
         self.engine = FillerEngine(self, name=self.engine_name)
 
@@ -558,6 +644,10 @@ class MinimalEngine(EngineWrapper):
         """Homemade engines don't have a pid, so we return a question mark."""
         return "?"
 
+    def game_state(self) -> GameStateType:
+        """Get the latest `gameState` event of the game being played, or an empty dict if there is no game."""
+        return self.game.state if self.game is not None else {}
+
     def search(self, board: chess.Board, time_limit: chess.engine.Limit, ponder: bool, draw_offered: bool,
                root_moves: MOVE) -> chess.engine.PlayResult:
         """
@@ -755,19 +845,19 @@ def get_book_move(board: chess.Board, game: model.Game,
     books = polyglot_cfg.book.lookup(variant)
 
     for book in books:
-        with chess.polyglot.open_reader(book) as reader:
-            try:
-                selection = polyglot_cfg.selection
-                min_weight = polyglot_cfg.min_weight
-                if selection == "weighted_random":
-                    move = reader.weighted_choice(board).move
-                elif selection == "uniform_random":
-                    move = reader.choice(board, minimum_weight=min_weight).move
-                elif selection == "best_move":
-                    move = reader.find(board, minimum_weight=min_weight).move
-            except IndexError:
-                # python-chess raises "IndexError" if no entries found.
-                move = None
+        reader = book_manager.book(book)
+        try:
+            selection = polyglot_cfg.selection
+            min_weight = polyglot_cfg.min_weight
+            if selection == "weighted_random":
+                move = reader.weighted_choice(board).move
+            elif selection == "uniform_random":
+                move = reader.choice(board, minimum_weight=min_weight).move
+            elif selection == "best_move":
+                move = reader.find(board, minimum_weight=min_weight).move
+        except IndexError:
+            # python-chess raises "IndexError" if no entries found.
+            move = None
 
         if move is not None:
             logger.info(f"Got move {move} from book {book} for game {game.id}")
@@ -814,12 +904,20 @@ def get_online_move(li: LICHESS_TYPE, board: chess.Board, game: model.Game, onli
     lichess_cloud_cfg = online_moves_cfg.lichess_cloud_analysis
     opening_explorer_cfg = online_moves_cfg.lichess_opening_explorer
 
-    for online_source, cfg in ((get_chessdb_move, chessdb_cfg),
-                               (get_lichess_cloud_move, lichess_cloud_cfg),
-                               (get_opening_explorer_move, opening_explorer_cfg)):
-        best_move, comment = online_source(li, board, game, cfg)
+    online_sources: dict[str, tuple[ONLINE_SOURCE_TYPE, Configuration]] = {
+        "chessdb_book": (get_chessdb_move, chessdb_cfg),
+        "lichess_cloud_analysis": (get_lichess_cloud_move, lichess_cloud_cfg),
+        "lichess_opening_explorer": (get_opening_explorer_move, opening_explorer_cfg)}
+    sources = [online_sources[name] for name in online_moves_cfg.priority]
+    if online_moves_cfg.racing:
+        best_move, comment = race_online_sources(li, board, game, sources, online_moves_cfg.race_deadline)
         if best_move:
             return chess.engine.PlayResult(chess.Move.from_uci(best_move), None, comment)
+    else:
+        for online_source, cfg in sources:
+            best_move, comment = online_source(li, board, game, cfg)
+            if best_move:
+                return chess.engine.PlayResult(chess.Move.from_uci(best_move), None, comment)
 
     out_of_online_opening_book_moves[game.id] += 1
     used_opening_books = chessdb_cfg.enabled or lichess_cloud_cfg.enabled or opening_explorer_cfg.enabled
@@ -828,6 +926,58 @@ def get_online_move(li: LICHESS_TYPE, board: chess.Board, game: model.Game, onli
     return chess.engine.PlayResult(None, None)
 
 
+def race_online_sources(li: LICHESS_TYPE, board: chess.Board, game: model.Game,
+                        sources: list[tuple[ONLINE_SOURCE_TYPE, Configuration]],
+                        deadline: float) -> tuple[Optional[str], chess.engine.InfoDict]:
+    """
+    Ask all the enabled online opening books at the same time.
+
+    The answer of the first source in `sources` that has a move is used as soon as all the sources before it have answered
+    without one. At the deadline, the first source that has answered with a move is used. The requests still running are
+    not waited for, and their answers are dropped. Each race has its own threads, so the requests left running by one game
+    never hold up the requests of the others.
+
+    :param sources: The online sources and their configs, in order of priority.
+    :param deadline: The number of seconds to wait for the answers.
+    :return: The move and its comment, or `None` if no source answered with a move in time.
+    """
+    enabled_sources = [(online_source, cfg) for online_source, cfg in sources if cfg.enabled]
+    if not enabled_sources:
+        return None, {}
+    end_time = time.monotonic() + deadline
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(enabled_sources), thread_name_prefix="online-move")
+    futures = [executor.submit(online_source, li, board.copy(stack=False), game, cfg)
+               for online_source, cfg in enabled_sources]
+    try:
+        for future in futures:
+            try:
+                best_move, comment = future.result(timeout=max(0.0, end_time - time.monotonic()))
+            except concurrent.futures.TimeoutError:
+                break
+            except Exception:
+                logger.exception(f"An online opening book failed for game {game.id}:")
+                continue
+            if best_move:
+                return best_move, comment
+        best_move, comment = first_answered_move(futures)
+        if not best_move:
+            logger.info(f"No online opening book answered with a move within {deadline} seconds for game {game.id}.")
+        return best_move, comment
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def first_answered_move(futures: list[concurrent.futures.Future[tuple[Optional[str], chess.engine.InfoDict]]]
+                        ) -> tuple[Optional[str], chess.engine.InfoDict]:
+    """Get the move and comment of the first online source that has already answered with a move."""
+    for future in futures:
+        if future.done() and not future.cancelled() and future.exception() is None:
+            best_move, comment = future.result()
+            if best_move:
+                return best_move, comment
+    return None, {}
+
+
 def get_chessdb_move(li: LICHESS_TYPE, board: chess.Board, game: model.Game,
                      chessdb_cfg: Configuration) -> tuple[Optional[str], chess.engine.InfoDict]:
     """Get a move from chessdb.cn's opening book."""
@@ -1160,46 +1310,43 @@ def get_syzygy(board: chess.Board, game: model.Game,
         return None, -3
     move: Union[chess.Move, list[chess.Move]]
     move_quality = syzygy_cfg.move_quality
-    with chess.syzygy.open_tablebase(syzygy_cfg.paths[0]) as tablebase:
-        for path in syzygy_cfg.paths[1:]:
-            tablebase.add_directory(path)
-
+    tablebase = tablebase_service.syzygy(syzygy_cfg.paths)
+    try:
+        moves = score_syzygy_moves(board, dtz_scorer, tablebase)
+
+        best_wdl = max(map(dtz_to_wdl, moves.values()))
+        good_moves = [(move, dtz) for move, dtz in moves.items() if dtz_to_wdl(dtz) == best_wdl]
+        if move_quality == "suggest" and len(good_moves) > 1:
+            move = [chess_move for chess_move, dtz in good_moves]
+            logger.info(f"Suggesting moves from syzygy (wdl: {best_wdl}) for game {game.id}")
+            return move, best_wdl
+        else:
+            # There can be multiple moves with the same dtz.
+            best_dtz = min([dtz for chess_move, dtz in good_moves])
+            best_moves = [chess_move for chess_move, dtz in good_moves if dtz == best_dtz]
+            move = random.choice(best_moves)
+            logger.info(f"Got move {move.uci()} from syzygy (wdl: {best_wdl}, dtz: {best_dtz}) for game {game.id}")
+            return move, best_wdl
+    except KeyError:
+        # Attempt to only get the WDL score. It returns moves of quality="suggest", even if quality is set to "best".
         try:
-            moves = score_syzygy_moves(board, dtz_scorer, tablebase)
-
-            best_wdl = max(map(dtz_to_wdl, moves.values()))
-            good_moves = [(move, dtz) for move, dtz in moves.items() if dtz_to_wdl(dtz) == best_wdl]
-            if move_quality == "suggest" and len(good_moves) > 1:
-                move = [chess_move for chess_move, dtz in good_moves]
+            moves = score_syzygy_moves(board, lambda tablebase, b: -tablebase.probe_wdl(b), tablebase)
+            best_wdl = int(max(moves.values()))  # int is there only for mypy.
+            good_chess_moves = [chess_move for chess_move, wdl in moves.items() if wdl == best_wdl]
+            logger.debug("Found moves using 'move_quality'='suggest'. We didn't find an '.rtbz' file for this endgame."
+                         if move_quality == "best" else "")
+            if len(good_chess_moves) > 1:
+                move = good_chess_moves
                 logger.info(f"Suggesting moves from syzygy (wdl: {best_wdl}) for game {game.id}")
-                return move, best_wdl
             else:
-                # There can be multiple moves with the same dtz.
-                best_dtz = min([dtz for chess_move, dtz in good_moves])
-                best_moves = [chess_move for chess_move, dtz in good_moves if dtz == best_dtz]
-                move = random.choice(best_moves)
-                logger.info(f"Got move {move.uci()} from syzygy (wdl: {best_wdl}, dtz: {best_dtz}) for game {game.id}")
-                return move, best_wdl
+                move = good_chess_moves[0]
+                logger.info(f"Got move {move.uci()} from syzygy (wdl: {best_wdl}) for game {game.id}")
+            return move, best_wdl
         except KeyError:
-            # Attempt to only get the WDL score. It returns moves of quality="suggest", even if quality is set to "best".
-            try:
-                moves = score_syzygy_moves(board, lambda tablebase, b: -tablebase.probe_wdl(b), tablebase)
-                best_wdl = int(max(moves.values()))  # int is there only for mypy.
-                good_chess_moves = [chess_move for chess_move, wdl in moves.items() if wdl == best_wdl]
-                logger.debug("Found moves using 'move_quality'='suggest'. We didn't find an '.rtbz' file for this endgame."
-                             if move_quality == "best" else "")
-                if len(good_chess_moves) > 1:
-                    move = good_chess_moves
-                    logger.info(f"Suggesting moves from syzygy (wdl: {best_wdl}) for game {game.id}")
-                else:
-                    move = good_chess_moves[0]
-                    logger.info(f"Got move {move.uci()} from syzygy (wdl: {best_wdl}) for game {game.id}")
-                return move, best_wdl
-            except KeyError:
-                return None, -3
+            return None, -3
 
 
-def dtz_scorer(tablebase: chess.syzygy.Tablebase, board: chess.Board) -> Union[int, float]:
+def dtz_scorer(tablebase: CachedTablebase, board: chess.Board) -> Union[int, float]:
     """
     Score a position based on a syzygy DTZ egtb.
 
@@ -1239,38 +1386,35 @@ def get_gaviota(board: chess.Board, game: model.Game,
     # guarantees that all moves have a syzygy wdl=2/-2. Setting min_dtm_to_consider_as_wdl_1 to 100 will disable it
     # because dtm >= dtz, so if abs(dtm) < 100 => abs(dtz) < 100, so wdl=2/-2.
     min_dtm_to_consider_as_wdl_1 = gaviota_cfg.min_dtm_to_consider_as_wdl_1
-    with chess.gaviota.open_tablebase(gaviota_cfg.paths[0]) as tablebase:
-        for path in gaviota_cfg.paths[1:]:
-            tablebase.add_directory(path)
-
-        try:
-            moves = score_gaviota_moves(board, dtm_scorer, tablebase)
-
-            best_wdl = max(map(dtm_to_gaviota_wdl, moves.values()))
-            good_moves = [(move, dtm) for move, dtm in moves.items() if dtm_to_gaviota_wdl(dtm) == best_wdl]
-            best_dtm = min([dtm for move, dtm in good_moves])
-
-            pseudo_wdl = dtm_to_wdl(best_dtm, min_dtm_to_consider_as_wdl_1)
-            if move_quality == "suggest":
-                best_moves = good_enough_gaviota_moves(good_moves, best_dtm, min_dtm_to_consider_as_wdl_1)
-                if len(best_moves) > 1:
-                    move = [chess_move for chess_move, dtm in best_moves]
-                    logger.info(f"Suggesting moves from gaviota (pseudo wdl: {pseudo_wdl}) for game {game.id}")
-                else:
-                    move, dtm = random.choice(best_moves)
-                    logger.info(f"Got move {move.uci()} from gaviota (pseudo wdl: {pseudo_wdl}, dtm: {dtm})"
-                                f" for game {game.id}")
+    tablebase = tablebase_service.gaviota(gaviota_cfg.paths)
+    try:
+        moves = score_gaviota_moves(board, dtm_scorer, tablebase)
+
+        best_wdl = max(map(dtm_to_gaviota_wdl, moves.values()))
+        good_moves = [(move, dtm) for move, dtm in moves.items() if dtm_to_gaviota_wdl(dtm) == best_wdl]
+        best_dtm = min([dtm for move, dtm in good_moves])
+
+        pseudo_wdl = dtm_to_wdl(best_dtm, min_dtm_to_consider_as_wdl_1)
+        if move_quality == "suggest":
+            best_moves = good_enough_gaviota_moves(good_moves, best_dtm, min_dtm_to_consider_as_wdl_1)
+            if len(best_moves) > 1:
+                move = [chess_move for chess_move, dtm in best_moves]
+                logger.info(f"Suggesting moves from gaviota (pseudo wdl: {pseudo_wdl}) for game {game.id}")
             else:
-                # There can be multiple moves with the same dtm.
-                best_moves = [(move, dtm) for move, dtm in good_moves if dtm == best_dtm]
                 move, dtm = random.choice(best_moves)
-                logger.info(f"Got move {move.uci()} from gaviota (pseudo wdl: {pseudo_wdl}, dtm: {dtm}) for game {game.id}")
-            return move, pseudo_wdl
-        except KeyError:
-            return None, -3
+                logger.info(f"Got move {move.uci()} from gaviota (pseudo wdl: {pseudo_wdl}, dtm: {dtm})"
+                            f" for game {game.id}")
+        else:
+            # There can be multiple moves with the same dtm.
+            best_moves = [(move, dtm) for move, dtm in good_moves if dtm == best_dtm]
+            move, dtm = random.choice(best_moves)
+            logger.info(f"Got move {move.uci()} from gaviota (pseudo wdl: {pseudo_wdl}, dtm: {dtm}) for game {game.id}")
+        return move, pseudo_wdl
+    except KeyError:
+        return None, -3
 
 
-def dtm_scorer(tablebase: Union[chess.gaviota.NativeTablebase, chess.gaviota.PythonTablebase], board: chess.Board) -> int:
+def dtm_scorer(tablebase: CachedTablebase, board: chess.Board) -> int:
     """Score a position based on a gaviota DTM egtb."""
     dtm = -tablebase.probe_dtm(board)
     return dtm + int(math.copysign(board.halfmove_clock, dtm) if dtm else 0)
@@ -1368,27 +1512,25 @@ def piecewise_function(range_definitions: list[tuple[Union[int, float], Literal[
 
 
 def score_syzygy_moves(board: chess.Board,
-                       scorer: Union[Callable[[chess.syzygy.Tablebase, chess.Board], int],
-                                     Callable[[chess.syzygy.Tablebase, chess.Board], Union[int, float]]],
-                       tablebase: chess.syzygy.Tablebase) -> dict[chess.Move, Union[int, float]]:
+                       scorer: Union[Callable[[CachedTablebase, chess.Board], int],
+                                     Callable[[CachedTablebase, chess.Board], Union[int, float]]],
+                       tablebase: CachedTablebase) -> dict[chess.Move, Union[int, float]]:
     """Score all the moves using syzygy egtbs."""
     moves = {}
     for move in board.legal_moves:
-        board_copy = board.copy()
+        board_copy = board.copy(stack=False)
         board_copy.push(move)
         moves[move] = scorer(tablebase, board_copy)
     return moves
 
 
 def score_gaviota_moves(board: chess.Board,
-                        scorer: Callable[[Union[chess.gaviota.NativeTablebase, chess.gaviota.PythonTablebase],
-                                          chess.Board], int],
-                        tablebase: Union[chess.gaviota.NativeTablebase, chess.gaviota.PythonTablebase]
-                        ) -> dict[chess.Move, int]:
+                        scorer: Callable[[CachedTablebase, chess.Board], int],
+                        tablebase: CachedTablebase) -> dict[chess.Move, int]:
     """Score all the moves using gaviota egtbs."""
     moves = {}
     for move in board.legal_moves:
-        board_copy = board.copy()
+        board_copy = board.copy(stack=False)
         board_copy.push(move)
         moves[move] = scorer(tablebase, board_copy)
     return moves
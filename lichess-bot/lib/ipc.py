@@ -0,0 +1,84 @@
+"""
+The queues and the state shared by the processes of lichess-bot.
+
+The queues of a `multiprocessing.Manager` are proxies: every `put`, `get` and `task_done`, and every access to a managed
+list, is a round trip to the manager's server process. The queues here are native `multiprocessing` queues, which send
+the events through a pipe without a middleman. The control queue is a `SimpleQueue`, which writes to the pipe right away
+instead of through a feeder thread. The logging queue and the correspondence queue need `put_nowait` and `get_nowait`, so
+they are `Queue`s. The challenge queue stays a plain list in the main process, the only one
+that changes it. The game processes only need the names of the challengers (for the `!queue` chat command), so the main
+process publishes them in shared memory.
+
+Native queues can't be sent to a running process, so the game processes get them when they start, from the initializer
+of the pool (`share_queues`). The game runner process gets them as arguments, with the ids of the games it plays in
+`game_runner_queue`.
+"""
+import ctypes
+import multiprocessing
+from collections.abc import Sequence
+from typing import NamedTuple, Optional
+from lib import model
+from lib.types import CONTROL_QUEUE_TYPE, CORRESPONDENCE_QUEUE_TYPE, GAME_RUNNER_QUEUE_TYPE, LOGGING_QUEUE_TYPE
+
+CHALLENGER_NAMES_SIZE = 4096
+"""The bytes of shared memory for the names of the challengers. The names that don't fit are left out."""
+
+
+class ChallengerNames:
+    """The names of the challengers in the challenge queue, written by the main process and read by the game processes."""
+
+    def __init__(self, size: int = CHALLENGER_NAMES_SIZE) -> None:
+        """:param size: The bytes of shared memory for the names."""
+        self.size = size
+        self.shared = multiprocessing.Array(ctypes.c_char, size)
+        self.published: list[str] = []
+
+    def publish(self, challenges: Sequence[model.Challenge]) -> None:
+        """Write the names of the challengers, in the order of the queue. Nothing is written if they haven't changed."""
+        names = [challenge.challenger.name for challenge in challenges]
+        if names == self.published:
+            return
+        self.published = names
+        data = "\n".join(names).encode()
+        if len(data) >= self.size:
+            data = data[:self.size].rsplit(b"\n", 1)[0]
+        with self.shared.get_lock():
+            self.shared.value = data
+
+    def names(self) -> list[str]:
+        """Read the names of the challengers, in the order of the queue."""
+        with self.shared.get_lock():
+            data = self.shared.value
+        return data.decode(errors="replace").split("\n") if data else []
+
+
+class ProcessQueues(NamedTuple):
+    """The queues shared by the main process, the game processes, the game runner and the helper processes."""
+
+    control_queue: CONTROL_QUEUE_TYPE
+    correspondence_queue: CORRESPONDENCE_QUEUE_TYPE
+    logging_queue: LOGGING_QUEUE_TYPE
+    challenger_names: ChallengerNames
+    game_runner_queue: GAME_RUNNER_QUEUE_TYPE
+
+
+def create_queues() -> ProcessQueues:
+    """Create the queues. This must be done before the processes that use them are started."""
+    return ProcessQueues(multiprocessing.SimpleQueue(), multiprocessing.Queue(), multiprocessing.Queue(), ChallengerNames(),
+                         multiprocessing.Queue())
+
+
+shared_queues: Optional[ProcessQueues] = None
+
+
+def share_queues(queues: ProcessQueues) -> None:
+    """Keep the queues for this process. It's called by the main process, and by each game process when it starts."""
+    global shared_queues
+    shared_queues = queues
+
+
+def process_queues() -> ProcessQueues:
+    """Get the queues of this process."""
+    if shared_queues is None:
+        raise RuntimeError("The queues are only shared with the main process and the processes of the game pool.")
+    return shared_queues
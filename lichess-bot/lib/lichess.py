@@ -1,4 +1,5 @@
 """Communication with APIs."""
+import asyncio
 import json
 import requests
 from urllib.parse import urljoin
@@ -10,6 +11,10 @@ import traceback
 from collections import defaultdict
 import datetime
 from lib.timer import Timer, seconds, sec_str
+from lib.config import Configuration
+from lib.online_cache import OnlineCache, open_online_cache
+from lib.async_stream import StreamError, stream_lines
+from collections.abc import AsyncGenerator
 from typing import Optional, Union, cast
 import chess.engine
 from lib.types import (UserProfileType, REQUESTS_PAYLOAD_TYPE, GameType, PublicDataType, OnlineType,
@@ -81,7 +86,8 @@ def backoff_handler(details: BackoffDetails) -> None:
 class Lichess:
     """Communication with lichess.org (and chessdb.cn for getting moves)."""
 
-    def __init__(self, token: str, url: str, version: str, logging_level: int, max_retries: int) -> None:
+    def __init__(self, token: str, url: str, version: str, logging_level: int, max_retries: int,
+                 online_cache_cfg: Optional[Configuration] = None) -> None:
         """
         Communication with lichess.org (and chessdb.cn for getting moves).
 
@@ -90,6 +96,8 @@ class Lichess:
         :param version: The lichess-bot version running.
         :param logging_level: The logging level (logging.INFO or logging.DEBUG).
         :param max_retries: The maximum amount of retries for online moves (e.g. chessdb's opening book).
+        :param online_cache_cfg: The `online_moves:cache` config. The answers of the online move sources aren't saved
+            if it is missing or its `path` is empty.
         """
         self.version = version
         self.header = {
@@ -102,6 +110,7 @@ class Lichess:
         self.set_user_agent("?")
         self.logging_level = logging_level
         self.max_retries = max_retries
+        self.online_cache_cfg = online_cache_cfg
         self.rate_limit_timers: defaultdict[str, Timer] = defaultdict(Timer)
 
         # Confirm that the OAuth token has the proper permission to play on lichess
@@ -322,6 +331,31 @@ class Lichess:
         """Get  stream of the in-game events (e.g. moves by the opponent)."""
         return self.api_get("stream", game_id, stream=True, timeout=15)
 
+    async def game_stream_lines(self, game_id: str) -> AsyncGenerator[bytes, None]:
+        """
+        Get the lines of the stream of the in-game events with asyncio, for the games played in an event loop.
+
+        The errors are the `requests` exceptions that `get_game_stream` and its `iter_lines` raise.
+        """
+        path_template = self.get_path_template("stream")
+        url = urljoin(self.baseUrl, path_template.format(game_id))
+        try:
+            async for line in stream_lines(url, self.header, timeout=15):
+                yield line
+        except StreamError as error:
+            if error.status is None:
+                raise ConnectionError(str(error)) from error
+            response = requests.Response()
+            response.status_code = error.status
+            response.url = url
+            if is_new_rate_limit(response):
+                self.set_rate_limit_delay(path_template, seconds(60))
+            raise HTTPError(str(error), response=response) from error
+        except asyncio.TimeoutError as error:
+            raise ReadTimeout(f"No data from {url} in 15 seconds.") from error
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError) as error:
+            raise ConnectionError(str(error)) from error
+
     def accept_challenge(self, challenge_id: str) -> None:
         """Accept a challenge."""
         self.api_post("accept", challenge_id)
@@ -401,7 +435,19 @@ class Lichess:
         def online_book_get() -> OnlineType:
             json_response: OnlineType = self.other_session.get(path, timeout=2, params=params, stream=stream).json()
             return json_response
-        return online_book_get()
+
+        cache = self.online_cache()
+        # Streamed answers (the opening explorer of a player) change with every game, so they aren't saved.
+        if cache is None or stream:
+            return online_book_get()
+        return cache.fetch(path, params or {}, online_book_get)
+
+    def online_cache(self) -> Optional[OnlineCache]:
+        """Get the cache of the answers of the online move sources, or `None` if it is disabled."""
+        cfg = self.online_cache_cfg
+        if not cfg or not cfg.path:
+            return None
+        return open_online_cache(str(cfg.path), int(cfg.max_entries), cfg.ttl.config if cfg.ttl else None)
 
     def is_online(self, user_id: str) -> bool:
         """Check if lichess.org thinks the bot is online or not."""
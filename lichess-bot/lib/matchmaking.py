@@ -9,11 +9,13 @@ from collections import defaultdict
 from collections.abc import Sequence
 from lib import lichess
 from lib.config import Configuration
+from lib.opponent_index import OpponentIndexService
 from typing import Optional, Union
 from lib.types import UserProfileType, PerfType, EventType, FilterType
 MULTIPROCESSING_LIST_TYPE = Sequence[model.Challenge]
 DAILY_TIMERS_TYPE = list[Timer]
 LICHESS_TYPE = Union[lichess.Lichess, test_bot.lichess.Lichess]
+OPPONENT_CHOICE_TYPE = tuple[Optional[str], int, int, int, str, str]
 
 logger = logging.getLogger(__name__)
 
@@ -72,6 +74,14 @@ class Matchmaking:
         for name in self.matchmaking_cfg.block_list:
             self.add_to_block_list(name)
 
+        self.opponent_index = OpponentIndexService(li, minutes(self.matchmaking_cfg.online_bots_refresh),
+                                                   minutes(self.matchmaking_cfg.bot_profile_cache_time))
+        if self.matchmaking_cfg.allow_matchmaking:
+            self.opponent_index.start()
+
+        # The opponent chosen for the next challenge, waiting for its public data to be downloaded.
+        self.pending_challenge: Optional[OPPONENT_CHOICE_TYPE] = None
+
     def should_create_challenge(self) -> bool:
         """Whether we should create a challenge."""
         matchmaking_enabled = self.matchmaking_cfg.allow_matchmaking
@@ -170,8 +180,8 @@ class Matchmaking:
             weights = [1] * len(online_bots)
         return weights
 
-    def choose_opponent(self) -> tuple[Optional[str], int, int, int, str, str]:
-        """Choose an opponent."""
+    def choose_opponent(self) -> OPPONENT_CHOICE_TYPE:
+        """Choose an opponent among the online bots of the index. Whether it blocks us is checked by `challenge`."""
         override_choice = random.choice(self.matchmaking_cfg.overrides.keys() + [None])
         logger.info(f"Using the {override_choice or 'default'} matchmaking configuration.")
         override = {} if override_choice is None else self.matchmaking_cfg.overrides.lookup(override_choice)
@@ -205,15 +215,13 @@ class Matchmaking:
         allow_tos_violation = match_config.opponent_allow_tos_violation
 
         def is_suitable_opponent(bot: UserProfileType) -> bool:
-            perf = bot.get("perfs", {}).get(game_type, {})
             return (bot["username"] != self.username()
                     and not self.in_block_list(bot["username"])
                     and not bot.get("disabled")
-                    and (allow_tos_violation or not bot.get("tosViolation"))  # Terms of Service violation.
-                    and perf.get("games", 0) > 0
-                    and min_rating <= perf.get("rating", 0) <= max_rating)
+                    and (allow_tos_violation or not bot.get("tosViolation")))  # Terms of Service violation.
 
-        online_bots = self.li.get_online_bots()
+        # The index only has the bots that played this game type.
+        online_bots = self.opponent_index.bots_in_range(game_type, min_rating, max_rating)
         online_bots = list(filter(is_suitable_opponent, online_bots))
 
         def ready_for_challenge(bot: UserProfileType) -> bool:
@@ -227,11 +235,8 @@ class Matchmaking:
 
         try:
             bot = random.choices(online_bots, weights=weights)[0]
-            bot_profile = self.li.get_public_data(bot["username"])
-            if bot_profile.get("blocking"):
-                self.add_to_block_list(bot["username"])
-            else:
-                bot_username = bot["username"]
+            bot_username = bot["username"]
+            self.opponent_index.public_data(bot_username)  # Start downloading its public data.
         except Exception:
             if online_bots:
                 logger.exception("Error:")
@@ -258,16 +263,35 @@ class Matchmaking:
         if (game_count >= max_games_for_matchmaking
                 or (game_count > 0 and self.last_challenge_created_delay.time_since_reset() < self.max_wait_time)
                 or not self.should_create_challenge()):
+            self.pending_challenge = None
             return
 
-        logger.info("Challenging a random bot")
-        self.update_user_profile()
-        bot_username, base_time, increment, days, variant, mode = self.choose_opponent()
+        if self.pending_challenge is None:
+            logger.info("Challenging a random bot")
+            self.update_user_profile()
+            self.pending_challenge = self.choose_opponent()
+        bot_username, base_time, increment, days, variant, mode = self.pending_challenge
+        if bot_username:
+            bot_profile = self.opponent_index.public_data(bot_username)
+            if not bot_profile.done():
+                return  # Check again after the next event, instead of waiting for lichess.org.
+            try:
+                if bot_profile.result().get("blocking"):
+                    self.add_to_block_list(bot_username)
+                    bot_username = None
+            except Exception:
+                logger.exception("Error:")
+                bot_username = None
+        self.pending_challenge = None
         logger.info(f"Will challenge {bot_username} for a {variant} game.")
         challenge_id = self.create_challenge(bot_username, base_time, increment, days, variant, mode) if bot_username else ""
         logger.info(f"Challenge id is {challenge_id if challenge_id else 'None'}.")
         self.challenge_id = challenge_id
 
+    def close(self) -> None:
+        """Stop refreshing the index of the online bots."""
+        self.opponent_index.close()
+
     def discard_challenge(self, challenge_id: str) -> None:
         """
         Clear the ID of the most recent challenge if it is no longer needed.
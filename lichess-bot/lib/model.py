@@ -8,7 +8,7 @@ from lib.timer import Timer, msec, seconds, sec_str, to_msec, to_seconds, years
 from lib.config import Configuration
 from collections import defaultdict
 from lib.types import UserProfileType, ChallengeType, GameEventType, GameStateType, PlayerType
-from typing import Optional
+from typing import NamedTuple, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -149,6 +149,18 @@ class Termination(str, Enum):
     DRAW = "draw"
 
 
+class GameSnapshot(NamedTuple):
+    """
+    The fields of a game state that the next game state is compared with (see `game_changed` in `lichess-bot.py`).
+
+    It replaces a deep copy of the whole `Game` (its players, timers and state) after every game state, which costs about
+    a hundred times more (see `benchmarks/bench_game_snapshot.py`). The moves string is immutable, so the snapshot only
+    holds a reference to it.
+    """
+
+    moves: str
+
+
 class Game:
     """Store information about a game."""
 
@@ -258,6 +270,10 @@ class Game:
 
         return result.value
 
+    def snapshot(self) -> GameSnapshot:
+        """Record the fields of the game state that are compared with the next game state."""
+        return GameSnapshot(self.state["moves"])
+
     def __str__(self) -> str:
         """Get a string representation of `Game`."""
         return f"{self.url()} {self.perf_name} vs {self.opponent} ({self.id})"
@@ -0,0 +1,107 @@
+"""
+Keep the board of a game up to date with the moves sent by lichess.
+
+Lichess sends the whole move list with every `gameState` event. Replaying it each time costs O(game length) per update,
+which adds up in long correspondence games. `MoveHistory` only applies the moves that are new since the last update, and
+keeps the moves of each side in UCI and SAN for the prompts of the LLM agents.
+"""
+import chess
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class MoveHistory:
+    """The board of a game and the moves played by each side."""
+
+    def __init__(self, board: chess.Board) -> None:
+        """:param board: The starting position of the game. It becomes the live board of the game."""
+        self.board = board
+        self.starting_board = board.copy(stack=False)
+        self.received = ""
+        self.moves: dict[chess.Color, list[chess.Move]] = {chess.WHITE: [], chess.BLACK: []}
+        self.san: dict[chess.Color, list[str]] = {chess.WHITE: [], chess.BLACK: []}
+        self.rendered: dict[chess.Color, Optional[str]] = {chess.WHITE: None, chess.BLACK: None}
+
+    def update(self, moves: str) -> chess.Board:
+        """
+        Bring the board up to date with the move list of a `gameState` event.
+
+        Only the moves after the ones already applied are played. After a takeback, or any other change to the earlier
+        moves, the board is set up again from the starting position.
+
+        :param moves: The moves of the game in UCI, separated by spaces.
+        :return: The live board of the game.
+        """
+        if moves.startswith(self.received) and moves[len(self.received):len(self.received) + 1] in ("", " "):
+            new_moves = moves[len(self.received):]
+        else:
+            self.reset()
+            new_moves = moves
+        for uci in new_moves.split():
+            try:
+                self.push(self.board.parse_uci(uci))
+            except ValueError:
+                logger.exception(f"Ignoring illegal move {uci} on board {self.board.fen()}")
+        self.received = moves
+        return self.board
+
+    def sync(self, board: chess.Board) -> chess.Board:
+        """
+        Bring the history up to date with the moves played on another board of the same game.
+
+        Moves that differ from the ones in the history, e.g. after a takeback, are undone first.
+
+        :param board: A board with the moves of the game on its move stack.
+        :return: The board of the history.
+        """
+        stack = board.move_stack
+        played = self.board.move_stack
+        # The moves before the last one in common are taken to be the same.
+        common = min(len(stack), len(played))
+        while common and stack[common - 1] != played[common - 1]:
+            common -= 1
+        if common == 0 and board.root().fen() != self.starting_board.fen():
+            self.reset(board.root())
+        while len(self.board.move_stack) > common:
+            self.pop()
+        for move in stack[common:]:
+            self.push(move)
+        return self.board
+
+    def push(self, move: chess.Move) -> None:
+        """Play a move and record it for the side that played it."""
+        color = self.board.turn
+        self.san[color].append(self.board.san(move))
+        self.moves[color].append(move)
+        self.rendered[color] = None
+        self.board.push(move)
+
+    def pop(self) -> chess.Move:
+        """Undo the last move."""
+        move = self.board.pop()
+        color = self.board.turn
+        self.moves[color].pop()
+        self.san[color].pop()
+        self.rendered[color] = None
+        return move
+
+    def reset(self, board: Optional[chess.Board] = None) -> None:
+        """Go back to the starting position, or to `board` if given."""
+        if board is not None:
+            self.starting_board = board.copy(stack=False)
+        self.board.set_fen(self.starting_board.fen())
+        self.board.clear_stack()
+        self.received = ""
+        for color in chess.COLORS:
+            self.moves[color].clear()
+            self.san[color].clear()
+            self.rendered[color] = None
+
+    def san_text(self, color: chess.Color) -> str:
+        """Get the moves of one side in SAN, separated by spaces. The text is kept until that side moves again."""
+        text = self.rendered[color]
+        if text is None:
+            text = self.rendered[color] = " ".join(self.san[color])
+        return text
@@ -0,0 +1,190 @@
+"""
+Measure where the time of each move goes.
+
+`EngineWrapper.play_move` times each stage of a move in a `MoveTrace`:
+- "setup": from the game state being read to `play_move` being called.
+- "book", "egtb" and "online": the opening books, the endgame tablebases and the online sources.
+- "search": the engine's search. For the LLM agents, "llm" is the time of their calls to the LLMs, which is part of
+  "search" (and may be longer than it when the calls are made at the same time).
+- "fake_think_time": the wait for `fake_think_time`.
+- "make_move": sending the move (or the resignation) to lichess.org.
+- "total": the whole move.
+
+The stages of the last move are shown by `print_stats` and `!eval`. The times of all the moves of a game are kept in
+the `MoveTimings` of its engine, and the times of all the moves of a process in `move_timings`, which is written to
+`move_timings:directory` after each game, as Prometheus text (for the textfile collector of node_exporter) or as JSON.
+"""
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Iterator
+from typing import Any, Optional
+from lib.dispatcher import LATENCY_BUCKETS, LatencyHistogram
+from lib.types import InfoStrDict
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "lichess_bot_move"
+"""The prefix of the names of the Prometheus metrics."""
+
+
+def readable_seconds(seconds: float) -> str:
+    """Write a time briefly, e.g. 0.0123 -> 12ms and 1.234 -> 1.2s."""
+    return f"{seconds * 1000:.0f}ms" if seconds < 1 else f"{seconds:.1f}s"
+
+
+class MoveTrace:
+    """The time of each stage of one move."""
+
+    def __init__(self) -> None:
+        """Start without stages."""
+        self.lock = threading.Lock()
+        self.stages: dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        """Add time to a stage. The times of a stage that happens more than once in a move are added up."""
+        with self.lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        """Time the code of a with-block as a stage of the move."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def summary(self) -> str:
+        """Describe the stages that took at least a millisecond, e.g. "search 1.2s, make_move 85ms"."""
+        with self.lock:
+            stages = list(self.stages.items())
+        return ", ".join(f"{stage} {readable_seconds(seconds)}" for stage, seconds in stages if seconds >= 0.001)
+
+
+current_trace: contextvars.ContextVar[Optional[MoveTrace]] = contextvars.ContextVar("current_trace", default=None)
+"""The trace of the move being played by the current thread."""
+
+
+@contextlib.contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time the code of a with-block as a stage of the move being played, if there is one."""
+    trace = current_trace.get()
+    if trace is None:
+        yield
+        return
+    with trace.span(stage):
+        yield
+
+
+class MoveTimings:
+    """The histograms of the time of each stage of the moves."""
+
+    def __init__(self) -> None:
+        """Start without moves."""
+        self.lock = threading.Lock()
+        self.histograms: defaultdict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self.moves = 0
+        self.last_move: Optional[MoveTrace] = None
+
+    def record(self, trace: MoveTrace) -> None:
+        """Add the times of a move."""
+        with self.lock, trace.lock:
+            for stage, seconds in trace.stages.items():
+                self.histograms[stage].record(seconds)
+            self.moves += 1
+            self.last_move = trace
+
+    def stages(self) -> str:
+        """Describe the stages of the move being played by the current thread, or else of the last move recorded."""
+        trace = current_trace.get() or self.last_move
+        return trace.summary() if trace else ""
+
+    def add_stages(self, info: InfoStrDict) -> None:
+        """Add the stages of the move to the stats of the engine, unless no stage took a millisecond."""
+        stages = self.stages()
+        if stages:
+            info["Stages"] = stages
+
+    def summary(self) -> list[str]:
+        """Describe each histogram in a log line."""
+        with self.lock:
+            return [f"{stage}: {histogram.summary()}" for stage, histogram in self.histograms.items()]
+
+    def prometheus(self, labels: str = "") -> str:
+        """
+        Write the histograms in the text format of Prometheus.
+
+        :param labels: Labels added to every sample, e.g. 'process="1234"'.
+        """
+        extra_labels = f",{labels}" if labels else ""
+        name = f"{METRIC_PREFIX}_stage_seconds"
+        lines = [f"# HELP {name} The time of each stage of the moves.", f"# TYPE {name} histogram"]
+        with self.lock:
+            for stage, histogram in self.histograms.items():
+                for bound, count in zip([*map(str, LATENCY_BUCKETS), "+Inf"], cumulative_counts(histogram)):
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"{extra_labels}}} {count}')
+                lines.append(f'{name}_sum{{stage="{stage}"{extra_labels}}} {histogram.total}')
+                lines.append(f'{name}_count{{stage="{stage}"{extra_labels}}} {histogram.count}')
+            lines += [f"# HELP {METRIC_PREFIX}s_total The moves played.", f"# TYPE {METRIC_PREFIX}s_total counter",
+                      f"{METRIC_PREFIX}s_total{{{labels}}} {self.moves}" if labels else f"{METRIC_PREFIX}s_total {self.moves}"]
+        return "\n".join(lines) + "\n"
+
+    def to_json(self) -> dict[str, Any]:
+        """Get the histograms as a JSON object. The counts of the buckets are cumulative, as in Prometheus."""
+        with self.lock:
+            stages = {stage: {"count": histogram.count, "sum": histogram.total, "max": histogram.longest,
+                              "p50": histogram.quantile(0.5), "p99": histogram.quantile(0.99),
+                              "buckets": dict(zip([*map(str, LATENCY_BUCKETS), "+Inf"], cumulative_counts(histogram)))}
+                      for stage, histogram in self.histograms.items()}
+            return {"moves": self.moves, "stages": stages}
+
+
+def cumulative_counts(histogram: LatencyHistogram) -> list[int]:
+    """Count the times that don't exceed each bound of `LATENCY_BUCKETS`, and then all the times."""
+    counts = []
+    total = 0
+    for count in histogram.counts:
+        total += count
+        counts.append(total)
+    return counts
+
+
+def write_move_timings(directory: str, export_format: str) -> None:
+    """
+    Write the times of the moves of this process to `lichess_bot_<pid>.prom` or `lichess_bot_<pid>.json` in `directory`.
+
+    The file is replaced at once, so a reader never sees half of it. Each call writes its own temporary file, so the games
+    of the process can write the timings at the same time.
+
+    :param directory: The directory of the file.
+    :param export_format: "prometheus" or "json".
+    """
+    pid = os.getpid()
+    if export_format == "json":
+        text = json.dumps({"process": pid, **move_timings.to_json()})
+    else:
+        text = move_timings.prometheus(f'process="{pid}"')
+    path = os.path.join(directory, f"lichess_bot_{pid}.{'json' if export_format == 'json' else 'prom'}")
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directory, prefix=f"{os.path.basename(path)}.",
+                                         suffix=".tmp", delete=False) as timings_file:
+            timings_file.write(text)
+        try:
+            os.replace(timings_file.name, path)
+        except OSError:
+            os.remove(timings_file.name)
+            raise
+    except OSError:
+        logger.exception(f"Could not write the move timings to {path}:")
+
+
+move_timings = MoveTimings()
+"""The times of all the moves played by this process."""
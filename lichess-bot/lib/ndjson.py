@@ -0,0 +1,63 @@
+"""
+Read the newline-delimited JSON streams of lichess.org: the event stream and the game streams.
+
+`Response.iter_lines` reads a stream 512 bytes at a time, so a long line (the game state of a long game) is read in
+many pieces and joined again. Here the stream is read in pieces of up to `CHUNK_SIZE` bytes: the streams of lichess.org
+are chunked, so a big size doesn't hold up the events, each chunk is given as soon as it arrives. The lines are parsed by
+`orjson` if it is installed, and by `json` otherwise (see `benchmarks/bench_ndjson.py`).
+"""
+import json
+from collections.abc import Callable, Iterable, Iterator
+from typing import Any
+
+
+def json_loads(line: bytes) -> Any:
+    """Parse JSON with the standard library, which is faster from a `str` than from bytes."""
+    return json.loads(line.decode("utf-8"))
+
+
+try:
+    import orjson
+    json_decoder: Callable[[bytes], Any] = orjson.loads
+except ImportError:
+    json_decoder = json_loads
+
+CHUNK_SIZE = 2 ** 16
+"""The most bytes read from a stream at a time."""
+
+
+def read_lines(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Cut the pieces of a stream into lines, without their newline. The empty lines (the keep-alive lines) are included."""
+    pending = b""
+    for chunk in chunks:
+        if b"\n" not in chunk:
+            pending += chunk
+            continue
+        lines = (pending + chunk if pending else chunk).split(b"\n")
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+def parse_line(line: bytes, decoder: Callable[[bytes], Any] = json_decoder) -> Any:
+    """
+    Parse a line of a stream.
+
+    :param line: The line.
+    :param decoder: Parses JSON from bytes.
+    :return: The event, or an empty dict for a keep-alive line.
+    """
+    return decoder(line) if line.strip() else {}
+
+
+def read_events(chunks: Iterable[bytes], decoder: Callable[[bytes], Any] = json_decoder) -> Iterator[Any]:
+    """
+    Read the events of a stream.
+
+    :param chunks: The pieces of the stream, e.g. `response.iter_content(CHUNK_SIZE)`.
+    :param decoder: Parses JSON from bytes.
+    :return: The events, with an empty dict for each keep-alive line.
+    """
+    for line in read_lines(chunks):
+        yield parse_line(line, decoder)
@@ -0,0 +1,201 @@
+"""
+A persistent cache of the answers of the online move sources.
+
+The same opening positions come up in game after game, but chessdb.cn, the lichess cloud analysis, the opening explorer
+and the lichess tablebase were asked about them every time. `OnlineCache` saves the JSON answers in SQLite, keyed by the
+request with the position's FEN in it. Each site has its own time to live, and the least recently used answers are
+deleted when the cache is full. Answers without a move (errors, unknown positions) are only kept for `NEGATIVE_TTL`,
+because the sites may know the position later, and failed requests are not saved at all.
+"""
+import os
+import json
+import sqlite3
+import threading
+import time
+import logging
+from collections.abc import Callable, Mapping
+from typing import Optional, Union
+from urllib.parse import urlencode
+from lib.types import OnlineType
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = "online_cache.sqlite"
+DEFAULT_MAX_ENTRIES = 200_000
+DAY = 24 * 60 * 60
+
+SOURCES = {"chessdb": "https://www.chessdb.cn/",
+           "lichess_cloud_analysis": "https://lichess.org/api/cloud-eval",
+           "lichess_opening_explorer": "https://explorer.lichess.ovh/",
+           "lichess_tablebase": "https://tablebase.lichess.ovh/"}
+"""The url prefix of each cached site."""
+
+DEFAULT_TTLS = {"chessdb": 7 * DAY,
+                "lichess_cloud_analysis": DAY,
+                "lichess_opening_explorer": 7 * DAY,
+                "lichess_tablebase": 365 * DAY}
+"""How many seconds an answer of each site is kept. The cloud analyses get deeper over time, the tablebases never change."""
+
+NEGATIVE_TTL = 60 * 60
+"""How many seconds an answer without a move is kept, unless the site's time to live is shorter."""
+
+PARAMS_TYPE = Mapping[str, Union[str, int]]
+
+
+def source_of(url: str) -> Optional[str]:
+    """Get the name of the site of a url, or `None` if its answers are not cached."""
+    return next((source for source, prefix in SOURCES.items() if url.startswith(prefix)), None)
+
+
+def has_move(response: OnlineType) -> bool:
+    """Check if an answer has a move. Errors, unknown positions and empty lists of moves don't."""
+    return ("error" not in response and response.get("status", "ok") == "ok"
+            and response.get("moves") != [] and response.get("pvs") != [])
+
+
+def request_key(source: str, url: str, params: PARAMS_TYPE) -> str:
+    """
+    Get the key of a request.
+
+    The move counters are removed from the FEN, so that a position reached at a different move number is answered from
+    the cache too. The tablebase is the exception, as the halfmove clock changes its answers.
+    """
+    normalized = dict(params)
+    for name in ("fen", "board"):
+        if name in normalized and source != "lichess_tablebase":
+            normalized[name] = " ".join(str(normalized[name]).split()[:4])
+    return f"{url}?{urlencode(sorted(normalized.items()))}"
+
+
+class OnlineCache:
+    """Store the answers of the online move sources."""
+
+    def __init__(self, path: str = DEFAULT_PATH, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 ttls: Optional[Mapping[str, float]] = None, negative_ttl: float = NEGATIVE_TTL) -> None:
+        """
+        Open (and create if needed) the cache.
+
+        :param path: The SQLite file. Use ":memory:" for a cache that is not saved.
+        :param max_entries: The maximum number of answers kept. The least recently used are deleted first.
+        :param ttls: The number of seconds the answers of each site are kept, by the names in `SOURCES`. Missing sites use
+            `DEFAULT_TTLS`.
+        :param negative_ttl: The number of seconds the answers without a move are kept.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttls = DEFAULT_TTLS | dict(ttls or {})
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            # Several games (processes) may share the file.
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS responses (request TEXT PRIMARY KEY, source TEXT NOT NULL, "
+                                "response TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+    def get(self, url: str, params: PARAMS_TYPE) -> Optional[OnlineType]:
+        """
+        Get the saved answer to a request.
+
+        :param url: The url of the request.
+        :param params: The parameters of the request.
+        :return: The answer, or `None` if there is no fresh answer or the site is not cached.
+        """
+        source = source_of(url)
+        if source is None:
+            return None
+        key = request_key(source, url, params)
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute("SELECT response, created FROM responses WHERE request = ?", (key,)).fetchone()
+            response: Optional[OnlineType] = json.loads(row[0]) if row is not None else None
+            if row is None or response is None or now - row[1] >= self.ttl(source, response):
+                self.misses += 1
+                if row is not None:
+                    self.connection.execute("DELETE FROM responses WHERE request = ?", (key,))
+                return None
+            self.hits += 1
+            self.connection.execute("UPDATE responses SET last_used = ? WHERE request = ?", (now, key))
+        return response
+
+    def ttl(self, source: str, response: OnlineType) -> float:
+        """Get the number of seconds an answer of a site is kept."""
+        return self.ttls[source] if has_move(response) else min(self.ttls[source], self.negative_ttl)
+
+    def put(self, url: str, params: PARAMS_TYPE, response: OnlineType) -> None:
+        """
+        Save the answer to a request. Answers of sites that are not in `SOURCES` are not saved.
+
+        :param url: The url of the request.
+        :param params: The parameters of the request.
+        :param response: The JSON answer.
+        """
+        source = source_of(url)
+        if source is None:
+            return
+        key = request_key(source, url, params)
+        now = time.time()
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                                    (key, source, json.dumps(response), now, now))
+            self.connection.execute("DELETE FROM responses WHERE rowid IN "
+                                    "(SELECT rowid FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                                    (self.max_entries,))
+
+    def fetch(self, url: str, params: PARAMS_TYPE, download: Callable[[], OnlineType]) -> OnlineType:
+        """
+        Get the answer to a request from the cache, or download and save it.
+
+        :param url: The url of the request.
+        :param params: The parameters of the request.
+        :param download: Sends the request. Its exceptions are raised and nothing is saved, so the request is sent again
+            the next time.
+        :return: The answer.
+        """
+        response = self.get(url, params)
+        if response is None:
+            response = download()
+            self.put(url, params, response)
+        return response
+
+    def __len__(self) -> int:
+        """Get the number of saved answers."""
+        with self.lock:
+            count: int = self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return count
+
+    def stats(self) -> str:
+        """Get the hit and miss counters."""
+        total = self.hits + self.misses
+        hit_rate = f"{self.hits / total:.0%}" if total else "n/a"
+        return f"{self.hits} hits, {self.misses} misses ({hit_rate} hit rate)"
+
+    def close(self) -> None:
+        """Close the database."""
+        with self.lock:
+            self.connection.close()
+
+
+open_caches: dict[str, OnlineCache] = {}
+open_caches_lock = threading.Lock()
+
+
+def open_online_cache(path: str = DEFAULT_PATH, max_entries: int = DEFAULT_MAX_ENTRIES,
+                      ttls: Optional[Mapping[str, float]] = None) -> OnlineCache:
+    """
+    Get the cache stored in `path`.
+
+    The cache is opened once per process and shared by all the games played by the process.
+    """
+    path = path if path == ":memory:" else os.path.abspath(path)
+    with open_caches_lock:
+        cache = open_caches.get(path)
+        if cache is None:
+            cache = OnlineCache(path, max_entries, ttls)
+            open_caches[path] = cache
+            logger.info(f"Opened the online move cache {path} with {len(cache)} answers.")
+        return cache
@@ -0,0 +1,140 @@
+"""
+Keep an index of the online bots and a cache of their public data, for matchmaking.
+
+Choosing an opponent used to download and parse the list of online bots, filter all of them, and then download the
+public data of the pick, all in the main loop, which doesn't handle the events meanwhile. `OpponentIndexService`
+downloads the list in a background thread every `matchmaking:online_bots_refresh` minutes and sorts the bots by rating
+for each game type, so the bots in a rating range are found with a binary search. The public data of the bots (which
+tells whether they block us) are downloaded in the background too, and kept for `matchmaking:bot_profile_cache_time`
+minutes.
+"""
+import bisect
+import datetime
+import logging
+import threading
+import test_bot.lichess
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import defaultdict
+from typing import Optional, Union
+from lib import lichess
+from lib.timer import Timer, to_seconds
+from lib.types import PublicDataType, UserProfileType
+
+LICHESS_TYPE = Union[lichess.Lichess, test_bot.lichess.Lichess]
+
+logger = logging.getLogger(__name__)
+
+
+class OpponentIndex:
+    """The online bots that played each game type (e.g. blitz, atomic), sorted by their rating in it."""
+
+    def __init__(self, online_bots: list[UserProfileType]) -> None:
+        """:param online_bots: The online bots, as given by `Lichess.get_online_bots`."""
+        rated_bots: defaultdict[str, list[tuple[int, UserProfileType]]] = defaultdict(list)
+        for bot in online_bots:
+            for game_type, perf in bot.get("perfs", {}).items():
+                if perf.get("games", 0) > 0:
+                    rated_bots[game_type].append((perf.get("rating", 0), bot))
+
+        self.ratings: dict[str, list[int]] = {}
+        self.bots: dict[str, list[UserProfileType]] = {}
+        for game_type, bots in rated_bots.items():
+            bots.sort(key=lambda rated_bot: rated_bot[0])
+            self.ratings[game_type] = [rating for rating, _ in bots]
+            self.bots[game_type] = [bot for _, bot in bots]
+        self.size = len(online_bots)
+
+    def bots_in_range(self, game_type: str, min_rating: int, max_rating: int) -> list[UserProfileType]:
+        """
+        Get the bots that played `game_type`, with a rating in it between `min_rating` and `max_rating` (inclusive).
+
+        :return: The bots, from the lowest to the highest rated.
+        """
+        ratings = self.ratings.get(game_type, [])
+        start = bisect.bisect_left(ratings, min_rating)
+        end = bisect.bisect_right(ratings, max_rating)
+        return self.bots.get(game_type, [])[start:end]
+
+
+class OpponentIndexService:
+    """Refresh the index of the online bots in a background thread, and download the public data of the bots."""
+
+    def __init__(self, li: LICHESS_TYPE, refresh_period: datetime.timedelta, profile_cache_time: datetime.timedelta) -> None:
+        """
+        Create the service. It doesn't download anything before `start` is called.
+
+        :param li: Provides communication with lichess.org.
+        :param refresh_period: The time between the downloads of the list of online bots.
+        :param profile_cache_time: How long the public data of a bot are kept.
+        """
+        self.li = li
+        self.refresh_period = refresh_period
+        self.profile_cache_time = profile_cache_time
+        self.index = OpponentIndex([])
+        self.refreshed = threading.Event()
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.profiles: dict[str, tuple[Timer, Future[PublicDataType]]] = {}
+        self.profile_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bot-profile")
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start refreshing the index in the background."""
+        self.thread = threading.Thread(target=self.refresh_loop, name="opponent-index", daemon=True)
+        self.thread.start()
+
+    def refresh_loop(self) -> None:
+        """Refresh the index every `refresh_period` until the service is closed."""
+        while not self.stopped.is_set():
+            self.refresh()
+            self.stopped.wait(to_seconds(self.refresh_period))
+
+    def refresh(self) -> None:
+        """
+        Download the list of online bots and replace the index. Forget the expired public data.
+
+        If the download fails or finds no bots, the previous index is kept until the next refresh.
+        """
+        timer = Timer()
+        try:
+            online_bots = self.li.get_online_bots()
+        except Exception:
+            logger.exception("Could not download the list of online bots:")
+            online_bots = []
+        if online_bots:
+            index = OpponentIndex(online_bots)
+            self.index = index
+            logger.debug(f"Indexed {index.size} online bots in {timer.time_since_reset()}.")
+        else:
+            logger.warning(f"No online bots were downloaded. Keeping the previous index of {self.index.size} bots.")
+        self.refreshed.set()
+        with self.lock:
+            for username in [name for name, (expiration, _) in self.profiles.items() if expiration.is_expired()]:
+                del self.profiles[username]
+
+    def bots_in_range(self, game_type: str, min_rating: int, max_rating: int) -> list[UserProfileType]:
+        """Get the online bots that played `game_type` with a rating between `min_rating` and `max_rating`."""
+        return self.index.bots_in_range(game_type, min_rating, max_rating)
+
+    def public_data(self, username: str) -> Future[PublicDataType]:
+        """
+        Get the public data of a bot, without waiting for lichess.org.
+
+        :param username: The name of the bot.
+        :return: The public data, which are being downloaded in the background if `done()` is False. The data that
+            couldn't be downloaded are downloaded again on the next call.
+        """
+        with self.lock:
+            cached = self.profiles.get(username)
+            if cached:
+                expiration, profile = cached
+                if not expiration.is_expired() and not (profile.done() and profile.exception()):
+                    return profile
+            profile = self.profile_executor.submit(self.li.get_public_data, username)
+            self.profiles[username] = (Timer(self.profile_cache_time), profile)
+            return profile
+
+    def close(self) -> None:
+        """Stop refreshing the index and cancel the downloads of public data."""
+        self.stopped.set()
+        self.profile_executor.shutdown(wait=False, cancel_futures=True)
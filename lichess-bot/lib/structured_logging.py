@@ -0,0 +1,140 @@
+"""
+Keep logging cheap when many games are played at once.
+
+The records of the game processes and of the game runner are sent to the logging listener through the logging queue.
+`QueueHandler` formats every message before sending it, so the multi-KB answers of the LLM agents were formatted (and the
+board states pretty-printed) in the game's thread, even when no handler of the listener writes them.
+- `LazyQueueHandler` sends the message and its arguments as they are when the arguments are simple values, so the
+  message is formatted by the listener.
+- `GameFilter` tags each record with the id of the game being played (`current_game`), and drops the INFO and DEBUG
+  records of the games left out by `logging:game_sample_rate` before they are sent.
+- `JsonLinesFormatter` writes the log files as one JSON object per line when `logging:format` is "json".
+- The homemade engines log the board states and the answers of the LLMs to `TRANSCRIPT_LOGGER`. When
+  `logging:transcript_file` is set, these records are written to that gzip file instead of the console and the log files.
+"""
+import contextvars
+import copy
+import datetime
+import gzip
+import io
+import json
+import logging
+import logging.handlers
+import pprint
+import zlib
+from typing import Any, Optional
+from lib.timer import Timer, seconds
+
+TRANSCRIPT_LOGGER = "transcripts"
+"""The logger of the board states and the answers of the LLMs."""
+
+TRANSCRIPT_FLUSH_PERIOD = seconds(5)
+"""The longest time the records of the transcript file are kept in memory. Flushing after each record wastes the
+compression."""
+
+current_game: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_game", default=None)
+"""The id of the game played by the current thread or task."""
+
+
+class LazyPformat:
+    """A value that is only pretty-printed when the message that contains it is written."""
+
+    def __init__(self, value: Any) -> None:
+        """:param value: The value. A shallow copy is kept, because the record may be sent after the value changes."""
+        self.value = copy.copy(value)
+
+    def __str__(self) -> str:
+        """Pretty-print the value."""
+        return pprint.pformat(self.value)
+
+
+LAZY_ARG_TYPES = (str, int, float, bool, type(None), LazyPformat)
+"""The arguments of a message that are sent unformatted to the logging listener."""
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """A `QueueHandler` that leaves the formatting of the messages to the logging listener when it can."""
+
+    def prepare(self, record: logging.LogRecord) -> Any:
+        """Send the record as is if its message and arguments can be sent, else format it like `QueueHandler`."""
+        if (record.exc_info or record.stack_info or not isinstance(record.msg, str) or not isinstance(record.args, tuple)
+                or not all(isinstance(arg, LAZY_ARG_TYPES) for arg in record.args)):
+            return super().prepare(record)
+        return copy.copy(record)
+
+
+def is_sampled(game_id: str, sample_rate: float) -> bool:
+    """Whether the INFO and DEBUG records of a game are logged. Every process makes the same choice for a game."""
+    return sample_rate >= 1 or zlib.crc32(game_id.encode()) % 10000 < sample_rate * 10000
+
+
+class GameFilter(logging.Filter):
+    """Tag the records with the game being played, and drop the INFO and DEBUG records of the games not sampled."""
+
+    def __init__(self, sample_rate: float = 1.0) -> None:
+        """:param sample_rate: The fraction of the games whose INFO and DEBUG records are logged."""
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Tag the record with the game. Keep it unless it is an INFO or DEBUG record of a game not sampled."""
+        game_id = current_game.get()
+        record.game = game_id
+        return game_id is None or record.levelno >= logging.WARNING or is_sampled(game_id, self.sample_rate)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Write each record as a JSON object on one line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Get the JSON line of a record."""
+        entry = {"time": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+                 "level": record.levelname,
+                 "logger": record.name,
+                 "file": record.filename,
+                 "line": record.lineno,
+                 "game": getattr(record, "game", None),
+                 "message": record.getMessage()}
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class GzipFileHandler(logging.FileHandler):
+    """Append the records to a gzip file. The file is only opened when the first record is written."""
+
+    def __init__(self, filename: str) -> None:
+        """:param filename: The name of the file."""
+        super().__init__(filename, mode="ab", encoding="utf-8", delay=True)
+        self.flush_timer = Timer(TRANSCRIPT_FLUSH_PERIOD)
+
+    def _open(self) -> io.TextIOWrapper:
+        """Open the file. Each run of lichess-bot adds a member to the file, which `gzip` reads as one stream."""
+        return io.TextIOWrapper(gzip.GzipFile(self.baseFilename, self.mode), encoding=self.encoding)
+
+    def flush(self) -> None:
+        """Write the compressed records to the file, at most once every `TRANSCRIPT_FLUSH_PERIOD`."""
+        if self.flush_timer.is_expired():
+            super().flush()
+            self.flush_timer.reset()
+
+
+def route_transcripts(transcript_file: Optional[str], formatter: logging.Formatter) -> None:
+    """
+    Write the records of `TRANSCRIPT_LOGGER` to a gzip file, or let them go to the other handlers.
+
+    :param transcript_file: The name of the gzip file. If it is `None` or empty, the transcripts are logged like the
+        other records.
+    :param formatter: The formatter of the records in the file.
+    """
+    transcript_logger = logging.getLogger(TRANSCRIPT_LOGGER)
+    for handler in transcript_logger.handlers[:]:
+        transcript_logger.removeHandler(handler)
+        handler.close()
+    transcript_logger.propagate = not transcript_file
+    if transcript_file:
+        handler = GzipFileHandler(transcript_file)
+        handler.setFormatter(formatter)
+        transcript_logger.addHandler(handler)
@@ -0,0 +1,151 @@
+"""
+Keep the local endgame tablebases open for the whole process and remember their answers.
+
+Opening a tablebase scans its directories, and choosing a move probes every legal child position. `TablebaseService`
+opens each set of directories once and shares it between all the games played by the process. The probes go through an
+LRU cache keyed by the zobrist hash of the position, so a position seen in an earlier move or game is not probed again.
+"""
+import threading
+import logging
+import chess
+import chess.gaviota
+import chess.polyglot
+import chess.syzygy
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Union, cast
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SIZE = 200_000
+"""The number of probe results kept in memory."""
+
+GaviotaTablebase = Union[chess.gaviota.NativeTablebase, chess.gaviota.PythonTablebase]
+TablebaseType = Union[chess.syzygy.Tablebase, GaviotaTablebase]
+
+
+class ProbeCache:
+    """A bounded LRU cache of probe results, shared by all the tablebases of the process."""
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_SIZE) -> None:
+        """:param max_entries: The number of results kept. The least recently used ones are dropped first."""
+        self.max_entries = max_entries
+        # A missing table is stored as the message of its `KeyError`. Raising the same exception object again and again
+        # would keep adding the frames of each probe (and their boards) to its traceback.
+        self.results: OrderedDict[tuple[str, str, int], Union[int, str]] = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def probe(self, kind: str, name: str, board: chess.Board, probe: Callable[[chess.Board], int]) -> int:
+        """
+        Get a probe result from the cache, or probe the tablebase and remember the result.
+
+        A missing table is remembered too, and raises `KeyError` again without touching the files.
+
+        :param kind: The kind of probe, e.g. "dtz".
+        :param name: The tablebase and the variant, so that different tablebases don't share results.
+        :param board: The position to probe.
+        :param probe: The probe function of the tablebase.
+        :return: The result of the probe.
+        """
+        key = (kind, name, chess.polyglot.zobrist_hash(board))
+        with self.lock:
+            result = self.results.get(key)
+            if result is not None:
+                self.results.move_to_end(key)
+                self.hits += 1
+        if result is None:
+            try:
+                result = probe(board)
+            except KeyError as error:
+                result = str(error.args[0]) if error.args else ""
+            with self.lock:
+                self.misses += 1
+                self.results[key] = result
+                if len(self.results) > self.max_entries:
+                    self.results.popitem(last=False)
+        if isinstance(result, str):
+            raise KeyError(result)
+        return result
+
+    def clear(self) -> None:
+        """Forget all the results."""
+        with self.lock:
+            self.results.clear()
+
+
+class CachedTablebase:
+    """A tablebase whose probes go through the probe cache."""
+
+    def __init__(self, tablebase: TablebaseType, name: str, cache: ProbeCache) -> None:
+        """
+        Wrap an open tablebase.
+
+        :param tablebase: The open tablebase.
+        :param name: A name that is unique to the directories of the tablebase.
+        :param cache: The cache of the probe results.
+        """
+        self.tablebase = tablebase
+        self.name = name
+        self.cache = cache
+
+    def probe_wdl(self, board: chess.Board) -> int:
+        """Probe the win/draw/loss table."""
+        return self.cache.probe("wdl", f"{self.name} {board.uci_variant}", board, self.tablebase.probe_wdl)
+
+    def probe_dtz(self, board: chess.Board) -> int:
+        """Probe the distance to zeroing table. Only for syzygy tablebases."""
+        tablebase = cast(chess.syzygy.Tablebase, self.tablebase)
+        return self.cache.probe("dtz", f"{self.name} {board.uci_variant}", board, tablebase.probe_dtz)
+
+    def probe_dtm(self, board: chess.Board) -> int:
+        """Probe the distance to mate table. Only for gaviota tablebases."""
+        tablebase = cast(GaviotaTablebase, self.tablebase)
+        return self.cache.probe("dtm", f"{self.name} {board.uci_variant}", board, tablebase.probe_dtm)
+
+    def close(self) -> None:
+        """Close the tablebase files."""
+        self.tablebase.close()
+
+
+class TablebaseService:
+    """Open the tablebases once per process and share them between the games."""
+
+    def __init__(self, cache_size: int = DEFAULT_CACHE_SIZE) -> None:
+        """:param cache_size: The number of probe results kept in memory."""
+        self.cache = ProbeCache(cache_size)
+        self.tablebases: dict[tuple[str, ...], CachedTablebase] = {}
+        self.lock = threading.Lock()
+
+    def syzygy(self, paths: list[str]) -> CachedTablebase:
+        """Get the syzygy tablebase with the files in `paths`."""
+        return self.open("syzygy", paths, chess.syzygy.open_tablebase)
+
+    def gaviota(self, paths: list[str]) -> CachedTablebase:
+        """Get the gaviota tablebase with the files in `paths`."""
+        return self.open("gaviota", paths, chess.gaviota.open_tablebase)
+
+    def open(self, kind: str, paths: list[str], open_tablebase: Callable[[str], TablebaseType]) -> CachedTablebase:
+        """Open a tablebase the first time it is needed."""
+        key = (kind, *paths)
+        with self.lock:
+            tablebase = self.tablebases.get(key)
+            if tablebase is None:
+                opened = open_tablebase(paths[0])
+                for path in paths[1:]:
+                    opened.add_directory(path)
+                tablebase = self.tablebases[key] = CachedTablebase(opened, " ".join(key), self.cache)
+                logger.info(f"Opened the {kind} tablebases in {', '.join(paths)}.")
+            return tablebase
+
+    def close(self) -> None:
+        """Close all the tablebases and forget the probe results."""
+        with self.lock:
+            for tablebase in self.tablebases.values():
+                tablebase.close()
+            self.tablebases.clear()
+            self.cache.clear()
+
+
+tablebase_service = TablebaseService()
@@ -1,16 +1,20 @@
 """Some type hints that can be accessed by all other python files."""
-from typing import Any, Callable, Optional, Union, TypedDict, Literal, Type
+from typing import Any, Callable, Optional, Union, TypedDict, Literal, Type, TYPE_CHECKING
 from chess.engine import PovWdl, PovScore, PlayResult, Limit, Opponent
 from chess import Move, Board
-from queue import Queue
+from multiprocessing.queues import Queue, SimpleQueue
 import logging
 from enum import Enum
 from types import TracebackType
 
 COMMANDS_TYPE = list[str]
 MOVE = Union[PlayResult, list[Move]]
-CORRESPONDENCE_QUEUE_TYPE = Queue[str]
-LOGGING_QUEUE_TYPE = Queue[logging.LogRecord]
+if TYPE_CHECKING:
+    CORRESPONDENCE_QUEUE_TYPE = Queue[str]
+    LOGGING_QUEUE_TYPE = Queue[Optional[logging.LogRecord]]
+    GAME_RUNNER_QUEUE_TYPE = Queue[Optional[str]]
+else:  # The multiprocessing queues can't be subscripted at runtime.
+    CORRESPONDENCE_QUEUE_TYPE = LOGGING_QUEUE_TYPE = GAME_RUNNER_QUEUE_TYPE = Queue
 REQUESTS_PAYLOAD_TYPE = dict[str, Union[str, int, bool]]
 GO_COMMANDS_TYPE = dict[str, str]
 EGTPATH_TYPE = dict[str, str]
@@ -107,12 +111,13 @@ class InfoStrDict(TypedDict, total=False):
     string: str
     ponderpv: str
     Source: str
+    Stages: str
     Pv: str
 
 
 InfoDictKeys = Literal["score", "pv", "depth", "seldepth", "time", "nodes", "nps", "tbhits", "multipv", "currmove",
                        "currmovenumber", "hashfull", "cpuload", "refutation", "currline", "ebf", "wdl", "string",
-                       "ponderpv", "Source", "Pv"]
+                       "ponderpv", "Source", "Stages", "Pv"]
 
 
 InfoDictValue = Union[PovScore, list[Move], int, float, str, Move, dict[Move, list[Move]], dict[int, list[Move]], PovWdl]
@@ -254,7 +259,10 @@ class GameEventType(TypedDict, total=False):
     btakeback: bool
 
 
-CONTROL_QUEUE_TYPE = Queue[EventType]
+if TYPE_CHECKING:
+    CONTROL_QUEUE_TYPE = SimpleQueue[EventType]
+else:
+    CONTROL_QUEUE_TYPE = SimpleQueue
 
 
 class PublicDataType(TypedDict, total=False):
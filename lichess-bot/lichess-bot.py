@@ -1,10 +1,11 @@
 """The main module that controls lichess-bot."""
+from __future__ import annotations
 import argparse
+import asyncio
 import chess
 import chess.pgn
 from chess.variant import find_variant
-from lib import engine_wrapper, model, lichess, matchmaking
-import json
+from lib import engine_wrapper, model, lichess, matchmaking, ipc, ndjson, structured_logging, move_timing
 import logging
 import logging.handlers
 import multiprocessing
@@ -14,45 +15,46 @@ import datetime
 import backoff
 import os
 import io
-import copy
 import math
 import sys
 import yaml
 import traceback
 import itertools
+import contextlib
+import contextvars
 import glob
 import platform
 import importlib.metadata
 import test_bot.lichess
 from lib.config import load_config, Configuration
 from lib.conversation import Conversation, ChatLine
+from lib.dispatcher import DispatchStats, SideTasks
+from lib.move_history import MoveHistory
 from lib.timer import Timer, seconds, msec, hours, to_seconds
 from lib.types import (UserProfileType, EventType, GameType, GameEventType, CONTROL_QUEUE_TYPE, CORRESPONDENCE_QUEUE_TYPE,
                        LOGGING_QUEUE_TYPE)
 from requests.exceptions import ChunkedEncodingError, ConnectionError, HTTPError, ReadTimeout
 from rich.logging import RichHandler
 from collections import defaultdict
-from collections.abc import Iterator, MutableSequence
+from collections.abc import AsyncIterator, Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from http.client import RemoteDisconnected
 from queue import Empty
 from multiprocessing.pool import Pool
-from typing import Optional, Union, TypedDict
-from types import FrameType
-MULTIPROCESSING_LIST_TYPE = MutableSequence[model.Challenge]
+from typing import Any, Optional, TypeVar, Union, TypedDict, cast
+from types import FrameType, TracebackType
+CHALLENGE_QUEUE_TYPE = list[model.Challenge]
 LICHESS_TYPE = Union[lichess.Lichess, test_bot.lichess.Lichess]
 POOL_TYPE = Pool
+T = TypeVar("T")
 
 
 class PlayGameArgsType(TypedDict, total=False):
     """Type hint for `play_game_args`."""
 
     li: LICHESS_TYPE
-    control_queue: CONTROL_QUEUE_TYPE
     user_profile: UserProfileType
     config: Configuration
-    challenge_queue: MULTIPROCESSING_LIST_TYPE
-    correspondence_queue: CORRESPONDENCE_QUEUE_TYPE
-    logging_queue: LOGGING_QUEUE_TYPE
     game_id: str
 
 
@@ -107,18 +109,16 @@ def watch_control_stream(control_queue: CONTROL_QUEUE_TYPE, li: LICHESS_TYPE) ->
     while not terminated:
         try:
             response = li.get_event_stream()
-            lines = response.iter_lines()
-            for line in lines:
-                if line:
-                    event = json.loads(line.decode("utf-8"))
-                    control_queue.put_nowait(event)
+            for event in ndjson.read_events(response.iter_content(ndjson.CHUNK_SIZE)):
+                if event:
+                    control_queue.put(event)
                 else:
-                    control_queue.put_nowait({"type": "ping"})
+                    control_queue.put({"type": "ping"})
         except Exception:
             error = traceback.format_exc()
             break
 
-    control_queue.put_nowait({"type": "terminated", "error": error})
+    control_queue.put({"type": "terminated", "error": error})
 
 
 def do_correspondence_ping(control_queue: CONTROL_QUEUE_TYPE, period: datetime.timedelta) -> None:
@@ -129,7 +129,7 @@ def do_correspondence_ping(control_queue: CONTROL_QUEUE_TYPE, period: datetime.t
     """
     while not terminated:
         time.sleep(to_seconds(period))
-        control_queue.put_nowait({"type": "correspondence_ping"})
+        control_queue.put({"type": "correspondence_ping"})
 
 
 def handle_old_logs(auto_log_filename: str) -> None:
@@ -142,13 +142,17 @@ def handle_old_logs(auto_log_filename: str) -> None:
         os.rename(auto_log_filename, old_path)
 
 
-def logging_configurer(level: int, filename: Optional[str], auto_log_filename: Optional[str], delete_old_logs: bool) -> None:
+def logging_configurer(level: int, filename: Optional[str], auto_log_filename: Optional[str], delete_old_logs: bool,
+                       log_format: str = "text", transcript_file: Optional[str] = None) -> None:
     """
     Configure the logger.
 
     :param level: The logging level. Either `logging.INFO` or `logging.DEBUG`.
     :param filename: The filename to write the logs to. If it is `None` then the logs aren't written to a file.
     :param auto_log_filename: The filename for the automatic logger. If it is `None` then the logs aren't written to a file.
+    :param log_format: The format of the log files: "text", or "json" for one JSON object per line.
+    :param transcript_file: The gzip file the LLM transcripts are written to. If it is `None` then they are logged like
+        the other messages.
     """
     console_handler = RichHandler()
     console_formatter = logging.Formatter("%(message)s")
@@ -156,10 +160,10 @@ def logging_configurer(level: int, filename: Optional[str], auto_log_filename: O
     console_handler.setLevel(level)
     all_handlers: list[logging.Handler] = [console_handler]
 
+    FORMAT = "%(asctime)s %(name)s (%(filename)s:%(lineno)d) %(levelname)s %(message)s"
+    file_formatter = structured_logging.JsonLinesFormatter() if log_format == "json" else logging.Formatter(FORMAT)
     if filename:
         file_handler = logging.FileHandler(filename, delay=True, encoding="utf-8")
-        FORMAT = "%(asctime)s %(name)s (%(filename)s:%(lineno)d) %(levelname)s %(message)s"
-        file_formatter = logging.Formatter(FORMAT)
         file_handler.setFormatter(file_formatter)
         file_handler.setLevel(level)
         all_handlers.append(file_handler)
@@ -174,48 +178,51 @@ def logging_configurer(level: int, filename: Optional[str], auto_log_filename: O
         # Set up automatic logging.
         auto_file_handler = logging.FileHandler(auto_log_filename, delay=True, encoding="utf-8")
         auto_file_handler.setLevel(logging.DEBUG)
-
-        FORMAT = "%(asctime)s %(name)s (%(filename)s:%(lineno)d) %(levelname)s %(message)s"
-        file_formatter = logging.Formatter(FORMAT)
         auto_file_handler.setFormatter(file_formatter)
         all_handlers.append(auto_file_handler)
 
     logging.basicConfig(level=logging.DEBUG,
                         handlers=all_handlers,
                         force=True)
+    structured_logging.route_transcripts(transcript_file, file_formatter)
 
 
 def logging_listener_proc(queue: LOGGING_QUEUE_TYPE, level: int, log_filename: Optional[str],
-                          auto_log_filename: Optional[str]) -> None:
+                          auto_log_filename: Optional[str], log_format: str = "text",
+                          transcript_file: Optional[str] = None) -> None:
     """
     Handle events from the logging queue.
 
     This allows the logs from inside a thread to be printed.
     They are added to the queue, so they are printed outside the thread.
+    Each record is handled by the logger that made it, so the LLM transcripts can go to their own file.
+    The listener stops when it gets `None`.
     """
-    logging_configurer(level, log_filename, auto_log_filename, False)
-    logger = logging.getLogger()
+    logging_configurer(level, log_filename, auto_log_filename, False, log_format, transcript_file)
     while True:
-        task: Optional[logging.LogRecord] = None
         try:
-            task = queue.get(block=False)
-        except Empty:
-            time.sleep(0.1)
+            task = queue.get()
         except InterruptedError:
-            pass
-        except Exception:
-            pass
+            continue
+        except (EOFError, OSError):
+            break
 
         if task is None:
-            continue
+            break
+
+        logging.getLogger(task.name).handle(task)
+    logging.shutdown()
 
-        logger.handle(task)
-        queue.task_done()
 
+def thread_logging_configurer(queue: LOGGING_QUEUE_TYPE, game_sample_rate: float = 1.0) -> None:
+    """
+    Configure the game logger.
 
-def thread_logging_configurer(queue: LOGGING_QUEUE_TYPE) -> None:
-    """Configure the game logger."""
-    h = logging.handlers.QueueHandler(queue)
+    :param queue: The logging queue. Used by `logging_listener_proc`.
+    :param game_sample_rate: The fraction of the games whose INFO and DEBUG messages are sent to the queue.
+    """
+    h = structured_logging.LazyQueueHandler(queue)
+    h.addFilter(structured_logging.GameFilter(game_sample_rate))
     root = logging.getLogger()
     root.handlers.clear()
     root.addHandler(h)
@@ -236,44 +243,63 @@ def start(li: LICHESS_TYPE, user_profile: UserProfileType, config: Configuration
     :param one_game: Whether the bot should play only one game. Only used in `test_bot/test_bot.py` to test lichess-bot.
     """
     logger.info(f"You're now connected to {config.url} and awaiting challenges.")
-    manager = multiprocessing.Manager()
-    challenge_queue: MULTIPROCESSING_LIST_TYPE = manager.list()
-    control_queue: CONTROL_QUEUE_TYPE = manager.Queue()
+    queues = ipc.create_queues()
+    ipc.share_queues(queues)
+    challenge_queue: CHALLENGE_QUEUE_TYPE = []
+    control_queue = queues.control_queue
     control_stream = multiprocessing.Process(target=watch_control_stream, args=(control_queue, li))
     control_stream.start()
     correspondence_pinger = multiprocessing.Process(target=do_correspondence_ping,
                                                     args=(control_queue,
                                                           seconds(config.correspondence.checkin_period)))
     correspondence_pinger.start()
-    correspondence_queue: CORRESPONDENCE_QUEUE_TYPE = manager.Queue()
 
-    logging_queue = manager.Queue()
+    logging_queue = queues.logging_queue
     logging_listener = multiprocessing.Process(target=logging_listener_proc,
                                                args=(logging_queue,
                                                      logging_level,
                                                      log_filename,
-                                                     auto_log_filename))
+                                                     auto_log_filename,
+                                                     config.logging.format,
+                                                     config.logging.transcript_file))
     logging_listener.start()
-    thread_logging_configurer(logging_queue)
+    thread_logging_configurer(logging_queue, config.logging.game_sample_rate)
+
+    game_runner = None
+    if async_games_enabled(config):
+        game_runner = multiprocessing.Process(target=game_runner_proc, args=(li, user_profile, config, queues))
+        game_runner.start()
 
     try:
         lichess_bot_main(li,
                          user_profile,
                          config,
                          challenge_queue,
-                         control_queue,
-                         correspondence_queue,
-                         logging_queue,
+                         queues,
                          one_game)
     finally:
+        if game_runner is not None:
+            stop_game_runner(game_runner, queues, config)
         control_stream.terminate()
         control_stream.join()
         correspondence_pinger.terminate()
         correspondence_pinger.join()
-        time.sleep(1.0)  # Allow final messages in logging_queue to be handled.
-        logging_configurer(logging_level, log_filename, auto_log_filename, False)
-        logging_listener.terminate()
-        logging_listener.join()
+        logging_configurer(logging_level, log_filename, auto_log_filename, False, config.logging.format)
+        logging_queue.put_nowait(None)  # Stop the listener after the messages already in the queue.
+        logging_listener.join(timeout=5)
+        if logging_listener.is_alive():
+            logging_listener.terminate()
+            logging_listener.join()
+
+
+def stop_game_runner(game_runner: multiprocessing.Process, queues: ipc.ProcessQueues, config: Configuration) -> None:
+    """Stop the game runner, after its games are over if `quit_after_all_games_finish` is set."""
+    if config.quit_after_all_games_finish:
+        queues.game_runner_queue.put(None)
+        game_runner.join()
+    else:
+        game_runner.terminate()
+        game_runner.join()
 
 
 def log_proc_count(change: str, active_games: set[str]) -> None:
@@ -290,10 +316,8 @@ def log_proc_count(change: str, active_games: set[str]) -> None:
 def lichess_bot_main(li: LICHESS_TYPE,
                      user_profile: UserProfileType,
                      config: Configuration,
-                     challenge_queue: MULTIPROCESSING_LIST_TYPE,
-                     control_queue: CONTROL_QUEUE_TYPE,
-                     correspondence_queue: CORRESPONDENCE_QUEUE_TYPE,
-                     logging_queue: LOGGING_QUEUE_TYPE,
+                     challenge_queue: CHALLENGE_QUEUE_TYPE,
+                     queues: ipc.ProcessQueues,
                      one_game: bool) -> None:
     """
     Handle all the games and challenges.
@@ -302,9 +326,8 @@ def lichess_bot_main(li: LICHESS_TYPE,
     :param user_profile: Information on our bot.
     :param config: The config that the bot will use.
     :param challenge_queue: The queue containing the challenges.
-    :param control_queue: The queue containing all the events.
-    :param correspondence_queue: The queue containing the correspondence games.
-    :param logging_queue: The logging queue. Used by `logging_listener_proc`.
+    :param queues: The queues shared with the other processes: the control queue containing all the events, the queue
+        containing the correspondence games, the logging queue and the names of the challengers.
     :param one_game: Whether the bot should play only one game. Only used in `test_bot/test_bot.py` to test lichess-bot.
     """
     global restart
@@ -327,9 +350,9 @@ def lichess_bot_main(li: LICHESS_TYPE,
     matchmaker = matchmaking.Matchmaking(li, config, user_profile)
     matchmaker.show_earliest_challenge_time()
 
-    play_game_args: PlayGameArgsType = {"li": li, "control_queue": control_queue, "user_profile": user_profile,
-                                        "config": config, "challenge_queue": challenge_queue,
-                                        "correspondence_queue": correspondence_queue, "logging_queue": logging_queue}
+    control_queue = queues.control_queue
+    correspondence_queue = queues.correspondence_queue
+    play_game_args: PlayGameArgsType = {"li": li, "user_profile": user_profile, "config": config}
 
     recent_bot_challenges: defaultdict[str, list[Timer]] = defaultdict(list)
 
@@ -337,29 +360,33 @@ def lichess_bot_main(li: LICHESS_TYPE,
         logger.info("When quitting, lichess-bot will first wait for all running games to finish.")
         logger.info("Press Ctrl-C twice to quit immediately.")
 
-    with multiprocessing.pool.Pool(max_games + 1) as pool:
+    # The HTTP requests and the disk writes are made by worker threads, so that the events don't wait for them.
+    dispatch_stats = DispatchStats()
+    side_tasks = SideTasks(dispatch_stats)
+
+    # The game runner plays the games of homemade engines, so the pool only needs one process then.
+    pool_size = 1 if async_games_enabled(config) else max_games + 1
+    with multiprocessing.pool.Pool(pool_size, initializer=ipc.share_queues, initargs=(queues,)) as pool:
         while not (terminated or (one_game and one_game_completed) or restart):
             event = next_event(control_queue)
             if not event:
                 continue
 
+            dispatch_timer = Timer()
             if event["type"] == "terminated":
                 restart = True
                 logger.debug(f"Terminating exception:\n{event['error']}")
-                control_queue.task_done()
                 break
-            elif event["type"] == "local_game_done":
-                active_games.discard(event["game"]["id"])
-                matchmaker.game_done()
-                log_proc_count("Freed", active_games)
-                save_pgn_record(event, config, user_profile["username"])
-                one_game_completed = True
+            elif event["type"] in ("local_game_done", "local_accept_failed"):
+                one_game_completed |= free_game_slot(event, active_games, matchmaker, side_tasks, config,
+                                                     user_profile["username"])
             elif event["type"] == "challenge":
-                handle_challenge(event, li, challenge_queue, config.challenge, user_profile, recent_bot_challenges)
+                handle_challenge(event, li, challenge_queue, config.challenge, user_profile, recent_bot_challenges,
+                                 side_tasks)
             elif event["type"] == "challengeDeclined":
-                matchmaker.declined_challenge(event)
+                side_tasks.submit("matchmaking", matchmaker.declined_challenge, event)
             elif event["type"] == "gameStart":
-                matchmaker.accepted_challenge(event)
+                side_tasks.submit("matchmaking", matchmaker.accepted_challenge, event)
                 start_game(event,
                            pool,
                            play_game_args,
@@ -377,13 +404,42 @@ def lichess_bot_main(li: LICHESS_TYPE,
                                              play_game_args,
                                              active_games,
                                              max_games)
-            accept_challenges(li, challenge_queue, active_games, max_games)
-            matchmaker.challenge(active_games, challenge_queue, max_games)
-            check_online_status(li, user_profile, last_check_online_time)
-
-            control_queue.task_done()
+            accept_challenges(li, challenge_queue, active_games, max_games, side_tasks, control_queue)
+            side_tasks.submit_once("matchmaking", "matchmaking", matchmaker.challenge, set(active_games),
+                                   list(challenge_queue), max_games)
+            queues.challenger_names.publish(challenge_queue)
+            check_online_status(li, user_profile, last_check_online_time, side_tasks)
+            dispatch_stats.record(event["type"], to_seconds(dispatch_timer.time_since_reset()))
 
         close_pool(pool, active_games, config)
+    side_tasks.close()
+    matchmaker.close()
+    for line in dispatch_stats.summary():
+        logger.info(f"Dispatch time of {line}")
+
+
+def free_game_slot(event: EventType, active_games: set[str], matchmaker: matchmaking.Matchmaking, side_tasks: SideTasks,
+                   config: Configuration, username: str) -> bool:
+    """
+    Stop counting a game that ended or a challenge that couldn't be accepted.
+
+    :param event: A `local_game_done` or `local_accept_failed` event.
+    :param active_games: The games being played.
+    :param matchmaker: The matchmaker, which is told when a game ends.
+    :param side_tasks: The worker threads that tell the matchmaker and save the PGN of the game.
+    :param config: The config that the bot will use.
+    :param username: The username of the bot.
+    :return: Whether a game was completed.
+    """
+    if event["type"] == "local_accept_failed":
+        active_games.discard(event["challenge"]["id"])
+        log_proc_count("Freed", active_games)
+        return False
+    active_games.discard(event["game"]["id"])
+    side_tasks.submit("matchmaking", matchmaker.game_done)
+    log_proc_count("Freed", active_games)
+    side_tasks.submit("disk", save_pgn_record, event, config, username)
+    return True
 
 
 def close_pool(pool: POOL_TYPE, active_games: set[str], config: Configuration) -> None:
@@ -407,7 +463,6 @@ def next_event(control_queue: CONTROL_QUEUE_TYPE) -> EventType:
     if "type" not in event:
         logger.warning("Unable to handle response from lichess.org:")
         logger.warning(event)
-        control_queue.task_done()
         return {}
 
     if event.get("type") != "ping":
@@ -416,31 +471,32 @@ def next_event(control_queue: CONTROL_QUEUE_TYPE) -> EventType:
     return event
 
 
-correspondence_games_to_start = 0
+correspondence_games_to_start: list[str] = []
 
 
 def check_in_on_correspondence_games(pool: POOL_TYPE,
                                      event: EventType,
                                      correspondence_queue: CORRESPONDENCE_QUEUE_TYPE,
-                                     challenge_queue: MULTIPROCESSING_LIST_TYPE,
+                                     challenge_queue: CHALLENGE_QUEUE_TYPE,
                                      play_game_args: PlayGameArgsType,
                                      active_games: set[str],
                                      max_games: int) -> None:
     """Start correspondence games."""
-    global correspondence_games_to_start
-
     if event["type"] == "correspondence_ping":
-        correspondence_games_to_start = correspondence_queue.qsize()
+        # `qsize()` isn't available on every platform, so the queued games are moved to a list instead of counted.
+        while True:
+            try:
+                correspondence_games_to_start.append(correspondence_queue.get_nowait())
+            except Empty:
+                break
     elif event["type"] != "local_game_done":
         return
 
     if challenge_queue:
         return
 
-    while len(active_games) < max_games and correspondence_games_to_start > 0:
-        game_id = correspondence_queue.get_nowait()
-        correspondence_games_to_start -= 1
-        correspondence_queue.task_done()
+    while len(active_games) < max_games and correspondence_games_to_start:
+        game_id = correspondence_games_to_start.pop(0)
         start_game_thread(active_games, game_id, play_game_args, pool)
 
 
@@ -453,39 +509,58 @@ def start_low_time_games(low_time_games: list[GameType], active_games: set[str],
         start_game_thread(active_games, game_id, play_game_args, pool)
 
 
-def accept_challenges(li: LICHESS_TYPE, challenge_queue: MULTIPROCESSING_LIST_TYPE, active_games: set[str],
-                      max_games: int) -> None:
-    """Accept a challenge."""
+def accept_challenges(li: LICHESS_TYPE, challenge_queue: CHALLENGE_QUEUE_TYPE, active_games: set[str],
+                      max_games: int, side_tasks: SideTasks, control_queue: CONTROL_QUEUE_TYPE) -> None:
+    """
+    Accept challenges. The game counts as active right away, and the challenge is accepted by a worker thread.
+
+    If the challenge can't be accepted, the worker sends a `local_accept_failed` event, and the game stops counting.
+    """
     while len(active_games) < max_games and challenge_queue:
         chlng = challenge_queue.pop(0)
         if chlng.from_self:
             continue
 
-        try:
-            logger.info(f"Accept {chlng}")
-            li.accept_challenge(chlng.id)
-            active_games.add(chlng.id)
-            log_proc_count("Queued", active_games)
-        except (HTTPError, ReadTimeout) as exception:
-            if isinstance(exception, HTTPError) and exception.response is not None and exception.response.status_code == 404:
-                logger.info(f"Skip missing {chlng}")
+        logger.info(f"Accept {chlng}")
+        active_games.add(chlng.id)
+        log_proc_count("Queued", active_games)
+        side_tasks.submit("http", accept_challenge, li, chlng, control_queue)
 
 
-def check_online_status(li: LICHESS_TYPE, user_profile: UserProfileType, last_check_online_time: Timer) -> None:
-    """Check if lichess.org thinks the bot is online or not. If it isn't, we restart it."""
-    global restart
+def accept_challenge(li: LICHESS_TYPE, chlng: model.Challenge, control_queue: CONTROL_QUEUE_TYPE) -> None:
+    """Accept a challenge. Tell the main loop if it failed."""
+    try:
+        li.accept_challenge(chlng.id)
+    except (HTTPError, ReadTimeout) as exception:
+        if isinstance(exception, HTTPError) and exception.response is not None and exception.response.status_code == 404:
+            logger.info(f"Skip missing {chlng}")
+        control_queue.put({"type": "local_accept_failed", "challenge": {"id": chlng.id}})
+    except Exception:
+        control_queue.put({"type": "local_accept_failed", "challenge": {"id": chlng.id}})
+        raise
+
 
+def check_online_status(li: LICHESS_TYPE, user_profile: UserProfileType, last_check_online_time: Timer,
+                        side_tasks: SideTasks) -> None:
+    """Check in a worker thread if lichess.org thinks the bot is online or not. If it isn't, we restart it."""
     if last_check_online_time.is_expired():
-        try:
-            if not li.is_online(user_profile["id"]):
-                logger.info("Will restart lichess-bot")
-                restart = True
-            last_check_online_time.reset()
-        except (HTTPError, ReadTimeout):
-            pass
+        side_tasks.submit_once("online status", "http", restart_if_offline, li, user_profile, last_check_online_time)
+
+
+def restart_if_offline(li: LICHESS_TYPE, user_profile: UserProfileType, last_check_online_time: Timer) -> None:
+    """Restart lichess-bot if lichess.org thinks the bot is offline."""
+    global restart
+
+    try:
+        if not li.is_online(user_profile["id"]):
+            logger.info("Will restart lichess-bot")
+            restart = True
+        last_check_online_time.reset()
+    except (HTTPError, ReadTimeout):
+        pass
 
 
-def sort_challenges(challenge_queue: MULTIPROCESSING_LIST_TYPE, challenge_config: Configuration) -> None:
+def sort_challenges(challenge_queue: CHALLENGE_QUEUE_TYPE, challenge_config: Configuration) -> None:
     """
     Sort the challenges.
 
@@ -512,15 +587,19 @@ def start_game_thread(active_games: set[str], game_id: str, play_game_args: Play
     log_proc_count("Used", active_games)
     play_game_args["game_id"] = game_id
 
+    if async_games_enabled(play_game_args["config"]):
+        ipc.process_queues().game_runner_queue.put(game_id)
+        return
+
     def game_error_handler(error: BaseException) -> None:
         logger.exception("Game ended due to error:", exc_info=error)
-        control_queue: CONTROL_QUEUE_TYPE = play_game_args["control_queue"]
+        control_queue = ipc.process_queues().control_queue
         li = play_game_args["li"]
-        control_queue.put_nowait({"type": "local_game_done", "game": {"id": game_id,
-                                                                      "pgn": li.get_game_pgn(game_id),
-                                                                      "complete": not game_is_active(li, game_id)}})
+        control_queue.put({"type": "local_game_done", "game": {"id": game_id,
+                                                               "pgn": li.get_game_pgn(game_id),
+                                                               "complete": not game_is_active(li, game_id)}})
 
-    pool.apply_async(play_game,
+    pool.apply_async(play_pool_game,
                      kwds=play_game_args,
                      error_callback=game_error_handler)
 
@@ -566,10 +645,10 @@ def enough_time_to_queue(event: EventType, config: Configuration) -> bool:
     return not game["isMyTurn"] or game.get("secondsLeft", math.inf) > minimum_time
 
 
-def handle_challenge(event: EventType, li: LICHESS_TYPE, challenge_queue: MULTIPROCESSING_LIST_TYPE,
+def handle_challenge(event: EventType, li: LICHESS_TYPE, challenge_queue: CHALLENGE_QUEUE_TYPE,
                      challenge_config: Configuration, user_profile: UserProfileType,
-                     recent_bot_challenges: defaultdict[str, list[Timer]]) -> None:
-    """Handle incoming challenges. It either accepts, declines, or queues them to accept later."""
+                     recent_bot_challenges: defaultdict[str, list[Timer]], side_tasks: SideTasks) -> None:
+    """Handle incoming challenges. It either queues them to accept later, or declines them in a worker thread."""
     chlng = model.Challenge(event["challenge"], user_profile)
     if chlng.from_self:
         return
@@ -582,13 +661,14 @@ def handle_challenge(event: EventType, li: LICHESS_TYPE, challenge_queue: MULTIP
         if time_window is not None:
             recent_bot_challenges[chlng.challenger.name].append(Timer(seconds(time_window)))
     else:
-        li.decline_challenge(chlng.id, reason=decline_reason)
+        side_tasks.submit("http", li.decline_challenge, chlng.id, decline_reason)
 
 
-# Added by John Adeojo: We save the game state json to the root-dir so we can retrieve in homemade.py
-def save_game_state_local(game_state):
-    with open("game_state.json", "w") as file:
-        json.dump(game_state, file)
+def play_pool_game(li: LICHESS_TYPE, game_id: str, user_profile: UserProfileType, config: Configuration) -> None:
+    """Play a game in a process of the game pool, with the queues the process got when it started."""
+    queues = ipc.process_queues()
+    play_game(li, game_id, queues.control_queue, user_profile, config, queues.challenger_names,
+              queues.correspondence_queue, queues.logging_queue)
 
 
 @backoff.on_exception(backoff.expo, BaseException, max_time=600, giveup=lichess.is_final,  # type: ignore[arg-type]
@@ -598,7 +678,7 @@ def play_game(li: LICHESS_TYPE,
               control_queue: CONTROL_QUEUE_TYPE,
               user_profile: UserProfileType,
               config: Configuration,
-              challenge_queue: MULTIPROCESSING_LIST_TYPE,
+              challenger_names: ipc.ChallengerNames,
               correspondence_queue: CORRESPONDENCE_QUEUE_TYPE,
               logging_queue: LOGGING_QUEUE_TYPE) -> None:
     """
@@ -609,119 +689,289 @@ def play_game(li: LICHESS_TYPE,
     :param control_queue: The control queue that contains events (adds `local_game_done` to the queue).
     :param user_profile: Information on our bot.
     :param config: The config that the bot will use.
-    :param challenge_queue: The queue containing the challenges.
+    :param challenger_names: The names of the challengers in the challenge queue.
     :param correspondence_queue: The queue containing the correspondence games.
     :param logging_queue: The logging queue. Used by `logging_listener_proc`.
     """
-    thread_logging_configurer(logging_queue)
-    logger = logging.getLogger(__name__)
+    thread_logging_configurer(logging_queue, config.logging.game_sample_rate)
+    structured_logging.current_game.set(game_id)
 
     response = li.get_game_stream(game_id)
-    lines = response.iter_lines()
+    events: Iterator[GameEventType] = ndjson.read_events(response.iter_content(ndjson.CHUNK_SIZE))
 
     # Initial response of stream will be the full game info. Store it.
-    initial_state = json.loads(next(lines).decode("utf-8"))
+    game = read_initial_state(next(events), li, user_profile, config)
+
+    with GameSession(li, config, game, challenger_names) as session:
+        game_stream = itertools.chain([cast(GameEventType, game.state)], events)
+        while session.playing():
+            try:
+                session.update(next_update(game_stream))
+            except (*STREAM_ERRORS, StopIteration) as error:
+                session.stream_error(error)
+
+        pgn_record = session.game_record()
+    final_queue_entries(control_queue, correspondence_queue, game, session.is_correspondence, pgn_record)
+    delete_takeback_record(game)
+
+
+STREAM_ERRORS = (HTTPError, ReadTimeout, RemoteDisconnected, ChunkedEncodingError, ConnectionError)
+"""The errors of the game stream and of the requests of a game after which the bot checks whether to stay in the game."""
+
+
+def read_initial_state(initial_state: GameEventType, li: LICHESS_TYPE, user_profile: UserProfileType,
+                       config: Configuration) -> model.Game:
+    """Read the game from the first event of its stream, which has the full game info."""
     logger.debug(f"Initial state: {initial_state}")
-    abort_time = seconds(config.abort_time)
-    game = model.Game(initial_state, user_profile["username"], li.baseUrl, abort_time)
+    return model.Game(initial_state, user_profile["username"], li.baseUrl, seconds(config.abort_time))
 
-    # Added by JA: We save the initial game state
-    save_game_state_local(game.state)
 
-    with engine_wrapper.create_engine(config, game) as engine:
-        engine.get_opponent_info(game)
-        logger.debug(f"The engine for game {game_id} has pid={engine.get_pid()}")
-        conversation = Conversation(game, engine, li, __version__, challenge_queue)
+class GameSession:
+    """
+    The engine, the chat and the state of a game being played, and what the bot does with each update of the game stream.
+
+    A game played in the game pool gets its updates from a `requests` stream (`play_game`), and a game played by the game
+    runner from an asyncio stream (`play_game_async`), but both are handled here. The calls that may block (the engine's
+    move, the requests to lichess.org) are all made by the methods of this class, so the game runner calls them in a thread.
+    """
+
+    def __init__(self, li: LICHESS_TYPE, config: Configuration, game: model.Game,
+                 challenger_names: ipc.ChallengerNames) -> None:
+        """
+        Start the engine and the chat of a game.
+
+        :param li: Provides communication with lichess.org.
+        :param config: The config that the bot will use.
+        :param game: The game, as read from the first line of its stream.
+        :param challenger_names: The names of the challengers in the challenge queue.
+        """
+        self.li = li
+        self.config = config
+        self.game = game
+        with contextlib.ExitStack() as exit_stack:
+            self.engine = exit_stack.enter_context(engine_wrapper.create_engine(config, game))
+            self.engine.get_opponent_info(game)
+            logger.debug(f"The engine for game {game.id} has pid={self.engine.get_pid()}")
+            self.conversation = Conversation(game, self.engine, li, __version__, challenger_names)
+            self.exit_stack = exit_stack.pop_all()
 
         logger.info(f"+++ {game}")
 
-        is_correspondence = game.speed == "correspondence"
+        self.is_correspondence = game.speed == "correspondence"
         correspondence_cfg = config.correspondence
-        correspondence_move_time = seconds(correspondence_cfg.move_time)
-        correspondence_disconnect_time = seconds(correspondence_cfg.disconnect_time)
+        self.correspondence_move_time = seconds(correspondence_cfg.move_time)
+        self.correspondence_disconnect_time = seconds(correspondence_cfg.disconnect_time)
 
-        engine_cfg = config.engine
-        ponder_cfg = correspondence_cfg if is_correspondence else engine_cfg
-        can_ponder = ponder_cfg.uci_ponder or ponder_cfg.ponder
-        move_overhead = msec(config.move_overhead)
-        delay = msec(config.rate_limiting_delay)
+        self.engine_cfg = config.engine
+        ponder_cfg = correspondence_cfg if self.is_correspondence else self.engine_cfg
+        self.can_ponder = ponder_cfg.uci_ponder or ponder_cfg.ponder
+        self.move_overhead = msec(config.move_overhead)
+        self.delay = msec(config.rate_limiting_delay)
+        self.abort_time = seconds(config.abort_time)
 
-        takebacks_accepted = read_takeback_record(game)
-        max_takebacks_accepted = config.max_takebacks_accepted
+        self.takebacks_accepted = read_takeback_record(game)
+        self.max_takebacks_accepted = config.max_takebacks_accepted
 
         keyword_map: defaultdict[str, str] = defaultdict(str, me=game.me.name, opponent=game.opponent.name)
-        hello = get_greeting("hello", config.greeting, keyword_map)
-        goodbye = get_greeting("goodbye", config.greeting, keyword_map)
-        hello_spectators = get_greeting("hello_spectators", config.greeting, keyword_map)
-        goodbye_spectators = get_greeting("goodbye_spectators", config.greeting, keyword_map)
-
-        disconnect_time = correspondence_disconnect_time if not game.state.get("moves") else seconds(0)
-        prior_game = None
-        board = chess.Board()
-        game_stream = itertools.chain([json.dumps(game.state).encode("utf-8")], lines)
-        quit_after_all_games_finish = config.quit_after_all_games_finish
-        stay_in_game = True
-        while stay_in_game and (not terminated or quit_after_all_games_finish) and not force_quit:
-            move_attempted = False
-            try:
-                upd = next_update(game_stream)
-                u_type = upd["type"] if upd else "ping"
-                if u_type == "chatLine":
-                    conversation.react(ChatLine(upd))
-                elif u_type == "gameState":
-                    game.state = upd
-                    board = setup_board(game)
-
-                    # Added by John Adeojo: We save the updated game state (overwrites game state file)
-                    save_game_state_local(game.state)
-
-                    takeback_field = game.state.get("btakeback") if game.is_white else game.state.get("wtakeback")
-
-                    if not is_game_over(game) and is_engine_move(game, prior_game, board):
-                        disconnect_time = correspondence_disconnect_time
-                        say_hello(conversation, hello, hello_spectators, board)
-                        setup_timer = Timer()
-                        print_move_number(board)
-                        move_attempted = True
-                        engine.play_move(board,
-                                         game,
-                                         li,
-                                         setup_timer,
-                                         move_overhead,
-                                         can_ponder,
-                                         is_correspondence,
-                                         correspondence_move_time,
-                                         engine_cfg,
-                                         fake_think_time(config, board, game))
-                        time.sleep(to_seconds(delay))
-                    elif is_game_over(game):
-                        tell_user_game_result(game, board)
-                        engine.send_game_result(game, board)
-                        conversation.send_message("player", goodbye)
-                        conversation.send_message("spectator", goodbye_spectators)
-                    elif (takeback_field
-                            and not bot_to_move(game, board)
-                            and li.accept_takeback(game.id, takebacks_accepted < max_takebacks_accepted)):
-                        takebacks_accepted += 1
-                        record_takeback(game, takebacks_accepted)
-                        engine.discard_last_move_commentary()
-
-                    wbtime = upd[engine_wrapper.wbtime(board)]
-                    wbinc = upd[engine_wrapper.wbinc(board)]
-                    terminate_time = msec(wbtime) + msec(wbinc) + seconds(60)
-                    game.ping(abort_time, terminate_time, disconnect_time)
-                    prior_game = copy.deepcopy(game)
-                elif u_type == "ping" and should_exit_game(board, game, prior_game, li, is_correspondence):
-                    stay_in_game = False
-            except (HTTPError, ReadTimeout, RemoteDisconnected, ChunkedEncodingError, ConnectionError, StopIteration) as e:
-                stopped = isinstance(e, StopIteration)
-                stay_in_game = not stopped and (move_attempted or game_is_active(li, game.id))
-
-        pgn_record = try_get_pgn_game_record(li, config, game, board, engine)
-    final_queue_entries(control_queue, correspondence_queue, game, is_correspondence, pgn_record)
+        self.hello = get_greeting("hello", config.greeting, keyword_map)
+        self.goodbye = get_greeting("goodbye", config.greeting, keyword_map)
+        self.hello_spectators = get_greeting("hello_spectators", config.greeting, keyword_map)
+        self.goodbye_spectators = get_greeting("goodbye_spectators", config.greeting, keyword_map)
+
+        self.disconnect_time = self.correspondence_disconnect_time if not game.state.get("moves") else seconds(0)
+        self.prior_game: Optional[model.GameSnapshot] = None
+        self.history = MoveHistory(starting_board(game))
+        self.board = self.history.board
+        self.stay_in_game = True
+        self.move_attempted = False  # Whether the engine was playing a move when an error happened.
+
+    def __enter__(self) -> GameSession:
+        """Use in a with-block to quit the engine at the end of the game."""
+        return self
+
+    def __exit__(self, exc_type: Optional[type[BaseException]], exc_value: Optional[BaseException],
+                 traceback: Optional[TracebackType]) -> None:
+        """Quit the engine."""
+        self.close(exc_value)
+
+    def close(self, error: Optional[BaseException] = None) -> None:
+        """Quit the engine. It is only asked to quit nicely if the game didn't end with an error. Write the move timings."""
+        for line in self.engine.move_timings.summary():
+            logger.debug(f"Move stage {line}")
+        if self.config.move_timings.directory:
+            move_timing.write_move_timings(self.config.move_timings.directory, self.config.move_timings.format)
+        if error is None:
+            self.exit_stack.close()
+        else:
+            self.exit_stack.__exit__(type(error), error, error.__traceback__)
+
+    def playing(self) -> bool:
+        """Whether the bot should keep reading the game stream."""
+        return (self.stay_in_game
+                and (not terminated or self.config.quit_after_all_games_finish)
+                and not force_quit)
+
+    def update(self, upd: GameEventType) -> None:
+        """Handle an update of the game stream: a chat line, a new game state, or a ping (an empty update)."""
+        u_type = upd["type"] if upd else "ping"
+        game = self.game
+        if u_type == "chatLine":
+            self.conversation.react(ChatLine(upd))
+        elif u_type == "gameState":
+            game.state = upd
+            board = self.board = self.history.update(game.state["moves"])
+
+            takeback_field = game.state.get("btakeback") if game.is_white else game.state.get("wtakeback")
+
+            if not is_game_over(game) and is_engine_move(game, self.prior_game, board):
+                self.disconnect_time = self.correspondence_disconnect_time
+                say_hello(self.conversation, self.hello, self.hello_spectators, board)
+                setup_timer = Timer()
+                print_move_number(board)
+                self.move_attempted = True
+                self.engine.play_move(board,
+                                      game,
+                                      self.li,
+                                      setup_timer,
+                                      self.move_overhead,
+                                      self.can_ponder,
+                                      self.is_correspondence,
+                                      self.correspondence_move_time,
+                                      self.engine_cfg,
+                                      fake_think_time(self.config, board, game))
+                self.move_attempted = False
+                time.sleep(to_seconds(self.delay))
+            elif is_game_over(game):
+                tell_user_game_result(game, board)
+                self.engine.send_game_result(game, board)
+                self.conversation.send_message("player", self.goodbye)
+                self.conversation.send_message("spectator", self.goodbye_spectators)
+            elif (takeback_field
+                    and not bot_to_move(game, board)
+                    and self.li.accept_takeback(game.id, self.takebacks_accepted < self.max_takebacks_accepted)):
+                self.takebacks_accepted += 1
+                record_takeback(game, self.takebacks_accepted)
+                self.engine.discard_last_move_commentary()
+
+            wbtime = upd[engine_wrapper.wbtime(board)]
+            wbinc = upd[engine_wrapper.wbinc(board)]
+            terminate_time = msec(wbtime) + msec(wbinc) + seconds(60)
+            game.ping(self.abort_time, terminate_time, self.disconnect_time)
+            self.prior_game = game.snapshot()
+        elif u_type == "ping" and should_exit_game(self.board, game, self.prior_game, self.li, self.is_correspondence):
+            self.stay_in_game = False
+
+    def stream_error(self, error: BaseException) -> None:
+        """Decide whether to stay in the game after an error of the game stream, or after the end of the stream."""
+        stopped = isinstance(error, (StopIteration, StopAsyncIteration))
+        self.stay_in_game = not stopped and (self.move_attempted or game_is_active(self.li, self.game.id))
+        self.move_attempted = False
+
+    def game_record(self) -> str:
+        """Get the PGN of the game, with the engine's evaluations, and write it to a file if `pgn_directory` is set."""
+        return try_get_pgn_game_record(self.li, self.config, self.game, self.board, self.engine)
+
+
+def async_games_enabled(config: Configuration) -> bool:
+    """Whether the games are played by the game runner instead of the game pool. Only homemade engines can be."""
+    return bool(config.async_games.enabled) and config.engine.protocol == "homemade"
+
+
+def game_runner_proc(li: lichess.Lichess, user_profile: UserProfileType, config: Configuration,
+                     queues: ipc.ProcessQueues) -> None:
+    """Play the games that the main process sends to the game runner queue, all in one event loop."""
+    ipc.share_queues(queues)
+    thread_logging_configurer(queues.logging_queue, config.logging.game_sample_rate)
+    asyncio.run(run_async_games(li, user_profile, config, queues))
+
+
+async def run_async_games(li: lichess.Lichess, user_profile: UserProfileType, config: Configuration,
+                          queues: ipc.ProcessQueues) -> None:
+    """
+    Start a task for each game id sent by the main process. When the main process sends `None`, wait for the games to end.
+
+    :param li: Provides communication with lichess.org.
+    :param user_profile: Information on our bot.
+    :param config: The config that the bot will use.
+    :param queues: The queues shared with the main process. The game ids come from `game_runner_queue`.
+    """
+    loop = asyncio.get_running_loop()
+    games: set[asyncio.Task[None]] = set()
+    with ThreadPoolExecutor(config.async_games.threads, thread_name_prefix="game") as executor:
+        while (game_id := await loop.run_in_executor(None, queues.game_runner_queue.get)) is not None:
+            game = asyncio.create_task(play_async_game(li, game_id, user_profile, config, queues, executor))
+            games.add(game)
+            game.add_done_callback(games.discard)
+        if games:
+            await asyncio.wait(games)
+
+
+async def play_async_game(li: lichess.Lichess, game_id: str, user_profile: UserProfileType, config: Configuration,
+                          queues: ipc.ProcessQueues, executor: ThreadPoolExecutor) -> None:
+    """Play a game in the game runner, and tell the main process that it ended if it ended due to an error."""
+    structured_logging.current_game.set(game_id)  # Each task has its own context, so this only tags the logs of this game.
+    try:
+        await play_game_async(li, game_id, user_profile, config, queues, executor)
+    except Exception as error:
+        logger.exception("Game ended due to error:", exc_info=error)
+        pgn = await run_in_game_thread(executor, li.get_game_pgn, game_id)
+        complete = not await run_in_game_thread(executor, game_is_active, li, game_id)
+        queues.control_queue.put({"type": "local_game_done", "game": {"id": game_id, "pgn": pgn, "complete": complete}})
+
+
+@backoff.on_exception(backoff.expo, Exception, max_time=600, giveup=lichess.is_final, on_backoff=lichess.backoff_handler)
+async def play_game_async(li: lichess.Lichess, game_id: str, user_profile: UserProfileType, config: Configuration,
+                          queues: ipc.ProcessQueues, executor: ThreadPoolExecutor) -> None:
+    """
+    Play a game in the event loop of the game runner.
+
+    The game stream is read in the event loop. Its updates are handled by a `GameSession` in the threads of `executor`,
+    one at a time for each game, so a game waiting for its engine or for lichess.org doesn't hold up the others.
+
+    :param li: Provides communication with lichess.org.
+    :param game_id: The id of the game.
+    :param user_profile: Information on our bot.
+    :param config: The config that the bot will use.
+    :param queues: The queues shared with the main process.
+    :param executor: The threads that make the calls that may block.
+    """
+    lines = li.game_stream_lines(game_id)
+    try:
+        game = read_initial_state(ndjson.parse_line(await anext(lines)), li, user_profile, config)
+        session = await run_in_game_thread(executor, GameSession, li, config, game, queues.challenger_names)
+        try:
+            updates = game_updates(game, lines)
+            while session.playing():
+                try:
+                    upd = await anext(updates)
+                    await run_in_game_thread(executor, session.update, upd)
+                except (*STREAM_ERRORS, StopAsyncIteration) as error:
+                    await run_in_game_thread(executor, session.stream_error, error)
+
+            pgn_record = await run_in_game_thread(executor, session.game_record)
+        except BaseException as error:
+            await run_in_game_thread(executor, session.close, error)
+            raise
+        await run_in_game_thread(executor, session.close)
+    finally:
+        await lines.aclose()
+    final_queue_entries(queues.control_queue, queues.correspondence_queue, game, session.is_correspondence, pgn_record)
     delete_takeback_record(game)
 
 
+async def run_in_game_thread(executor: ThreadPoolExecutor, function: Callable[..., T], *args: Any) -> T:
+    """Call a function in a thread of `executor`, in the context of the game's task, so its logs are tagged with the game."""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(executor, context.run, function, *args)
+
+
+async def game_updates(game: model.Game, lines: AsyncIterator[bytes]) -> AsyncIterator[GameEventType]:
+    """Get the updates of a game: its state from the first line of the stream, then the next lines."""
+    yield cast(GameEventType, game.state)
+    async for line in lines:
+        yield parse_update(line)
+
+
 def read_takeback_record(game: model.Game) -> int:
     """Read the number of move takeback requests accepeted in a game."""
     try:
@@ -797,35 +1047,34 @@ def print_move_number(board: chess.Board) -> None:
     logger.info(f"move: {len(board.move_stack) // 2 + 1}")
 
 
-def next_update(lines: Iterator[bytes]) -> GameEventType:
-    """Get the next game state."""
-    binary_chunk = next(lines)
-    upd: GameEventType = json.loads(binary_chunk.decode("utf-8")) if binary_chunk else {}
+def next_update(events: Iterator[GameEventType]) -> GameEventType:
+    """Get the next event of the game stream. A keep-alive line (a ping) gives an empty update."""
+    upd = next(events)
+    if upd:
+        logger.debug(f"Game state: {upd}")
+    return upd
+
+
+def parse_update(binary_chunk: bytes) -> GameEventType:
+    """Read a line of the game stream. An empty line (a ping) gives an empty update."""
+    upd: GameEventType = ndjson.parse_line(binary_chunk)
     if upd:
         logger.debug(f"Game state: {upd}")
     return upd
 
 
-def setup_board(game: model.Game) -> chess.Board:
-    """Set up the board."""
+def starting_board(game: model.Game) -> chess.Board:
+    """Set up the board at the starting position of the game."""
     if game.variant_name.lower() == "chess960":
-        board = chess.Board(game.initial_fen, chess960=True)
+        return chess.Board(game.initial_fen, chess960=True)
     elif game.variant_name == "From Position":
-        board = chess.Board(game.initial_fen)
+        return chess.Board(game.initial_fen)
     else:
         VariantBoard = find_variant(game.variant_name)
-        board = VariantBoard()
-
-    for move in game.state["moves"].split():
-        try:
-            board.push_uci(move)
-        except ValueError:
-            logger.exception(f"Ignoring illegal move {move} on board {board.fen()}")
-
-    return board
+        return VariantBoard()
 
 
-def is_engine_move(game: model.Game, prior_game: Optional[model.Game], board: chess.Board) -> bool:
+def is_engine_move(game: model.Game, prior_game: Optional[model.GameSnapshot], board: chess.Board) -> bool:
     """Check whether it is the engine's turn."""
     return game_changed(game, prior_game) and bot_to_move(game, board)
 
@@ -847,7 +1096,7 @@ def is_game_over(game: model.Game) -> bool:
     return status != "started"
 
 
-def should_exit_game(board: chess.Board, game: model.Game, prior_game: Optional[model.Game], li: LICHESS_TYPE,
+def should_exit_game(board: chess.Board, game: model.Game, prior_game: Optional[model.GameSnapshot], li: LICHESS_TYPE,
                      is_correspondence: bool) -> bool:
     """Whether we should exit a game."""
     if (is_correspondence
@@ -880,18 +1129,18 @@ def final_queue_entries(control_queue: CONTROL_QUEUE_TYPE, correspondence_queue:
     else:
         logger.info(f"--- {game.url()} Game over")
 
-    control_queue.put_nowait({"type": "local_game_done", "game": {"id": game.id,
-                                                                  "pgn": pgn_record,
-                                                                  "complete": is_game_over(game)}})
+    control_queue.put({"type": "local_game_done", "game": {"id": game.id,
+                                                           "pgn": pgn_record,
+                                                           "complete": is_game_over(game)}})
 
 
-def game_changed(current_game: model.Game, prior_game: Optional[model.Game]) -> bool:
+def game_changed(current_game: model.Game, prior_game: Optional[model.GameSnapshot]) -> bool:
     """Check whether the current game state is different from the previous game state."""
     if prior_game is None:
         return True
 
     current_game_moves_str: str = current_game.state["moves"]
-    prior_game_moves_str: str = prior_game.state["moves"]
+    prior_game_moves_str = prior_game.moves
     return current_game_moves_str != prior_game_moves_str
 
 
@@ -1164,7 +1413,8 @@ def start_lichess_bot() -> None:
     max_retries = CONFIG.engine.online_moves.max_retries
     check_python_version()
     log_python_and_libraries()
-    li = lichess.Lichess(CONFIG.token, CONFIG.url, __version__, logging_level, max_retries)
+    li = lichess.Lichess(CONFIG.token, CONFIG.url, __version__, logging_level, max_retries,
+                         CONFIG.engine.online_moves.cache)
 
     user_profile = li.get_profile()
     username = user_profile["username"]
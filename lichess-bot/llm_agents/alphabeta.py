@@ -0,0 +1,282 @@
+"""
+A small pure-Python alpha-beta search.
+
+It is nowhere near a real engine, but it always has a legal, sensible move ready within a few milliseconds. The LLM agents
+use it when the LLMs fail or run out of time, and to shortlist the moves they show to the LLMs.
+"""
+import time
+import chess
+import chess.polyglot
+from dataclasses import dataclass, field
+from typing import Optional
+
+MATE_SCORE = 100_000
+INFINITY = 1_000_000
+PIECE_VALUES = {chess.PAWN: 100, chess.KNIGHT: 320, chess.BISHOP: 330, chess.ROOK: 500, chess.QUEEN: 900, chess.KING: 0}
+
+# Piece-square tables from white's point of view, a1 first.
+PAWN_TABLE = [0, 0, 0, 0, 0, 0, 0, 0,
+              5, 10, 10, -20, -20, 10, 10, 5,
+              5, -5, -10, 0, 0, -10, -5, 5,
+              0, 0, 0, 20, 20, 0, 0, 0,
+              5, 5, 10, 25, 25, 10, 5, 5,
+              10, 10, 20, 30, 30, 20, 10, 10,
+              50, 50, 50, 50, 50, 50, 50, 50,
+              0, 0, 0, 0, 0, 0, 0, 0]
+KNIGHT_TABLE = [-50, -40, -30, -30, -30, -30, -40, -50,
+                -40, -20, 0, 5, 5, 0, -20, -40,
+                -30, 5, 10, 15, 15, 10, 5, -30,
+                -30, 0, 15, 20, 20, 15, 0, -30,
+                -30, 5, 15, 20, 20, 15, 5, -30,
+                -30, 0, 10, 15, 15, 10, 0, -30,
+                -40, -20, 0, 0, 0, 0, -20, -40,
+                -50, -40, -30, -30, -30, -30, -40, -50]
+BISHOP_TABLE = [-20, -10, -10, -10, -10, -10, -10, -20,
+                -10, 5, 0, 0, 0, 0, 5, -10,
+                -10, 10, 10, 10, 10, 10, 10, -10,
+                -10, 0, 10, 10, 10, 10, 0, -10,
+                -10, 5, 5, 10, 10, 5, 5, -10,
+                -10, 0, 5, 10, 10, 5, 0, -10,
+                -10, 0, 0, 0, 0, 0, 0, -10,
+                -20, -10, -10, -10, -10, -10, -10, -20]
+ROOK_TABLE = [0, 0, 0, 5, 5, 0, 0, 0,
+              -5, 0, 0, 0, 0, 0, 0, -5,
+              -5, 0, 0, 0, 0, 0, 0, -5,
+              -5, 0, 0, 0, 0, 0, 0, -5,
+              -5, 0, 0, 0, 0, 0, 0, -5,
+              -5, 0, 0, 0, 0, 0, 0, -5,
+              5, 10, 10, 10, 10, 10, 10, 5,
+              0, 0, 0, 0, 0, 0, 0, 0]
+QUEEN_TABLE = [-20, -10, -10, -5, -5, -10, -10, -20,
+               -10, 0, 5, 0, 0, 0, 0, -10,
+               -10, 5, 5, 5, 5, 5, 0, -10,
+               0, 0, 5, 5, 5, 5, 0, -5,
+               -5, 0, 5, 5, 5, 5, 0, -5,
+               -10, 0, 5, 5, 5, 5, 0, -10,
+               -10, 0, 0, 0, 0, 0, 0, -10,
+               -20, -10, -10, -5, -5, -10, -10, -20]
+KING_TABLE = [20, 30, 10, 0, 0, 10, 30, 20,
+              20, 20, 0, 0, 0, 0, 20, 20,
+              -10, -20, -20, -20, -20, -20, -20, -10,
+              -20, -30, -30, -40, -40, -30, -30, -20,
+              -30, -40, -40, -50, -50, -40, -40, -30,
+              -30, -40, -40, -50, -50, -40, -40, -30,
+              -30, -40, -40, -50, -50, -40, -40, -30,
+              -30, -40, -40, -50, -50, -40, -40, -30]
+PIECE_SQUARE_TABLES = {chess.PAWN: PAWN_TABLE, chess.KNIGHT: KNIGHT_TABLE, chess.BISHOP: BISHOP_TABLE,
+                       chess.ROOK: ROOK_TABLE, chess.QUEEN: QUEEN_TABLE, chess.KING: KING_TABLE}
+
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the time is up."""
+
+
+@dataclass
+class SearchResult:
+    """The outcome of a search."""
+
+    move: chess.Move
+    """The best move found."""
+    score: int
+    """The score of the best move in centipawns, from the point of view of the side to move."""
+    depth: int
+    """The deepest completed iteration."""
+    nodes: int
+    """The number of positions searched."""
+    root_scores: dict[chess.Move, int] = field(default_factory=dict)
+    """The score of every root move at the deepest completed iteration. Moves that were cut off have upper bounds."""
+
+
+def evaluate(board: chess.Board) -> int:
+    """Score the position in centipawns from the point of view of the side to move."""
+    score = 0
+    for piece_type, table in PIECE_SQUARE_TABLES.items():
+        value = PIECE_VALUES[piece_type]
+        for square in board.pieces(piece_type, chess.WHITE):
+            score += value + table[square]
+        for square in board.pieces(piece_type, chess.BLACK):
+            score -= value + table[chess.square_mirror(square)]
+    return score if board.turn == chess.WHITE else -score
+
+
+class Searcher:
+    """An iterative deepening alpha-beta search with a transposition table, quiescence search and move ordering."""
+
+    def __init__(self, max_table_size: int = 200_000) -> None:
+        """:param max_table_size: The number of positions kept in the transposition table."""
+        self.max_table_size = max_table_size
+        self.table: dict[int, tuple[int, int, int, Optional[chess.Move]]] = {}
+        self.killers: dict[int, list[chess.Move]] = {}
+        self.nodes = 0
+        self.stop_time = float("inf")
+        self.max_nodes: Optional[int] = None
+
+    def search(self, board: chess.Board, seconds: float, max_depth: int = 64, max_nodes: Optional[int] = None,
+               root_moves: Optional[list[chess.Move]] = None) -> SearchResult:
+        """
+        Search until the time is up or `max_depth` is reached.
+
+        :param board: The position to search. It is restored before returning.
+        :param seconds: The time to search for. At least depth 1 is always completed.
+        :param max_depth: The maximum depth in plies.
+        :param max_nodes: The maximum number of positions to search.
+        :param root_moves: Only consider these moves. All legal moves if `None`.
+        :return: The best move and its score.
+        """
+        moves = list(root_moves) if root_moves else list(board.legal_moves)
+        if not moves:
+            raise ValueError(f"There are no legal moves in {board.fen()}.")
+        self.nodes = 0
+        self.killers = {}
+        self.max_nodes = max_nodes
+        self.stop_time = float("inf")
+        result = SearchResult(moves[0], 0, 0, 0)
+        start = time.monotonic()
+        for depth in range(1, max_depth + 1):
+            try:
+                move, score, root_scores = self.search_root(board, moves, depth)
+            except SearchTimeout:
+                break
+            result = SearchResult(move, score, depth, self.nodes, root_scores)
+            if abs(score) >= MATE_SCORE - max_depth or len(moves) == 1:
+                break
+            # Depth 1 is always completed, so there is a move to play even with no time at all.
+            self.stop_time = start + seconds
+            moves.sort(key=lambda root_move: root_scores[root_move], reverse=True)
+            if time.monotonic() >= self.stop_time:
+                break
+        result.nodes = self.nodes
+        return result
+
+    def search_root(self, board: chess.Board, moves: list[chess.Move],
+                    depth: int) -> tuple[chess.Move, int, dict[chess.Move, int]]:
+        """Search each root move and return the best one, its score, and the scores of all the moves."""
+        alpha = -INFINITY
+        best_move = moves[0]
+        root_scores: dict[chess.Move, int] = {}
+        for move in moves:
+            board.push(move)
+            try:
+                score = -self.negamax(board, depth - 1, -INFINITY, -alpha, 1)
+            finally:
+                board.pop()
+            root_scores[move] = score
+            if score > alpha:
+                alpha = score
+                best_move = move
+        return best_move, alpha, root_scores
+
+    def negamax(self, board: chess.Board, depth: int, alpha: int, beta: int, ply: int) -> int:
+        """Score a position with an alpha-beta search of `depth` plies."""
+        self.check_limits()
+        if board.is_checkmate():
+            return -MATE_SCORE + ply
+        if board.is_insufficient_material() or board.is_fifty_moves() or board.is_repetition(2):
+            return 0
+        if depth <= 0:
+            return self.quiescence(board, alpha, beta, ply)
+
+        key = chess.polyglot.zobrist_hash(board)
+        table_score, table_move = self.probe_table(key, depth, alpha, beta)
+        if table_score is not None:
+            return table_score
+
+        best_score, best_move = self.search_moves(board, depth, alpha, beta, ply, table_move)
+        if best_move is None:  # Stalemate.
+            return 0
+        flag = UPPER_BOUND if best_score <= alpha else LOWER_BOUND if best_score >= beta else EXACT
+        if len(self.table) >= self.max_table_size:
+            self.table.clear()
+        self.table[key] = (depth, best_score, flag, best_move)
+        return best_score
+
+    def probe_table(self, key: int, depth: int, alpha: int, beta: int) -> tuple[Optional[int], Optional[chess.Move]]:
+        """Get the score of the position if the transposition table has a deep enough bound for it, and its best move."""
+        entry = self.table.get(key)
+        if entry is None:
+            return None, None
+        entry_depth, entry_score, entry_flag, table_move = entry
+        if entry_depth >= depth and (entry_flag == EXACT
+                                     or (entry_flag == LOWER_BOUND and entry_score >= beta)
+                                     or (entry_flag == UPPER_BOUND and entry_score <= alpha)):
+            return entry_score, table_move
+        return None, table_move
+
+    def search_moves(self, board: chess.Board, depth: int, alpha: int, beta: int, ply: int,
+                     table_move: Optional[chess.Move]) -> tuple[int, Optional[chess.Move]]:
+        """Search the moves of a position until one fails high. Return the best score and move (`None` if no moves)."""
+        best_score = -INFINITY
+        best_move = None
+        for move in self.ordered_moves(board, table_move, ply):
+            board.push(move)
+            try:
+                score = -self.negamax(board, depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                board.pop()
+            if score > best_score:
+                best_score = score
+                best_move = move
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                if not board.is_capture(move):
+                    self.add_killer(move, ply)
+                break
+        return best_score, best_move
+
+    def add_killer(self, move: chess.Move, ply: int) -> None:
+        """Remember a quiet move that caused a cutoff, so that it is tried early in the other positions at this ply."""
+        killers = self.killers.setdefault(ply, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[2:]
+
+    def quiescence(self, board: chess.Board, alpha: int, beta: int, ply: int) -> int:
+        """Search only captures so that the evaluation isn't taken in the middle of an exchange."""
+        self.check_limits()
+        stand_pat = evaluate(board)
+        if stand_pat >= beta:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+        captures = sorted(board.generate_legal_captures(), key=lambda move: self.capture_order(board, move), reverse=True)
+        for move in captures:
+            board.push(move)
+            try:
+                score = -self.quiescence(board, -beta, -alpha, ply + 1)
+            finally:
+                board.pop()
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+        return alpha
+
+    def ordered_moves(self, board: chess.Board, table_move: Optional[chess.Move], ply: int) -> list[chess.Move]:
+        """Order the moves: the transposition table move, captures (most valuable victim first), killers, the rest."""
+        killers = self.killers.get(ply, [])
+
+        def order(move: chess.Move) -> int:
+            if move == table_move:
+                return 1_000_000
+            if board.is_capture(move) or move.promotion:
+                return 100_000 + self.capture_order(board, move)
+            if move in killers:
+                return 50_000 - killers.index(move)
+            return 0
+
+        return sorted(board.legal_moves, key=order, reverse=True)
+
+    def capture_order(self, board: chess.Board, move: chess.Move) -> int:
+        """Most valuable victim, least valuable attacker."""
+        victim = board.piece_type_at(move.to_square) or (chess.PAWN if board.is_en_passant(move) else None)
+        attacker = board.piece_type_at(move.from_square) or chess.PAWN
+        promotion = PIECE_VALUES[move.promotion] if move.promotion else 0
+        return (PIECE_VALUES[victim] if victim else 0) * 10 - PIECE_VALUES[attacker] // 10 + promotion
+
+    def check_limits(self) -> None:
+        """Stop the search when the time or the node limit is reached."""
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise SearchTimeout()
+        if self.nodes % 256 == 0 and time.monotonic() >= self.stop_time:
+            raise SearchTimeout()
@@ -0,0 +1,145 @@
+"""Fit the LLM calls of a move into the time the game clock allows."""
+import math
+import time
+import threading
+import logging
+import chess
+import chess.engine
+from collections import Counter
+from collections.abc import Callable
+from typing import Optional, TypeVar
+from llm_agents.alphabeta import Searcher
+from lib.move_timing import span
+
+logger = logging.getLogger(__name__)
+
+MOVES_TO_GO = 20
+"""The number of moves the remaining clock time is shared between."""
+SAFETY_MARGIN = 1.0
+"""Seconds kept back for choosing a fallback move and sending the move to lichess."""
+FALLBACK_SEARCH_TIME = 0.02
+"""Seconds the local alpha-beta search gets when no LLM answer can be used."""
+
+T = TypeVar("T")
+
+
+class OutOfTime(Exception):
+    """Raised when the next LLM call can't finish before the deadline."""
+
+
+class LatencyTracker:
+    """Keep an exponentially weighted moving average of how long the calls to each model take."""
+
+    def __init__(self, weight: float = 0.3) -> None:
+        """:param weight: The weight of the latest measurement."""
+        self.weight = weight
+        self.averages: dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def record(self, model: str, seconds: float) -> None:
+        """Add the duration of one call."""
+        with self.lock:
+            average = self.averages.get(model)
+            self.averages[model] = seconds if average is None else (1 - self.weight) * average + self.weight * seconds
+
+    def estimate(self, model: str, default: float) -> float:
+        """Get the expected duration of a call, or `default` if the model hasn't been called yet."""
+        with self.lock:
+            return self.averages.get(model, default)
+
+
+latencies = LatencyTracker()
+
+
+def timed(model: str, call: Callable[[], T]) -> T:
+    """Make an LLM call and record how long it took, also as the "llm" stage of the move being played."""
+    start = time.monotonic()
+    with span("llm"):
+        result = call()
+    latencies.record(model, time.monotonic() - start)
+    return result
+
+
+def time_for_move(time_limit: chess.engine.Limit, board: chess.Board) -> float:
+    """
+    Get the number of seconds to spend on this move.
+
+    :param time_limit: The limit from `engine_wrapper.move_time`.
+    :param board: The current position.
+    :return: The time to use, or infinity if there is no limit.
+    """
+    if time_limit.time is not None:
+        return max(0.0, time_limit.time - SAFETY_MARGIN)
+
+    clock = time_limit.white_clock if board.turn == chess.WHITE else time_limit.black_clock
+    if clock is None:
+        return math.inf
+    increment = (time_limit.white_inc if board.turn == chess.WHITE else time_limit.black_inc) or 0
+    move_time = clock / MOVES_TO_GO + increment
+    return max(0.0, min(move_time, clock / 2) - SAFETY_MARGIN)
+
+
+class MoveBudget:
+    """The deadline for one move, and the answers collected before it."""
+
+    def __init__(self, time_limit: chess.engine.Limit, board: chess.Board) -> None:
+        """
+        Start the clock for this move.
+
+        :param time_limit: The limit from `engine_wrapper.move_time`.
+        :param board: The current position.
+        """
+        self.start = time.monotonic()
+        self.seconds = time_for_move(time_limit, board)
+        self.deadline = self.start + self.seconds
+        self.candidates: Counter[chess.Move] = Counter()
+
+    def remaining(self) -> float:
+        """Get the number of seconds left before the deadline."""
+        return self.deadline - time.monotonic()
+
+    def can_afford(self, seconds: float) -> bool:
+        """Check if something that takes `seconds` can finish before the deadline."""
+        return seconds <= self.remaining()
+
+    def call_timeout(self) -> Optional[float]:
+        """Get the timeout of an LLM call, or `None` if there is no time limit."""
+        return None if math.isinf(self.seconds) else max(0.1, self.remaining())
+
+    def add_candidates(self, text: str, possible_moves: list[chess.Move]) -> None:
+        """Count the possible moves mentioned in an answer, so that there is something to play if time runs out."""
+        for move in possible_moves:
+            if move.uci() in text:
+                self.candidates[move] += 1
+
+    def fallback_move(self, board: chess.Board, possible_moves: list[chess.Move]) -> chess.Move:
+        """Get the move mentioned the most by the answers collected so far, or the move of a short local search."""
+        if self.candidates:
+            move, votes = self.candidates.most_common(1)[0]
+            logger.info(f"No usable LLM answer. Playing {board.san(move)}, suggested {votes} time(s).")
+            return move
+        # Each call gets its own searcher: the games share this code, and a search keeps its state in its searcher.
+        result = Searcher().search(board, FALLBACK_SEARCH_TIME, root_moves=possible_moves)
+        logger.info(f"No usable LLM answer. Playing {board.san(result.move)} from a depth {result.depth} local search.")
+        return result.move
+
+
+def plan_layers(budget: MoveBudget, proposer_latency: float, aggregator_latency: float,
+                max_layers: int, max_proposers: int) -> tuple[int, int]:
+    """
+    Choose how many proposer layers and proposers per layer fit in the budget.
+
+    The proposers of a layer run concurrently, so a layer costs about one proposer call. The aggregator always runs.
+
+    :return: The number of layers and the number of proposers per layer. (0, 0) if only the aggregator fits.
+    """
+    available = budget.remaining() - aggregator_latency
+    if math.isinf(available) or proposer_latency <= 0:
+        return max_layers, max_proposers
+    layers = min(max_layers, max(0, int(available // proposer_latency)))
+    if layers == 0:
+        return 0, 0
+    # A layer waits for its slowest proposer, so fewer proposers are used when the time is tight.
+    slack = available / layers / proposer_latency
+    proposers = max_proposers if slack >= 1.5 else max(1, max_proposers - 1)
+    return layers, proposers
@@ -0,0 +1,342 @@
+"""
+A provider-agnostic client for the LLM APIs used by the homemade agents.
+
+Every provider gets one persistent `requests.Session` with its own connection pool, so the TLS handshake is paid once per
+connection instead of once per move.
+"""
+import asyncio
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+import logging
+import requests
+import chess
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from collections.abc import Callable
+from typing import Any, Optional, Union
+from collections.abc import Iterator
+
+logger = logging.getLogger(__name__)
+
+LLM_RESPONSE_TYPE = Union[str, dict[str, Any]]
+USER_TURN = "Now it's your turn to play a move."
+JSON_REMINDER = "Return the specified JSON, do not prepend your response with anything."
+BEST_MOVE_PATTERN = re.compile(r'"best_move"\s*:\s*"\s*([a-h][1-8][a-h][1-8][qrbn]?)\s*"')
+BEST_MOVE_MAX_LENGTH = 64
+
+
+@dataclass(frozen=True)
+class Provider:
+    """How to talk to one LLM API."""
+
+    endpoint: str
+    """The default URL of the chat endpoint."""
+    api_key_env: str
+    """The environment variable holding the API key."""
+    build_headers: Callable[[str], dict[str, str]]
+    """Create the request headers from the API key."""
+    build_payload: Callable[[str, str, float, bool], dict[str, Any]]
+    """Create the request body from the system prompt, model, temperature and whether JSON output is required."""
+    extract_text: Callable[[dict[str, Any]], str]
+    """Get the generated text from the decoded response."""
+    extract_delta: Callable[[dict[str, Any]], str]
+    """Get the new text from one decoded event of a streamed response."""
+    min_interval: float = 0
+    """The minimum number of seconds between two requests (to avoid rate limit errors)."""
+
+
+def bearer_headers(api_key: str) -> dict[str, str]:
+    """Headers for the APIs that use OpenAI's authentication."""
+    return {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
+
+
+def anthropic_headers(api_key: str) -> dict[str, str]:
+    """Headers for the Anthropic API."""
+    return {"Content-Type": "application/json", "x-api-key": api_key, "anthropic-version": "2023-06-01"}
+
+
+def openai_payload(system_prompt: str, model: str, temperature: float, json_mode: bool) -> dict[str, Any]:
+    """Request body for the OpenAI chat completions API."""
+    payload: dict[str, Any] = {"model": model,
+                               "messages": [{"role": "system", "content": system_prompt},
+                                            {"role": "user", "content": USER_TURN}],
+                               "stream": False,
+                               "temperature": temperature}
+    if json_mode:
+        payload["response_format"] = {"type": "json_object"}
+    return payload
+
+
+def groq_payload(system_prompt: str, model: str, temperature: float, json_mode: bool) -> dict[str, Any]:
+    """Request body for the Groq API. The system prompt is sent in the user message."""
+    payload: dict[str, Any] = {"model": model,
+                               "messages": [{"role": "user", "content": f"system: {system_prompt}\n\n user: {USER_TURN}"}],
+                               "stream": False,
+                               "temperature": temperature}
+    if json_mode:
+        payload["response_format"] = {"type": "json_object"}
+    return payload
+
+
+def anthropic_payload(system_prompt: str, model: str, temperature: float, json_mode: bool) -> dict[str, Any]:
+    """Request body for the Anthropic messages API. The system prompt is sent in the user message."""
+    content = f"system: {system_prompt}\n\n user: {USER_TURN}"
+    if json_mode:
+        content += JSON_REMINDER
+    return {"model": model,
+            "messages": [{"role": "user", "content": content}],
+            "temperature": temperature,
+            "max_tokens": 2024}
+
+
+def chat_completion_text(response_json: dict[str, Any]) -> str:
+    """Get the text from an OpenAI style response."""
+    text: str = response_json["choices"][0]["message"]["content"]
+    return text
+
+
+def anthropic_text(response_json: dict[str, Any]) -> str:
+    """Get the text from an Anthropic response."""
+    text: str = response_json["content"][0]["text"]
+    return text
+
+
+def chat_completion_delta(event: dict[str, Any]) -> str:
+    """Get the new text from an OpenAI style stream event."""
+    choices = event.get("choices") or [{}]
+    text: str = (choices[0].get("delta") or {}).get("content") or ""
+    return text
+
+
+def anthropic_delta(event: dict[str, Any]) -> str:
+    """Get the new text from an Anthropic stream event. Only `content_block_delta` events carry text."""
+    if event.get("type") != "content_block_delta":
+        return ""
+    text: str = event["delta"].get("text", "")
+    return text
+
+
+def server_sent_events(lines: Iterator[bytes]) -> Iterator[dict[str, Any]]:
+    """Decode the `data:` lines of a server-sent event stream."""
+    for line in lines:
+        if not line.startswith(b"data:"):
+            continue
+        data = line[5:].strip()
+        if data == b"[DONE]":
+            return
+        yield json.loads(data)
+
+
+def find_best_move(text: str, legal_moves: set[str]) -> Optional[str]:
+    """Find a legal `best_move` in the (possibly partial) JSON answer."""
+    for match in BEST_MOVE_PATTERN.finditer(text):
+        if match.group(1) in legal_moves:
+            return match.group(1)
+    return None
+
+
+PROVIDERS: dict[str, Provider] = {
+    "openai": Provider("https://api.openai.com/v1/chat/completions", "OPENAI_API_KEY",
+                       bearer_headers, openai_payload, chat_completion_text, chat_completion_delta),
+    "groq": Provider("https://api.groq.com/openai/v1/chat/completions", "GROQ_API_KEY",
+                     bearer_headers, groq_payload, chat_completion_text, chat_completion_delta, min_interval=5),
+    "claude": Provider("https://api.anthropic.com/v1/messages", "CLAUD_API_KEY",
+                       anthropic_headers, anthropic_payload, anthropic_text, anthropic_delta),
+}
+
+
+class LLMClient:
+    """Send prompts to any of the `PROVIDERS` over pooled keep-alive connections."""
+
+    def __init__(self, pool_maxsize: int = 8, timeout: float = 120, endpoints: Optional[dict[str, str]] = None) -> None:
+        """
+        Create the client. No connection is opened until the first request.
+
+        :param pool_maxsize: The number of connections kept open to each provider.
+        :param timeout: The default number of seconds to wait for a response.
+        :param endpoints: Override the URL of some providers (e.g. to use a local server in tests).
+        """
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+        self.endpoints = endpoints or {}
+        self.sessions: dict[str, requests.Session] = {}
+        self.last_request_time: dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def session(self, provider_name: str) -> requests.Session:
+        """Get the persistent session of a provider, creating it on first use."""
+        with self.lock:
+            session = self.sessions.get(provider_name)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self.sessions[provider_name] = session
+            return session
+
+    def endpoint(self, provider_name: str) -> str:
+        """Get the URL to send requests to."""
+        return self.endpoints.get(provider_name) or PROVIDERS[provider_name].endpoint
+
+    def wait_for_rate_limit(self, provider_name: str, provider: Provider) -> None:
+        """Space out the requests to providers that have a `min_interval`."""
+        if not provider.min_interval:
+            return
+        with self.lock:
+            earliest = self.last_request_time.get(provider_name, -provider.min_interval) + provider.min_interval
+            now = time.monotonic()
+            self.last_request_time[provider_name] = max(now, earliest)
+        if earliest > now:
+            time.sleep(earliest - now)
+
+    def complete(self, provider_name: str, system_prompt: str, model: Optional[str] = None, temperature: float = 0,
+                 json_mode: bool = False, timeout: Optional[float] = None) -> LLM_RESPONSE_TYPE:
+        """
+        Send a prompt and wait for the whole answer.
+
+        :param provider_name: One of the keys of `PROVIDERS`.
+        :param system_prompt: The prompt describing the position and the task.
+        :param model: The model name used by the provider.
+        :param temperature: The sampling temperature.
+        :param json_mode: Whether the answer is a JSON object that should be decoded.
+        :param timeout: How many seconds to wait for the answer. Uses the client's default if `None`.
+        :return: The text of the answer, or the decoded object if `json_mode` is true.
+        """
+        provider = PROVIDERS[provider_name]
+        payload = provider.build_payload(system_prompt, model or "", temperature, json_mode)
+        response = self.post(provider_name, payload, timeout)
+        text = provider.extract_text(response.json())
+        return json.loads(text) if json_mode else text
+
+    def stream_best_move(self, provider_name: str, system_prompt: str, legal_moves: list[chess.Move],
+                         model: Optional[str] = None, temperature: float = 0, timeout: Optional[float] = None,
+                         on_complete: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Stream the answer to a prompt that asks for a JSON object with a `best_move`, and return the move early.
+
+        The move is returned as soon as a legal UCI `best_move` appears in the stream. The rest of the answer (e.g. the
+        rationale) is read in a background thread and passed to `on_complete`.
+
+        :param provider_name: One of the keys of `PROVIDERS`.
+        :param system_prompt: The prompt describing the position and the task.
+        :param legal_moves: The moves the answer can choose from.
+        :param model: The model name used by the provider.
+        :param temperature: The sampling temperature.
+        :param timeout: How many seconds to wait between two chunks of the answer. Uses the client's default if `None`.
+        :param on_complete: Called with the whole text of the answer once it has been received.
+        :return: The best move in UCI format. If no legal move is found in the stream, the `best_move` of the whole
+            answer is returned as is, or the whole answer if it isn't the expected JSON object.
+        """
+        provider = PROVIDERS[provider_name]
+        payload = provider.build_payload(system_prompt, model or "", temperature, True)
+        payload["stream"] = True
+        response = self.post(provider_name, payload, timeout, stream=True)
+        legal_uci = {move.uci() for move in legal_moves}
+        # Read each chunk as soon as it arrives instead of filling a buffer first.
+        events = server_sent_events(response.iter_lines(chunk_size=None))
+        chunks: list[str] = []
+
+        def drain() -> None:
+            try:
+                chunks.extend(provider.extract_delta(event) for event in events)
+            finally:
+                response.close()
+            if on_complete is not None:
+                on_complete("".join(chunks))
+
+        text = ""
+        for event in events:
+            chunks.append(provider.extract_delta(event))
+            # Only the end of the text can hold a match that was not complete after the previous chunk.
+            search_start = max(0, len(text) - BEST_MOVE_MAX_LENGTH)
+            text += chunks[-1]
+            move = find_best_move(text[search_start:], legal_uci)
+            if move is not None:
+                # The context goes along, so the answer is logged with the game that asked for it.
+                threading.Thread(target=contextvars.copy_context().run, args=(drain,), name="llm-stream-drain",
+                                 daemon=True).start()
+                return move
+
+        drain()
+        text = "".join(chunks)
+        try:
+            best_move: str = json.loads(text)["best_move"]
+        except (ValueError, KeyError, TypeError):
+            return text
+        return best_move
+
+    def post(self, provider_name: str, payload: dict[str, Any], timeout: Optional[float],
+             stream: bool = False) -> requests.Response:
+        """Send a request body to a provider and check the HTTP status of the response."""
+        provider = PROVIDERS[provider_name]
+        api_key = os.getenv(provider.api_key_env, "")
+        self.wait_for_rate_limit(provider_name, provider)
+        response = self.session(provider_name).post(self.endpoint(provider_name),
+                                                    headers=provider.build_headers(api_key),
+                                                    data=json.dumps(payload),
+                                                    timeout=timeout or self.timeout,
+                                                    stream=stream)
+        response.raise_for_status()
+        return response
+
+    def close(self) -> None:
+        """Close all the pooled connections."""
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
+
+
+class AsyncLLMClient:
+    """
+    An asyncio front end to `LLMClient`.
+
+    The requests run on a dedicated thread pool that shares the pooled sessions, so many coroutines can wait on LLM answers
+    without blocking the event loop.
+    """
+
+    def __init__(self, client: Optional[LLMClient] = None, max_workers: int = 8) -> None:
+        """
+        Create the client.
+
+        :param client: The synchronous client whose connection pools are used. A new one is created if `None`.
+        :param max_workers: The maximum number of requests in flight.
+        """
+        self.client = client or LLMClient(pool_maxsize=max_workers)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="async-llm")
+
+    async def complete(self, provider_name: str, system_prompt: str, model: Optional[str] = None, temperature: float = 0,
+                       json_mode: bool = False, timeout: Optional[float] = None) -> LLM_RESPONSE_TYPE:
+        """Send a prompt and wait for the whole answer. See `LLMClient.complete`."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor,
+                                          lambda: self.client.complete(provider_name, system_prompt, model, temperature,
+                                                                       json_mode, timeout))
+
+    def close(self) -> None:
+        """Stop the worker threads and close the connections."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.client.close()
+
+
+default_client = LLMClient()
+
+
+def complete(provider_name: str, system_prompt: str, model: Optional[str] = None, temperature: float = 0,
+             json_mode: bool = False, timeout: Optional[float] = None) -> LLM_RESPONSE_TYPE:
+    """Send a prompt with the process-wide client. See `LLMClient.complete`."""
+    return default_client.complete(provider_name, system_prompt, model, temperature, json_mode, timeout)
+
+
+def stream_best_move(provider_name: str, system_prompt: str, legal_moves: list[chess.Move], model: Optional[str] = None,
+                     temperature: float = 0, timeout: Optional[float] = None,
+                     on_complete: Optional[Callable[[str], None]] = None) -> str:
+    """Stream an answer with the process-wide client and return its `best_move` early. See `LLMClient.stream_best_move`."""
+    return default_client.stream_best_move(provider_name, system_prompt, legal_moves, model, temperature, timeout,
+                                           on_complete)
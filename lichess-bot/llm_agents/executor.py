@@ -0,0 +1,70 @@
+"""Run independent LLM calls concurrently."""
+import contextvars
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+from collections.abc import Callable
+from typing import Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ProposerExecutor:
+    """
+    Dispatch the proposers of one agent layer at the same time and gather their answers.
+
+    The LLM calls spend nearly all of their time waiting on the network, so a small thread pool is enough to overlap them.
+    """
+
+    def __init__(self, max_workers: int = 3) -> None:
+        """:param max_workers: The maximum number of LLM calls that are in flight at the same time."""
+        self.max_workers = max_workers
+        self.pool: Optional[ThreadPoolExecutor] = None
+
+    def gather(self, calls: list[Callable[[], T]]) -> list[T]:
+        """
+        Run all the calls concurrently.
+
+        :param calls: Functions without arguments, one per proposer.
+        :return: The results in the same order as `calls`. The first exception raised by a call is re-raised.
+        """
+        futures = self.submit(calls)
+        return [future.result() for future in futures]
+
+    def gather_until(self, calls: list[Callable[[], T]], deadline: float) -> list[T]:
+        """
+        Run all the calls concurrently, but stop waiting for them at the deadline.
+
+        Calls that haven't started by the deadline are cancelled. Calls that are still running are left to finish in the
+        background and their results are dropped.
+
+        :param calls: Functions without arguments, one per proposer.
+        :param deadline: The `time.monotonic()` time after which the answers are no longer useful.
+        :return: The results of the calls that succeeded before the deadline, in the same order as `calls`.
+        """
+        futures = self.submit(calls)
+        wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+        results = []
+        for index, future in enumerate(futures, start=1):
+            if not future.done():
+                future.cancel()
+                logger.info(f"Proposer {index} missed the deadline.")
+            elif future.exception() is not None:
+                logger.warning(f"Proposer {index} failed: {future.exception()!r}")
+            else:
+                results.append(future.result())
+        return results
+
+    def submit(self, calls: list[Callable[[], T]]) -> list[Future[T]]:
+        """Start the calls on the thread pool, in the context of the caller (e.g. the game whose logs they are tagged with)."""
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="proposer")
+        return [self.pool.submit(contextvars.copy_context().run, call) for call in calls]
+
+    def shutdown(self) -> None:
+        """Stop the worker threads."""
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
@@ -0,0 +1,187 @@
+"""
+A persistent cache of the moves chosen by the LLM agents.
+
+Positions are identified by their polyglot zobrist hash, so a position reached by different move orders is only paid for
+once. The moves are stored in SQLite, with a small in-memory LRU in front of it for the positions seen in this process.
+"""
+import os
+import sqlite3
+import threading
+import time
+import logging
+import chess
+import chess.polyglot
+from collections import OrderedDict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+CacheKey = tuple[int, str, str]
+
+DEFAULT_PATH = "llm_move_cache.sqlite"
+DEFAULT_MAX_ENTRIES = 100_000
+DEFAULT_TTL = 30 * 24 * 60 * 60
+DEFAULT_MEMORY_ENTRIES = 4096
+
+
+def signed_64(value: int) -> int:
+    """Convert an unsigned 64-bit zobrist hash to the signed integers that SQLite stores."""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+class MoveCache:
+    """Store the move an agent chose in a position, keyed by the position's zobrist hash, the agent and the model."""
+
+    def __init__(self, path: str = DEFAULT_PATH, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL,
+                 memory_entries: int = DEFAULT_MEMORY_ENTRIES) -> None:
+        """
+        Open (and create if needed) the cache.
+
+        :param path: The SQLite file. Use ":memory:" for a cache that is not saved.
+        :param max_entries: The maximum number of moves kept on disk. The least recently used are deleted first.
+        :param ttl: The number of seconds after which a cached move is asked for again.
+        :param memory_entries: The number of moves kept in memory.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.memory: OrderedDict[CacheKey, tuple[str, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            # Several games (processes) may share the file.
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS moves (zobrist INTEGER NOT NULL, agent TEXT NOT NULL, "
+                                "model TEXT NOT NULL, move TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL, "
+                                "PRIMARY KEY (zobrist, agent, model))")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS moves_last_used ON moves (last_used)")
+        # Counted once here and then on each change, so inserts don't have to scan the table to know if it is full. The
+        # moves added and deleted by other processes are not counted, so the count is only exact for one process.
+        self.entries: int = self.connection.execute("SELECT COUNT(*) FROM moves").fetchone()[0]
+
+    def key(self, board: chess.Board, agent: str, model: str) -> CacheKey:
+        """Get the key of a position."""
+        return signed_64(chess.polyglot.zobrist_hash(board)), agent, model
+
+    def get(self, board: chess.Board, agent: str, model: str) -> Optional[chess.Move]:
+        """
+        Get the move an agent chose in this position before.
+
+        :param board: The current position.
+        :param agent: The name of the agent.
+        :param model: The model(s) used by the agent.
+        :return: The cached move, or `None` if there is no fresh legal move for this position.
+        """
+        key = self.key(board, agent, model)
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                self.memory.move_to_end(key)
+            else:
+                row = self.connection.execute("SELECT move, created FROM moves WHERE zobrist = ? AND agent = ? AND model = ?",
+                                              key).fetchone()
+                if row is not None:
+                    entry = (row[0], row[1])
+                    self.remember(key, entry)
+            if entry is not None:
+                # A hit in memory is a use too, or the moves used the most would be the first deleted from the disk.
+                self.connection.execute("UPDATE moves SET last_used = ? WHERE zobrist = ? AND agent = ? AND model = ?",
+                                        (now, *key))
+
+            move = self.legal_move(board, entry[0]) if entry is not None and now - entry[1] < self.ttl else None
+            if move is None:
+                self.misses += 1
+                if entry is not None:
+                    self.forget(key)
+            else:
+                self.hits += 1
+            return move
+
+    def put(self, board: chess.Board, agent: str, model: str, move: str) -> None:
+        """
+        Save the move an agent chose in this position. Moves that are not legal UCI moves are not saved.
+
+        :param board: The position the move was chosen in.
+        :param agent: The name of the agent.
+        :param model: The model(s) used by the agent.
+        :param move: The chosen move.
+        """
+        legal_move = self.legal_move(board, move)
+        if legal_move is None:
+            return
+        key = self.key(board, agent, model)
+        now = time.time()
+        entry = (legal_move.uci(), now)
+        with self.lock:
+            self.remember(key, entry)
+            inserted = self.connection.execute("INSERT OR IGNORE INTO moves VALUES (?, ?, ?, ?, ?, ?)",
+                                               (*key, entry[0], now, now)).rowcount
+            if inserted:
+                self.entries += 1
+                if self.entries > self.max_entries:
+                    self.evict(self.entries - self.max_entries)
+            else:
+                self.connection.execute("UPDATE moves SET move = ?, created = ?, last_used = ? "
+                                        "WHERE zobrist = ? AND agent = ? AND model = ?", (entry[0], now, now, *key))
+
+    def evict(self, count: int) -> None:
+        """Delete the `count` least recently used moves from the disk."""
+        deleted = self.connection.execute("DELETE FROM moves WHERE rowid IN "
+                                          "(SELECT rowid FROM moves ORDER BY last_used LIMIT ?)", (count,)).rowcount
+        self.entries = max(0, self.entries - deleted)
+
+    def legal_move(self, board: chess.Board, move: str) -> Optional[chess.Move]:
+        """Check a move against the board. This also guards against zobrist hash collisions."""
+        try:
+            legal_move = chess.Move.from_uci(str(move).strip())
+        except ValueError:
+            return None
+        return legal_move if board.is_legal(legal_move) else None
+
+    def remember(self, key: CacheKey, entry: tuple[str, float]) -> None:
+        """Add a move to the in-memory LRU."""
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def forget(self, key: CacheKey) -> None:
+        """Remove a stale or illegal move."""
+        self.memory.pop(key, None)
+        deleted = self.connection.execute("DELETE FROM moves WHERE zobrist = ? AND agent = ? AND model = ?", key).rowcount
+        self.entries = max(0, self.entries - deleted)
+
+    def stats(self) -> str:
+        """Get the hit and miss counters."""
+        total = self.hits + self.misses
+        hit_rate = f"{self.hits / total:.0%}" if total else "n/a"
+        return f"{self.hits} hits, {self.misses} misses ({hit_rate} hit rate)"
+
+    def close(self) -> None:
+        """Close the database."""
+        with self.lock:
+            self.connection.close()
+
+
+open_caches: dict[str, MoveCache] = {}
+open_caches_lock = threading.Lock()
+
+
+def open_move_cache(path: str = DEFAULT_PATH, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL) -> MoveCache:
+    """
+    Get the cache stored in `path`.
+
+    The cache is shared by all the games played by this process, so the in-memory LRU stays warm between games.
+    """
+    path = path if path == ":memory:" else os.path.abspath(path)
+    with open_caches_lock:
+        cache = open_caches.get(path)
+        if cache is None:
+            cache = MoveCache(path, max_entries, ttl)
+            open_caches[path] = cache
+        return cache
@@ -0,0 +1,87 @@
+"""Check the moves chosen by the LLMs and repair the common formatting slips."""
+import re
+import threading
+import chess
+from typing import Any, Optional
+
+MOVE_DECORATIONS = re.compile(r"^[\s\"'`(\[]*(?:\d+\s*\.+\s*)?|[\s\"'`.,;:!?()\[\]]+$")
+
+
+class LegalMoveIndex:
+    """Look up a possible move by its UCI, SAN or long algebraic notation."""
+
+    def __init__(self, board: chess.Board, possible_moves: list[chess.Move]) -> None:
+        """
+        Index the possible moves.
+
+        :param board: The current position.
+        :param possible_moves: The moves the LLMs may choose from.
+        """
+        self.possible_moves = possible_moves
+        self.uci: dict[str, chess.Move] = {}
+        self.other: dict[str, chess.Move] = {}
+        for move in possible_moves:
+            self.uci[move.uci()] = move
+            san = board.san(move)
+            lan = board.lan(move)
+            for notation in (san, san.rstrip("+#"), lan, lan.rstrip("+#"), lan.replace("-", "").replace("x", "")):
+                self.other.setdefault(notation, move)
+            if board.is_castling(move):
+                for castle in ("O-O", "0-0", "o-o") if board.is_kingside_castling(move) else ("O-O-O", "0-0-0", "o-o-o"):
+                    self.other.setdefault(castle, move)
+                if not board.chess960:
+                    # The king takes rook notation of Chess960, e.g. e1h1.
+                    rook_file = 7 if board.is_kingside_castling(move) else 0
+                    rook = chess.square(rook_file, chess.square_rank(move.from_square))
+                    self.other.setdefault(chess.Move(move.from_square, rook).uci(), move)
+            if move.promotion == chess.QUEEN:
+                # A promotion without a piece is taken to be a queen promotion.
+                self.other.setdefault(chess.Move(move.from_square, move.to_square).uci(), move)
+
+    def exact(self, answer: str) -> Optional[chess.Move]:
+        """Find the move if the answer is exactly a possible move in UCI notation."""
+        return self.uci.get(answer)
+
+    def repair(self, answer: str) -> Optional[chess.Move]:
+        """Find the move after fixing the formatting of the answer (case, decorations, SAN, LAN, castling)."""
+        cleaned = MOVE_DECORATIONS.sub("", answer)
+        for candidate in (cleaned, cleaned.lower(), cleaned.replace(" ", ""), cleaned.lower().replace("-", "")):
+            move = self.uci.get(candidate) or self.other.get(candidate)
+            if move is not None:
+                return move
+        # Pieces written in lowercase, e.g. "nf3".
+        if cleaned[:1] in "nbrqk" and len(cleaned) > 1:
+            return self.other.get(cleaned[0].upper() + cleaned[1:])
+        return None
+
+
+class ValidationStats:
+    """Count how the LLMs' answers were turned into moves."""
+
+    def __init__(self) -> None:
+        """Start all the counts at zero."""
+        self.valid = 0
+        self.repaired = 0
+        self.requeried = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+
+    def add(self, outcome: str) -> None:
+        """Count one answer. `outcome` is one of "valid", "repaired", "requeried" or "failed"."""
+        with self.lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def __str__(self) -> str:
+        """Get a summary of the counts."""
+        return (f"{self.valid} valid, {self.repaired} repaired, {self.requeried} re-queried, "
+                f"{self.failed} unusable")
+
+
+validation_stats = ValidationStats()
+
+
+def answer_text(answer: Any) -> str:
+    """Get the move from an LLM answer, which may be the move itself or the decoded JSON object."""
+    if isinstance(answer, dict):
+        answer = answer.get("best_move", "")
+    return str(answer).strip()
@@ -0,0 +1,147 @@
+"""
+Ask the LLMs about the next move while the opponent is thinking.
+
+After the agent chooses its move, a short local search guesses the opponent's most likely replies, and the LLMs are asked
+for the answer to each of them in the background. If the opponent plays one of the guessed moves, the answer is ready (or
+at least on its way) when the next `gameState` arrives.
+"""
+import concurrent.futures
+import threading
+import time
+import logging
+import chess
+import chess.polyglot
+from concurrent.futures import ThreadPoolExecutor, Future
+from collections.abc import Callable
+from typing import Any, Optional
+from llm_agents.alphabeta import Searcher, INFINITY
+
+logger = logging.getLogger(__name__)
+
+GUESS_SEARCH_TIME = 0.05
+"""Seconds the local search gets to guess the opponent's replies."""
+
+
+def guess_replies(board: chess.Board, count: int, searcher: Searcher) -> list[chess.Move]:
+    """Get the `count` replies a short local search likes best for the side to move."""
+    if board.is_game_over():
+        return []
+    result = searcher.search(board, GUESS_SEARCH_TIME)
+    # The scores of the moves that were cut off are only upper bounds, so the best move goes first even on a tie.
+    ranked = sorted(board.legal_moves, key=lambda move: (move == result.move, result.root_scores.get(move, -INFINITY)),
+                    reverse=True)
+    return ranked[:count]
+
+
+class Ponderer:
+    """Keep the answers being prepared for the positions after the opponent's likely replies."""
+
+    def __init__(self, guesses: int) -> None:
+        """:param guesses: The number of opponent replies to prepare an answer for."""
+        self.guesses = guesses
+        self.searcher = Searcher()
+        self.pool: Optional[ThreadPoolExecutor] = None
+        self.lock = threading.Lock()
+        self.guessing: Optional[Future[None]] = None
+        self.generation = 0
+        self.answers: dict[int, Future[Optional[chess.Move]]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    def start(self, board: chess.Board, think: Callable[[chess.Board], Optional[chess.Move]]) -> None:
+        """
+        Start preparing the answers to the opponent's likely replies.
+
+        :param board: The position after the agent's move, with the opponent to move.
+        :param think: Chooses a move in a position, or returns `None` if there is no usable answer. It is called on the
+            worker threads.
+        """
+        self.cancel()
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=self.guesses + 1, thread_name_prefix="ponder")
+        pool = self.pool
+        board = board.copy()
+        generation = self.generation
+
+        def prepare() -> None:
+            for reply in guess_replies(board, self.guesses, self.searcher):
+                position = board.copy()
+                position.push(reply)
+                with self.lock:
+                    if self.generation != generation:  # Cancelled.
+                        return
+                    self.answers[chess.polyglot.zobrist_hash(position)] = pool.submit(think, position)
+                logger.debug(f"Pondering on {board.san(reply)}.")
+
+        with self.lock:
+            self.guessing = pool.submit(prepare)
+
+    def take(self, board: chess.Board, timeout: float) -> Optional[chess.Move]:
+        """
+        Get the prepared answer for the current position, and drop the others.
+
+        :param board: The current position, after the opponent's move.
+        :param timeout: The number of seconds to wait for an answer that is still being prepared, guessing the replies
+            included.
+        :return: The move, or `None` if the opponent's move wasn't guessed or the answer isn't usable.
+        """
+        deadline = time.monotonic() + max(0.0, timeout)
+        with self.lock:
+            guessing = self.guessing
+        if guessing is None:
+            return None
+        try:
+            guessing.result(timeout=max(0.0, deadline - time.monotonic()))
+        except Exception:
+            pass
+        with self.lock:
+            answer = self.answers.pop(chess.polyglot.zobrist_hash(board), None)
+        self.cancel()
+        if answer is None:
+            self.misses += 1
+            return None
+        try:
+            move = answer.result(timeout=max(0.0, deadline - time.monotonic()))
+        except concurrent.futures.TimeoutError:
+            logger.info("The pondered answer wasn't ready in time.")
+            self.timeouts += 1
+            return None
+        except Exception:
+            logger.exception("Pondering failed.")
+            self.failures += 1
+            return None
+        if move is None or not board.is_legal(move):
+            self.failures += 1
+            return None
+        self.hits += 1
+        return move
+
+    def cancel(self) -> None:
+        """
+        Drop the answers being prepared. The LLM calls already in flight finish in the background.
+
+        The threads of the calls in flight stay busy until the calls finish, so their pool is shut down and the next
+        answers are prepared by a new pool instead of waiting behind them.
+        """
+        with self.lock:
+            self.generation += 1
+            futures: list[Future[Any]] = [*self.answers.values()] + ([self.guessing] if self.guessing else [])
+            in_flight = [future for future in futures if not future.cancel() and not future.done()]
+            self.guessing = None
+            self.answers.clear()
+            if in_flight and self.pool is not None:
+                self.pool.shutdown(wait=False, cancel_futures=True)
+                self.pool = None
+
+    def shutdown(self) -> None:
+        """Stop the worker threads."""
+        self.cancel()
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def __str__(self) -> str:
+        """Get a summary of the ponder hits. The timeouts and failures are guessed replies without a usable answer."""
+        return f"{self.hits} hits, {self.misses} misses, {self.timeouts} timeouts, {self.failures} failures"
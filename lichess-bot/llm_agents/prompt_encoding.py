@@ -0,0 +1,121 @@
+"""
+Encode the position for the prompt templates.
+
+The "verbose" encoding is the original one: the raw lichess game state, and `Move(...)` reprs for the moves. It grows
+quickly with the length of the game. The "compact" encoding sends a FEN, the moves in SAN, and the possible moves grouped
+by piece, which needs a fraction of the tokens.
+"""
+import threading
+import logging
+import chess
+from collections import defaultdict
+from lib.move_history import MoveHistory
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+token_encoder: Any = None
+"""The tiktoken encoder, loaded by the first count of tokens. `False` if it couldn't be loaded."""
+token_encoder_lock = threading.Lock()
+
+ENCODINGS = ("verbose", "compact")
+PIECE_NAMES = {chess.KING: "King", chess.QUEEN: "Queen", chess.ROOK: "Rook", chess.BISHOP: "Bishop",
+               chess.KNIGHT: "Knight", chess.PAWN: "Pawn"}
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens of a prompt.
+
+    The count is exact if `tiktoken` is installed, and otherwise estimated at four characters per token.
+    """
+    encoder = get_token_encoder()
+    if encoder is not None:
+        return len(encoder.encode(text))
+    return (len(text) + 3) // 4
+
+
+def get_token_encoder() -> Any:
+    """
+    Get the tiktoken encoder, or `None` if it can't be loaded.
+
+    It is loaded on first use, because `tiktoken` downloads its data the first time, which fails without a network.
+    """
+    global token_encoder
+    if token_encoder is None:
+        with token_encoder_lock:
+            if token_encoder is None:
+                try:
+                    import tiktoken  # type: ignore[import-not-found]
+                    token_encoder = tiktoken.get_encoding("o200k_base")
+                except Exception as error:
+                    logger.debug(f"The tokens of the prompts are estimated, because tiktoken can't be loaded: {error!r}")
+                    token_encoder = False
+    return token_encoder or None
+
+
+def group_by_piece(board: chess.Board, possible_moves: list[chess.Move]) -> str:
+    """List the possible moves in UCI, one line per piece type, e.g. "Knight: g1f3 g1h3 b1c3 b1a3"."""
+    groups: defaultdict[int, list[str]] = defaultdict(list)
+    for move in possible_moves:
+        groups[board.piece_type_at(move.from_square) or chess.PAWN].append(move.uci())
+    return "\n".join(f"{PIECE_NAMES[piece_type]}: {' '.join(groups[piece_type])}"
+                     for piece_type in PIECE_NAMES if piece_type in groups)
+
+
+def encode_position(board: chess.Board, game_state: Any, possible_moves: list[chess.Move],
+                    encoding: str = "compact", history: Optional[MoveHistory] = None) -> dict[str, Any]:
+    """
+    Get the fields describing the position for the prompt templates.
+
+    :param board: The current position.
+    :param game_state: The latest `gameState` event of the game.
+    :param possible_moves: The moves the LLMs may choose from.
+    :param encoding: One of `ENCODINGS`.
+    :param history: The moves of the game so far. It is brought up to date with `board`. If not given, the moves are
+        replayed from the starting position.
+    :return: The values of `board_format`, `board_state`, `white_moves`, `black_moves` and `possible_moves`.
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown prompt encoding {encoding!r}. Expected one of {', '.join(ENCODINGS)}.")
+    if history is None:
+        history = MoveHistory(board.root())
+    history.sync(board)
+    if encoding == "verbose":
+        return dict(board_format="the lichess game state, including the sequence of UCI moves",
+                    board_state=game_state,
+                    white_moves=list(history.moves[chess.WHITE]),
+                    black_moves=list(history.moves[chess.BLACK]),
+                    possible_moves=possible_moves)
+    return dict(board_format="a FEN string",
+                board_state=board.fen(),
+                white_moves=history.san_text(chess.WHITE) or "none",
+                black_moves=history.san_text(chess.BLACK) or "none",
+                possible_moves=group_by_piece(board, possible_moves))
+
+
+class TokenStats:
+    """Count the prompts and their tokens for each encoding."""
+
+    def __init__(self) -> None:
+        """Start all the counts at zero."""
+        self.prompts: defaultdict[str, int] = defaultdict(int)
+        self.tokens: defaultdict[str, int] = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def add(self, encoding: str, prompt: str) -> int:
+        """Count a prompt and return its number of tokens."""
+        tokens = count_tokens(prompt)
+        with self.lock:
+            self.prompts[encoding] += 1
+            self.tokens[encoding] += tokens
+        return tokens
+
+    def __str__(self) -> str:
+        """Get the average prompt size of each encoding."""
+        with self.lock:
+            return ", ".join(f"{encoding}: {self.tokens[encoding] // self.prompts[encoding]} tokens/prompt "
+                             f"over {self.prompts[encoding]} prompts" for encoding in self.prompts) or "no prompts"
+
+
+token_stats = TokenStats()
@@ -3,7 +3,7 @@ chess_engine_prompt = """
 
             You are playing as {playing_as}. 
             
-            The current board state is represented as a sequence of UCI moves.
+            The current board state is represented as {board_format}.
 
             State of Board: {board_state}
 
@@ -30,8 +30,8 @@ chess_engine_prompt = """
             Your response should include the best move and a detailed rationale.
             respond in the following JSON format:
 
-            {{"rationale": "Detailed explantion of why this move is the best. This should be JSON pasrable text. Newlines should be escaped with double back slash followed by n.",
-            "best_move": "best move in UCI format"}}      
+            {{"best_move": "best move in UCI format",
+            "rationale": "Detailed explantion of why this move is the best. This should be JSON pasrable text. Newlines should be escaped with double back slash followed by n."}}      
 
         """
 
@@ -47,7 +47,7 @@ master1_template = """
 
             It is your turn to play. You are playing as {playing_as}.
 
-            The current board state is represented as a sequence of UCI moves.
+            The current board state is represented as {board_format}.
 
             State of Board:{board_state}
 
@@ -73,7 +73,7 @@ master2_template = """
 
             You are playing as {playing_as}. 
             
-            The current board state is represented as a sequence of UCI moves.
+            The current board state is represented as {board_format}.
 
             State of Board: {board_state}
 
@@ -101,7 +101,7 @@ master3_template = """
             You are a chess grand-master. You are helping another chess grand-master to play a chess game and win against an opponent.
             The grand-master you are helping is playing as {playing_as}.
 
-            The current board state is represented as a sequence of UCI moves.
+            The current board state is represented as {board_format}.
             State of Board:{board_state}
 
             These are all of the moves played so far:
@@ -122,8 +122,8 @@ master3_template = """
 
             You must return the best move as a JSON in UCI format like so:
             
-            {{"rationale": "Detailed explantion of why this move is the best. This should be JSON pasrable text. Newlines should be escaped with double back slash followed by n.",
-            "best_move": "best move in UCI format"}}     
+            {{"best_move": "best move in UCI format",
+            "rationale": "Detailed explantion of why this move is the best. This should be JSON pasrable text. Newlines should be escaped with double back slash followed by n."}}     
 
 """
 
@@ -134,7 +134,7 @@ proposer_moa_layer_n_template = """
 
     It is your turn to play. You are playing as {playing_as}.
 
-    The current board state is represented as a sequence of UCI moves.
+    The current board state is represented as {board_format}.
 
     State of Board: {board_state}
 
@@ -163,7 +163,7 @@ aggregator_moa_template = """
 
     It is your turn to play. You are playing as {playing_as}.
 
-    The current board state is represented as a sequence of UCI moves.
+    The current board state is represented as {board_format}.
 
     State of Board: {board_state}
 
@@ -180,7 +180,21 @@ aggregator_moa_template = """
 
     Provide your selected best move in the following JSON format:
     
-    {{"rationale": "Detailed explantion of why this move is the best. This should be JSON pasrable text. Newlines should be escaped with double back slash followed by n.",
-     "best_move": "best move in UCI format"}}     
+    {{"best_move": "best move in UCI format",
+     "rationale": "Detailed explantion of why this move is the best. This should be JSON pasrable text. Newlines should be escaped with double back slash followed by n."}}     
 
 """
+
+
+requery_template = """
+    You are a chess grand-master playing as {playing_as}. The position in FEN is: {fen}
+
+    You answered "{answer}", which is not a legal move in this position.
+
+    You must choose exactly one move from this list of legal moves, written in UCI format:
+    {legal_moves}
+
+    Return only the following JSON, do not prepend your response with anything:
+
+    {{"best_move": "one move copied from the list above"}}
+"""
@@ -45,6 +45,11 @@ class GameStream:
         self.board_queue = board_queue
         self.clock_queue = clock_queue
 
+    def iter_content(self, chunk_size: int = 1) -> Generator[bytes, None, None]:
+        """Send the game events to lichess-bot, one line at a time."""
+        for line in self.iter_lines():
+            yield line + b"\n"
+
     def iter_lines(self) -> Generator[bytes, None, None]:
         """Send the game events to lichess-bot."""
         yield json.dumps(
@@ -112,6 +117,11 @@ class EventStream:
         """
         self.sent_game = sent_game
 
+    def iter_content(self, chunk_size: int = 1) -> Generator[bytes, None, None]:
+        """Send the events to lichess-bot, one line at a time."""
+        for line in self.iter_lines():
+            yield line + b"\n"
+
     def iter_lines(self) -> Generator[bytes, None, None]:
         """Send the events to lichess-bot."""
         if self.sent_game:
@@ -0,0 +1,65 @@
+"""Test the local alpha-beta search and the LLM agents' fallback."""
+import time
+import chess
+import chess.engine
+import pytest
+import homemade
+from lib.config import Configuration
+from llm_agents.alphabeta import Searcher, MATE_SCORE
+
+
+def test_finds_mate_and_material() -> None:
+    """Test that the search finds a mate in one and wins a hanging queen."""
+    searcher = Searcher()
+    result = searcher.search(chess.Board("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1"), 1)
+    assert result.move == chess.Move.from_uci("a1a8")
+    assert result.score >= MATE_SCORE - 64
+    result = searcher.search(chess.Board("4k3/8/8/3q4/8/8/8/3RK3 w - - 0 1"), 0.2)
+    assert result.move == chess.Move.from_uci("d1d5")
+
+
+def test_time_bound_and_root_moves() -> None:
+    """Test that the search stops on time and only plays the allowed moves."""
+    board = chess.Board("r2q1rk1/pp2bppp/2n1bn2/2pp4/3P4/2NBPN2/PP1B1PPP/R2Q1RK1 w - - 0 10")
+    fen = board.fen()
+    start = time.monotonic()
+    result = Searcher().search(board, 0.05)
+    assert time.monotonic() - start < 0.5
+    assert result.depth >= 1
+    assert board.fen() == fen
+
+    root_moves = [chess.Move.from_uci("a2a3"), chess.Move.from_uci("h2h3")]
+    assert Searcher().search(board, 0.05, root_moves=root_moves).move in root_moves
+
+
+def test_alpha_beta_engine() -> None:
+    """Test that the homemade engine reports its search."""
+    engine = homemade.AlphaBetaEngine([], {}, None, Configuration({}))
+    board = chess.Board("4k3/8/8/3q4/8/8/8/3RK3 w - - 0 1")
+    result = engine.search(board, chess.engine.Limit(time=1.2), False, False, chess.engine.PlayResult(None, None))
+    assert result.move == chess.Move.from_uci("d1d5")
+    assert result.info["depth"] >= 1
+
+
+@pytest.mark.parametrize("answer", ["e7e5", "not a move", ValueError("Malformed JSON")])
+def test_agents_fall_back_to_a_legal_move(answer: object, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that an LLM error or an unplayable answer leads to a legal move instead of an exception."""
+    def agent(*args: object, **kwargs: object) -> object:
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    monkeypatch.setattr(homemade, "get_llm_best_move_claude", agent)
+    engine = homemade.SingleAgentLLM([], {"llm_move_cache": False}, None, Configuration({}))
+    board = chess.Board()
+    result = engine.search(board, chess.engine.Limit(time=60), False, False, chess.engine.PlayResult(None, None))
+    assert result.move is not None and result.move in board.legal_moves
+
+
+def test_prefilter() -> None:
+    """Test that the LLMs are only shown the best moves of the local search."""
+    engine = homemade.SingleAgentLLM([], {"llm_move_cache": False, "llm_prefilter_moves": 3}, None, Configuration({}))
+    board = chess.Board("4k3/8/8/3q4/8/8/8/3RK3 w - - 0 1")
+    shortlist = engine.shortlist(board, list(board.legal_moves))
+    assert len(shortlist) == 3
+    assert shortlist[0] == chess.Move.from_uci("d1d5")
@@ -0,0 +1,216 @@
+"""Test the game runner, which plays many games in one event loop."""
+import asyncio
+import importlib
+import json
+import threading
+import time
+import chess
+import chess.engine
+import pytest
+import requests
+from collections import defaultdict
+from collections.abc import AsyncGenerator
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+from requests.exceptions import HTTPError
+import homemade
+from lib import ipc, lichess
+from lib.async_stream import stream_lines
+from lib.config import Configuration
+from lib.timer import Timer
+from llm_agents.budget import latencies
+
+lichess_bot = importlib.import_module("lichess-bot")
+
+GAME_FULL = {"id": "zzzzzzzz", "variant": {"key": "standard", "name": "Standard", "short": "Std"},
+             "clock": {"initial": 60000, "increment": 2000}, "speed": "correspondence", "perf": {"name": "Correspondence"},
+             "rated": True, "createdAt": 1600000000000, "white": {"id": "bo", "name": "bo", "title": "BOT", "rating": 3000},
+             "black": {"id": "b", "name": "b", "title": "BOT", "rating": 3000}, "initialFen": "startpos",
+             "type": "gameFull", "state": {"type": "gameState", "moves": "", "wtime": 10000, "btime": 10000, "winc": 100,
+                                           "binc": 100, "status": "started"}}
+
+
+async def serve(response: bytes) -> tuple[asyncio.AbstractServer, str, list[bytes]]:
+    """Start a server that answers every request with `response`. Get the server, its url and the requests it got."""
+    requests_received = []
+
+    async def answer(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        requests_received.append(await reader.readuntil(b"\r\n\r\n"))
+        for index in range(0, len(response), 7):  # Send the response in pieces, to cut lines and chunks.
+            writer.write(response[index:index + 7])
+            await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(answer, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    return server, f"http://127.0.0.1:{port}/api/bot/game/stream/zzzzzzzz", requests_received
+
+
+def chunked(*chunks: bytes) -> bytes:
+    """Encode a chunked body."""
+    return b"".join(b"%x\r\n%s\r\n" % (len(chunk), chunk) for chunk in chunks) + b"0\r\n\r\n"
+
+
+def test_stream_lines() -> None:
+    """Test that the lines of a chunked stream are read whole, keep-alive lines included."""
+    async def read() -> tuple[list[bytes], list[bytes]]:
+        body = chunked(b'{"type": "gameFull"}\n{"ty', b'pe": "chatLine"}\n\n', b'{"type": "gameState"}\n')
+        server, url, received = await serve(b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n" + body)
+        async with server:
+            lines = [line async for line in stream_lines(url, {"Authorization": "Bearer token"}, timeout=5)]
+        return lines, received
+
+    lines, received = asyncio.run(read())
+    assert lines == [b'{"type": "gameFull"}', b'{"type": "chatLine"}', b"", b'{"type": "gameState"}']
+    assert received[0].startswith(b"GET /api/bot/game/stream/zzzzzzzz HTTP/1.1\r\n")
+    assert b"Authorization: Bearer token\r\n" in received[0]
+
+
+class StreamingLichess(lichess.Lichess):
+    """A `Lichess` that streams from a local server, without logging in."""
+
+    def __init__(self, url: str) -> None:
+        """:param url: The url of the server."""
+        self.baseUrl = url
+        self.header = {"Authorization": "Bearer token"}
+        self.rate_limit_timers: defaultdict[str, Timer] = defaultdict(Timer)
+
+
+def test_stream_errors_are_requests_errors() -> None:
+    """Test that the errors of the asyncio stream are the errors of `requests`, and that a 429 sets a rate limit."""
+    async def read() -> None:
+        server, url, _ = await serve(b"HTTP/1.1 429 Too Many Requests\r\nContent-Length: 0\r\n\r\n")
+        async with server:
+            li = StreamingLichess(url.split("/api")[0])
+            with pytest.raises(HTTPError) as error:
+                async for _ in li.game_stream_lines("zzzzzzzz"):
+                    pass
+            assert error.value.response is not None and error.value.response.status_code == 429
+            assert li.is_rate_limited(lichess.ENDPOINTS["stream"])
+
+        server, url, _ = await serve(b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\nnot a size\r\n")
+        async with server:
+            with pytest.raises(requests.exceptions.ConnectionError):
+                async for _ in StreamingLichess(url.split("/api")[0]).game_stream_lines("zzzzzzzz"):
+                    pass
+
+    asyncio.run(read())
+
+
+class FakeLichess:
+    """Streams the same game for every game id."""
+
+    baseUrl = "https://lichess.org/"
+
+    def __init__(self, updates: int) -> None:
+        """:param updates: The number of game states after the first one."""
+        self.updates = updates
+
+    async def game_stream_lines(self, game_id: str) -> AsyncGenerator[bytes, None]:
+        """Stream a game."""
+        yield json.dumps({**GAME_FULL, "id": game_id}).encode()
+        for _ in range(self.updates):
+            await asyncio.sleep(0.01)
+            yield b""
+            yield json.dumps(GAME_FULL["state"]).encode()
+
+
+class SlowSession:
+    """A game session whose engine takes a while to play a move, and which records the threads it was called in."""
+
+    threads: set[str] = set()
+
+    def __init__(self, li: Any, config: Configuration, game: Any, challenger_names: ipc.ChallengerNames) -> None:
+        """Start a game."""
+        self.updates = 0
+        self.is_correspondence = False
+        self.game = game
+
+    def playing(self) -> bool:
+        """Play until the end of the stream."""
+        return self.updates >= 0
+
+    def update(self, upd: dict[str, Any]) -> None:
+        """Think for a while on each game state."""
+        SlowSession.threads.add(threading.current_thread().name)
+        if upd:
+            time.sleep(0.1)
+
+    def stream_error(self, error: BaseException) -> None:
+        """Stop at the end of the stream."""
+        self.updates = -1
+
+    def game_record(self) -> str:
+        """Get the PGN."""
+        return f"PGN of {self.game.id}"
+
+    def close(self, error: Optional[BaseException] = None) -> None:
+        """Quit the engine."""
+
+
+def test_games_share_the_event_loop(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the games of the runner are played at the same time, in the threads of the runner, and then reported."""
+    monkeypatch.setattr(lichess_bot, "GameSession", SlowSession)
+    queues = ipc.create_queues()
+    games = 40
+    for index in range(games):
+        queues.game_runner_queue.put(f"game{index}")
+    queues.game_runner_queue.put(None)
+    config = Configuration({"async_games": {"enabled": True, "threads": games}, "abort_time": 20})
+
+    start = time.perf_counter()
+    asyncio.run(lichess_bot.run_async_games(FakeLichess(updates=2), {"username": "bo"}, config, queues))
+    elapsed = time.perf_counter() - start
+
+    # Each game thinks 3 times for 0.1 seconds: about 0.3 seconds in all, instead of 12 seconds one game after another.
+    assert elapsed < 3
+    assert len(SlowSession.threads) > 1 and all(name.startswith("game") for name in SlowSession.threads)
+    events = [queues.control_queue.get() for _ in range(games)]
+    assert sorted(event["game"]["id"] for event in events) == sorted(f"game{index}" for index in range(games))
+    assert all(event["game"]["pgn"] == f"PGN of {event['game']['id']}" for event in events)
+
+
+def test_only_homemade_engines_use_the_runner() -> None:
+    """Test that the games of UCI and XBoard engines stay in the process pool."""
+    for protocol, enabled, expected in (("homemade", True, True), ("uci", True, False), ("homemade", False, False)):
+        config = Configuration({"async_games": {"enabled": enabled}, "engine": {"protocol": protocol}})
+        assert lichess_bot.async_games_enabled(config) == expected
+
+
+def test_mixture_of_agents_games_do_not_share_proposers(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the proposers of one game don't wait for the proposers of the other games played by the runner."""
+    def proposer(**kwargs: object) -> str:
+        time.sleep(0.3)
+        return "PROPOSAL: e2e4"
+
+    proposals: list[int] = []
+
+    def aggregator(prompt: str, *args: object, **kwargs: object) -> str:
+        proposals.append(prompt.count("PROPOSAL: e2e4"))
+        return "e2e4"
+
+    monkeypatch.setattr(homemade, "get_llm_response_openai", proposer)
+    monkeypatch.setattr(homemade, "get_llm_best_move_claude", aggregator)
+    monkeypatch.setattr(latencies, "averages", {"gpt-4o": 0.3, "claude-3-5-sonnet-20240620": 0.1})
+    games = 8
+    engines = [homemade.LLMMixtureofAgents([], {"llm_move_cache": False, "llm_ponder_moves": 0}, None, Configuration({}))
+               for _ in range(games)]
+
+    async def play() -> list[chess.engine.PlayResult]:
+        with ThreadPoolExecutor(games, thread_name_prefix="game") as executor:
+            results: list[chess.engine.PlayResult] = await asyncio.gather(*(
+                lichess_bot.run_in_game_thread(executor, engine.search, chess.Board(), chess.engine.Limit(time=3), False,
+                                               False, chess.engine.PlayResult(None, None))
+                for engine in engines))
+            return results
+
+    try:
+        results = asyncio.run(play())
+    finally:
+        for engine in engines:
+            engine.quit()
+
+    # Two layers of three proposers fit in the budget of each game. With one pool for all the games, most of the 48 calls
+    # would wait for a thread until after the deadline, and some games would fall back to a local search.
+    assert all(result.move == chess.Move.from_uci("e2e4") for result in results)
+    assert proposals == [3] * games
@@ -0,0 +1,81 @@
+"""Test the opening books that stay open for the whole process."""
+import random
+import chess
+import chess.polyglot
+import pytest
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Optional, cast
+from lib import engine_wrapper, model
+from lib.book import BookManager, IndexedReader, encode_move, write_book
+from lib.config import Configuration
+
+LINES = [["e2e4", "e7e5", "g1f3", "b8c6", "f1c4", "g8f6", "e1g1"],
+         ["e2e4", "c7c5", "g1f3", "d7d6"],
+         ["d2d4", "g8f6", "c2c4", "e7e6"]]
+
+
+def make_book(path: Path, lines: list[list[str]], filler: int = 0) -> None:
+    """Write a book with the positions of `lines` and `filler` entries of random positions."""
+    entries: list[tuple[int, int, int, Optional[int]]] = []
+    for line in lines:
+        board = chess.Board()
+        for weight, uci in enumerate(line, start=1):
+            move = chess.Move.from_uci(uci)
+            entries.append((chess.polyglot.zobrist_hash(board), encode_move(board, move), weight, 0))
+            board.push(move)
+    generator = random.Random(0)
+    entries.extend((generator.getrandbits(64), generator.getrandbits(12), 1, None) for _ in range(filler))
+    write_book(str(path), entries)
+
+
+def test_indexed_reader_matches_python_chess(tmp_path: Path) -> None:
+    """Test that the lookups find the same entries as the reader of python-chess, castling included."""
+    path = tmp_path / "book.bin"
+    make_book(path, LINES, filler=1000)
+    reader = IndexedReader(str(path))
+    with chess.polyglot.open_reader(path) as expected:
+        board = chess.Board()
+        for uci in LINES[0]:
+            assert list(reader.find_all(board)) == list(expected.find_all(board))
+            board.push_uci(uci)
+        assert {entry.move.uci() for entry in reader.find_all(chess.Board())} == {"d2d4", "e2e4"}
+    castling_position = chess.Board("r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4")
+    assert reader.find(castling_position).move == chess.Move.from_uci("e1g1")
+    assert reader.get(chess.Board("8/8/8/8/8/8/k7/7K w - - 0 1")) is None
+    reader.close()
+
+    empty = tmp_path / "empty.bin"
+    write_book(str(empty), [])
+    assert IndexedReader(str(empty)).get(chess.Board()) is None
+
+
+def test_books_are_opened_once(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that get_book_move opens each book once and still tries the books in order."""
+    first = tmp_path / "first.bin"
+    second = tmp_path / "second.bin"
+    make_book(first, LINES[2:])
+    make_book(second, LINES[:1])
+    manager = BookManager()
+    opened: list[str] = []
+    open_book = manager.book
+
+    def book(path: str) -> IndexedReader:
+        opened.append(path)
+        return open_book(path)
+
+    monkeypatch.setattr(manager, "book", book)
+    monkeypatch.setattr(engine_wrapper, "book_manager", manager)
+
+    config = Configuration({"enabled": True, "book": {"standard": [str(first), str(second)]}, "min_weight": 1,
+                            "selection": "best_move", "max_depth": 20})
+    game = cast(model.Game, SimpleNamespace(id="abcdefgh"))
+    board = chess.Board()
+    assert engine_wrapper.get_book_move(board, game, config).move == chess.Move.from_uci("d2d4")
+    board.push_uci("e2e4")
+    assert engine_wrapper.get_book_move(board, game, config).move == chess.Move.from_uci("e7e5")
+    board.push_uci("d7d5")
+    assert engine_wrapper.get_book_move(board, game, config).move is None
+    assert len(manager.books) == 2
+    manager.close()
+    assert not manager.books
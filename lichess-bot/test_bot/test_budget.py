@@ -0,0 +1,83 @@
+"""Test the time budget of the LLM agents."""
+import time
+import chess
+import chess.engine
+import pytest
+import requests
+import homemade
+from lib.config import Configuration
+from llm_agents.budget import MoveBudget, time_for_move, plan_layers, latencies
+from llm_agents.executor import ProposerExecutor
+
+
+def test_time_for_move() -> None:
+    """Test how the game clock is turned into a time for the move."""
+    board = chess.Board()
+    assert time_for_move(chess.engine.Limit(time=10), board) == 9
+    clock_limit = chess.engine.Limit(white_clock=60, black_clock=30, white_inc=2, black_inc=0)
+    assert time_for_move(clock_limit, board) == pytest.approx(60 / 20 + 2 - 1)
+    board.push_uci("e2e4")
+    assert time_for_move(clock_limit, board) == pytest.approx(30 / 20 - 1)
+    assert time_for_move(chess.engine.Limit(white_clock=1, black_clock=1), board) == 0
+    assert time_for_move(chess.engine.Limit(), board) == float("inf")
+
+
+def test_plan_layers() -> None:
+    """Test that fewer layers and proposers are used when the time is short."""
+    def plan(seconds: float) -> tuple[int, int]:
+        return plan_layers(MoveBudget(chess.engine.Limit(time=seconds + 1), chess.Board()), 5, 5, 2, 3)
+
+    assert plan(60) == (2, 3)
+    assert plan(16) == (2, 2)
+    assert plan(14) == (1, 3)
+    assert plan(6) == (0, 0)
+    assert plan_layers(MoveBudget(chess.engine.Limit(), chess.Board()), 5, 5, 2, 3) == (2, 3)
+
+
+def test_gather_until() -> None:
+    """Test that the proposers that miss the deadline are dropped."""
+    def slow() -> str:
+        time.sleep(0.5)
+        return "slow"
+
+    def failing() -> str:
+        raise ValueError("bad answer")
+
+    executor = ProposerExecutor(max_workers=3)
+    start = time.monotonic()
+    assert executor.gather_until([lambda: "fast", slow, failing], time.monotonic() + 0.1) == ["fast"]
+    assert time.monotonic() - start < 0.4
+    executor.shutdown()
+
+
+def test_mixture_of_agents_falls_back_at_the_deadline(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the most suggested move is played when the aggregator times out."""
+    def proposer(**kwargs: object) -> str:
+        time.sleep(0.3)
+        return "I suggest d2d4 or maybe c2c4. d2d4 is best."
+
+    def aggregator(*args: object, **kwargs: object) -> str:
+        raise requests.exceptions.ReadTimeout()
+
+    monkeypatch.setattr(homemade, "get_llm_response_openai", proposer)
+    monkeypatch.setattr(homemade, "get_llm_best_move_claude", aggregator)
+    monkeypatch.setattr(latencies, "averages", {"gpt-4o": 0.2, "claude-3-5-sonnet-20240620": 1.0})
+
+    engine = homemade.LLMMixtureofAgents([], {"llm_move_cache": False}, None, Configuration({}))
+    start = time.monotonic()
+    result = engine.search(chess.Board(), chess.engine.Limit(time=2.5), False, False, chess.engine.PlayResult(None, None))
+    assert result.move == chess.Move.from_uci("d2d4")
+    assert time.monotonic() - start < 1.5
+
+
+def test_single_agent_plays_local_move_without_time(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the LLM is not called when there isn't enough time for an answer."""
+    def agent(*args: object, **kwargs: object) -> str:
+        raise AssertionError("The LLM should not be called.")
+
+    monkeypatch.setattr(homemade, "get_llm_best_move_claude", agent)
+    engine = homemade.SingleAgentLLM([], {"llm_move_cache": False}, None, Configuration({}))
+    board = chess.Board("4k3/8/8/3q4/8/8/8/3RK3 w - - 0 1")
+    result = engine.search(board, chess.engine.Limit(white_clock=2, black_clock=2), False, False,
+                           chess.engine.PlayResult(None, None))
+    assert result.move == chess.Move.from_uci("d1d5")
@@ -0,0 +1,108 @@
+"""Test the opening book builder."""
+import chess
+import chess.polyglot
+import pytest
+from pathlib import Path
+from tools import build_book
+from tools.build_book import BuildOptions
+
+GAMES = """[Event "Rated blitz game"]
+[White "Bot"]
+[Black "Alice"]
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 Nc6 3. Bc4 Nf6 4. O-O Be7 (4... Bc5 5. d3) 5. d3 1-0
+
+[Event "Rated blitz game"]
+[White "Bot"]
+[Black "Bob"]
+[Result "0-1"]
+
+1. e4 c5 2. Nf3 d6 0-1
+
+[Event "Rated blitz game"]
+[White "Carol"]
+[Black "bot"]
+[Result "1/2-1/2"]
+
+1. d4 d5 2. c4 e6 1/2-1/2
+
+[Event "Rated blitz game"]
+[White "Bot"]
+[Black "Dave"]
+[Result "*"]
+
+1. c4 e5 *
+
+[Event "Rated atomic game"]
+[Variant "Atomic"]
+[White "Bot"]
+[Black "Erin"]
+[Result "1-0"]
+
+1. Nf3 d5 1-0
+
+"""
+
+
+def entries(path: Path, moves: str = "") -> dict[str, int]:
+    """Get the weight of each move of the book in the position after `moves`."""
+    board = chess.Board()
+    for san in moves.split():
+        board.push_san(san)
+    with chess.polyglot.open_reader(path) as reader:
+        return {board.san(entry.move): entry.weight for entry in reader.find_all(board)}
+
+
+@pytest.fixture
+def pgn_directory(tmp_path: Path) -> Path:
+    """Write the games to a directory, with one of them in its own file."""
+    directory = tmp_path / "game_records"
+    directory.mkdir()
+    first_game, other_games = GAMES.split("\n\n[Event", 1)
+    (directory / "first.pgn").write_text(first_game + "\n\n")
+    (directory / "others.pgn").write_text("[Event" + other_games)
+    return directory
+
+
+def test_weights(tmp_path: Path, pgn_directory: Path) -> None:
+    """Test that the moves are weighted by their results, and that unfinished games and other variants are skipped."""
+    book = tmp_path / "book.bin"
+    games, count = build_book.build_book(str(book), [str(pgn_directory)], BuildOptions(max_plies=8))
+    assert games == 3
+    assert entries(book) == {"e4": 2, "d4": 1}
+    assert entries(book, "e4") == {"c5": 2}
+    assert entries(book, "e4 e5 Nf3 Nc6 Bc4 Nf6") == {"O-O": 2}
+    assert entries(book, "e4 e5 Nf3 Nc6 Bc4 Nf6 O-O") == {}  # The loser's moves and the sidelines are not in the book.
+    assert entries(book, "d4 d5") == {"c4": 1}
+    assert count == 10
+
+
+def test_player_and_plies(tmp_path: Path, pgn_directory: Path) -> None:
+    """Test that only the moves of the chosen player and of the first plies are counted."""
+    book = tmp_path / "book.bin"
+    games, _ = build_book.build_book(str(book), [str(pgn_directory)], BuildOptions(max_plies=3, players=frozenset({"bot"})))
+    assert games == 3
+    assert entries(book) == {"e4": 2}
+    assert entries(book, "e4 e5") == {"Nf3": 2}
+    assert entries(book, "d4") == {"d5": 1}
+    assert entries(book, "d4 d5") == {}
+    assert entries(book, "e4 e5 Nf3 Nc6") == {}
+
+
+def test_chunks_and_spills_give_the_same_book(tmp_path: Path, pgn_directory: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that cutting the files into chunks, spilling every game and merging in several rounds change nothing."""
+    expected = tmp_path / "expected.bin"
+    build_book.build_book(str(expected), [str(pgn_directory)], BuildOptions())
+    chunks = [chunk for task in build_book.plan_chunks([str(pgn_directory)], 50) for chunk in task]
+    assert len(chunks) == 5
+    for path, start, end in chunks:
+        with open(path, "rb") as pgn:
+            pgn.seek(start)
+            assert pgn.read(end - start).startswith(b"[Event ")
+
+    monkeypatch.setattr(build_book, "MAX_OPEN_RUNS", 2)
+    book = tmp_path / "book.bin"
+    assert build_book.build_book(str(book), [str(pgn_directory)], BuildOptions(max_positions=1), processes=2,
+                                 chunk_size=50) == (3, 11)
+    assert book.read_bytes() == expected.read_bytes()
@@ -0,0 +1,126 @@
+"""Test that the main loop hands its HTTP requests and disk writes to worker threads, and measures its dispatch time."""
+import importlib
+import threading
+import time
+import pytest
+import yaml
+from typing import Any
+from lib import ipc
+from lib.config import Configuration, insert_default_values
+from lib.dispatcher import DispatchStats, LatencyHistogram, SideTasks
+from lib.types import EventType, GameType
+
+lichess_bot = importlib.import_module("lichess-bot")
+
+
+def test_latency_histogram() -> None:
+    """Test that the quantiles are the upper bounds of the buckets, and never more than the longest time."""
+    histogram = LatencyHistogram()
+    for seconds in [0.0005] * 98 + [0.3, 30.0]:
+        histogram.record(seconds)
+    assert histogram.count == 100
+    assert histogram.quantile(0.5) == 0.001
+    assert histogram.quantile(0.99) == 0.5
+    assert histogram.quantile(1.0) == 30.0
+    assert "100 times" in histogram.summary()
+
+
+def test_side_tasks() -> None:
+    """Test that a task isn't submitted twice while it runs, that the disk tasks run in order and that errors are logged."""
+    stats = DispatchStats()
+    side_tasks = SideTasks(stats)
+    release = threading.Event()
+    calls: list[int] = []
+
+    def slow_task(number: int) -> None:
+        release.wait(10)
+        calls.append(number)
+
+    def failing_task() -> None:
+        raise OSError("The disk is full.")
+
+    side_tasks.submit_once("check", "http", slow_task, 1)
+    side_tasks.submit_once("check", "http", slow_task, 2)
+    for number in range(3, 8):
+        side_tasks.submit("disk", calls.append, number)
+    side_tasks.submit("disk", failing_task)
+    side_tasks.close()
+    assert calls == [3, 4, 5, 6, 7]
+    release.set()
+    side_tasks.running["check"].result(timeout=10)
+    assert calls == [3, 4, 5, 6, 7, 1]
+    assert stats.histograms["task:failing_task"].count == 1
+
+
+class SlowLichess:
+    """A lichess.org that takes a while to answer the requests about challenges."""
+
+    baseUrl = "https://lichess.org/"
+
+    def __init__(self) -> None:
+        """Start with no accepted or declined challenges. `answered` is released after each answer."""
+        self.accepted: list[str] = []
+        self.declined: list[tuple[str, str]] = []
+        self.answered = threading.Semaphore(0)
+
+    def get_ongoing_games(self) -> list[GameType]:
+        """Play no games."""
+        return []
+
+    def accept_challenge(self, challenge_id: str) -> None:
+        """Accept a challenge after a while."""
+        time.sleep(0.5)
+        self.accepted.append(challenge_id)
+        self.answered.release()
+
+    def decline_challenge(self, challenge_id: str, reason: str = "generic") -> None:
+        """Decline a challenge after a while."""
+        time.sleep(0.5)
+        self.declined.append((challenge_id, reason))
+        self.answered.release()
+
+
+def challenge_event(challenge_id: str, variant: str) -> EventType:
+    """Make a blitz challenge from a human."""
+    return {"type": "challenge", "challenge": {
+        "id": challenge_id, "rated": False, "variant": {"key": variant}, "perf": {"name": "Blitz"}, "speed": "blitz",
+        "timeControl": {"type": "clock", "limit": 180, "increment": 2}, "color": "random", "finalColor": "white",
+        "challenger": {"name": "Human", "rating": 1500}, "destUser": {"name": "bo", "title": "BOT"}}}
+
+
+def test_events_do_not_wait_for_the_requests(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the challenges are accepted and declined without holding up the main loop."""
+    with open("config.yml.default") as config_file:
+        raw_config = yaml.safe_load(config_file)
+    insert_default_values(raw_config)
+    config = Configuration(raw_config)
+    dispatch_stats: list[DispatchStats] = []
+
+    def record_stats() -> DispatchStats:
+        dispatch_stats.append(DispatchStats())
+        return dispatch_stats[-1]
+
+    monkeypatch.setattr(lichess_bot, "DispatchStats", record_stats)
+    queues = ipc.create_queues()
+    ipc.share_queues(queues)
+    li = SlowLichess()
+    events: list[Any] = [challenge_event("accepted", "standard"), challenge_event("declined", "horde"),
+                         {"type": "ping"}, {"type": "ping"}, {"type": "terminated", "error": None}]
+    for event in events:
+        queues.control_queue.put(event)
+
+    monkeypatch.setattr(lichess_bot, "restart", False)
+    try:
+        start = time.perf_counter()
+        lichess_bot.lichess_bot_main(li, {"username": "bo", "id": "bo"}, config, [], queues, one_game=False)
+        elapsed = time.perf_counter() - start
+    finally:
+        ipc.share_queues(None)  # type: ignore[arg-type]
+
+    histograms = dispatch_stats[0].histograms
+    assert histograms["challenge"].count == 2 and histograms["ping"].count == 2
+    assert histograms["challenge"].longest < 0.25
+    assert elapsed < 3
+    assert li.answered.acquire(timeout=10) and li.answered.acquire(timeout=10)
+    assert li.accepted == ["accepted"]
+    assert li.declined == [("declined", "variant")]
@@ -0,0 +1,87 @@
+"""Test the pool that keeps the engines of finished games for the next games."""
+import chess.engine
+from typing import Any, cast
+from lib.engine_pool import EnginePool
+
+
+class FakeEngine:
+    """An engine that counts the calls made to it."""
+
+    def __init__(self, alive: bool = True) -> None:
+        """:param alive: Whether the engine answers."""
+        self.alive = alive
+        self.pings = 0
+        self.quit_called = False
+        self.closed = False
+
+    def ping(self) -> None:
+        """Answer, or fail like an engine that died."""
+        self.pings += 1
+        if not self.alive:
+            raise chess.engine.EngineTerminatedError("The engine died.")
+
+    def quit(self) -> None:
+        """Quit the engine."""
+        self.quit_called = True
+
+    def close(self) -> None:
+        """Close the engine."""
+        self.closed = True
+
+
+def starter(started: list[FakeEngine]) -> Any:
+    """Get a function that starts a new fake engine and records it."""
+    def start() -> chess.engine.SimpleEngine:
+        started.append(FakeEngine())
+        return cast(chess.engine.SimpleEngine, started[-1])
+    return start
+
+
+def test_engines_are_reused_by_key() -> None:
+    """Test that a released engine is given to the next game with the same key, and only to it."""
+    pool = EnginePool()
+    started: list[FakeEngine] = []
+    engine = pool.lease("stockfish", starter(started))
+    pool.release("stockfish", engine, max_idle=1)
+    assert cast(Any, pool.lease("leela", starter(started))) is started[1]
+    assert pool.lease("stockfish", starter(started)) is engine
+    assert len(started) == 2
+    assert not started[0].quit_called
+    assert (pool.stats.starts, pool.stats.reuses, pool.stats.leases) == (2, 1, 3)
+    assert "2 started, 1 reused, 0 discarded" in pool.stats.summary()
+
+
+def test_max_idle() -> None:
+    """Test that the engines that don't fit in the pool are quit, and that `close` quits the idle ones."""
+    pool = EnginePool()
+    started: list[FakeEngine] = []
+    engines = [pool.lease("stockfish", starter(started)) for _ in range(3)]
+    for engine in engines:
+        pool.release("stockfish", engine, max_idle=2)
+    assert [engine.quit_called for engine in started] == [False, False, True]
+    assert all(engine.closed for engine in started[2:])
+
+    pool.close()
+    assert all(engine.quit_called and engine.closed for engine in started)
+    pool.lease("stockfish", starter(started))
+    assert len(started) == 4
+
+    pool.release("stockfish", cast(chess.engine.SimpleEngine, started[3]), max_idle=0)
+    assert started[3].quit_called
+
+
+def test_dead_engines_are_discarded() -> None:
+    """Test that an engine that doesn't answer is closed instead of being kept or reused."""
+    pool = EnginePool()
+    started: list[FakeEngine] = []
+    dead = FakeEngine(alive=False)
+    pool.release("stockfish", cast(chess.engine.SimpleEngine, dead), max_idle=1)
+    assert dead.closed and pool.stats.discarded == 1
+
+    engine = pool.lease("stockfish", starter(started))
+    pool.release("stockfish", engine, max_idle=1)
+    started[0].alive = False
+    new_engine: Any = pool.lease("stockfish", starter(started))
+    assert new_engine is started[1]
+    assert started[0].closed
+    assert (pool.stats.starts, pool.stats.reuses, pool.stats.discarded) == (2, 0, 2)
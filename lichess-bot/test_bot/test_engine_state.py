@@ -0,0 +1,44 @@
+"""Test that homemade engines see the state of their own game."""
+import datetime
+import chess
+import chess.engine
+from lib.config import Configuration
+from lib.engine_wrapper import MinimalEngine
+from lib.model import Game
+from lib.types import GameEventType, MOVE
+
+
+class StateEngine(MinimalEngine):
+    """Play the first move and remember the game state seen during the search."""
+
+    def search(self, board: chess.Board, time_limit: chess.engine.Limit, ponder: bool, draw_offered: bool,
+               root_moves: MOVE) -> chess.engine.PlayResult:
+        """Record the game state."""
+        self.seen_moves = self.game_state().get("moves")
+        return chess.engine.PlayResult(next(iter(board.legal_moves)), None)
+
+
+def make_game(game_id: str) -> Game:
+    """Create a game in the starting position."""
+    game_info: GameEventType = {"id": game_id, "variant": {"name": "Standard"}, "createdAt": 0,
+                                "white": {"name": "bo"}, "black": {"name": "opponent"},
+                                "state": {"type": "gameState", "moves": "", "wtime": 60000, "btime": 60000,
+                                          "winc": 0, "binc": 0, "status": "started"}}
+    return Game(game_info, "bo", "https://lichess.org/", datetime.timedelta(seconds=20))
+
+
+def test_engines_follow_their_game() -> None:
+    """Test that state updates reach the engine of the same game and no other."""
+    game_1 = make_game("game1")
+    game_2 = make_game("game2")
+    engine_1 = StateEngine([], {}, None, Configuration({}), game_1)
+    engine_2 = StateEngine([], {}, None, Configuration({}), game_2)
+
+    game_1.state = {**game_1.state, "moves": "e2e4 e7e5"}
+    game_2.state = {**game_2.state, "moves": "d2d4"}
+    engine_1.search(chess.Board(), chess.engine.Limit(), False, False, [])
+    engine_2.search(chess.Board(), chess.engine.Limit(), False, False, [])
+    assert engine_1.seen_moves == "e2e4 e7e5"
+    assert engine_2.seen_moves == "d2d4"
+
+    assert StateEngine([], {}, None, Configuration({})).game_state() == {}
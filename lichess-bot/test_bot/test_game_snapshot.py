@@ -0,0 +1,41 @@
+"""Test the snapshot of the game state that the next game state is compared with."""
+import chess
+import datetime
+import importlib
+from lib import model
+from lib.types import GameStateType
+
+lichess_bot = importlib.import_module("lichess-bot")
+
+
+def make_game(moves: str) -> model.Game:
+    """Make a game played by the bot with white."""
+    state: GameStateType = {"type": "gameState", "moves": moves, "wtime": 10000, "btime": 10000, "winc": 100, "binc": 100,
+                            "status": "started"}
+    return model.Game({"id": "zzzzzzzz", "variant": {"key": "standard", "name": "Standard", "short": "Std"},
+                       "clock": {"initial": 60000, "increment": 2000}, "speed": "bullet", "perf": {"name": "Bullet"},
+                       "rated": True, "createdAt": 1600000000000,
+                       "white": {"id": "bo", "name": "bo", "title": "BOT", "rating": 3000},
+                       "black": {"id": "b", "name": "b", "title": "BOT", "rating": 3000}, "initialFen": "startpos",
+                       "type": "gameFull", "state": state}, "bo", "https://lichess.org/", datetime.timedelta(seconds=20))
+
+
+def test_snapshot_is_compared_with_the_next_state() -> None:
+    """Test that the engine moves when the moves changed, and not when another field of the game state changed."""
+    game = make_game("e2e4 e7e5")
+    board = chess.Board()
+    board.push_uci("e2e4")
+    board.push_uci("e7e5")
+    assert lichess_bot.is_engine_move(game, None, board)
+
+    prior_game = game.snapshot()
+    game.state = {**game.state, "wdraw": True}  # A draw offer repeats the moves.
+    assert prior_game.moves == "e2e4 e7e5"
+    assert not lichess_bot.game_changed(game, prior_game)
+    assert not lichess_bot.is_engine_move(game, prior_game, board)
+
+    game.state = {**game.state, "moves": "e2e4 e7e5 g1f3 b8c6"}
+    board.push_uci("g1f3")
+    board.push_uci("b8c6")
+    assert lichess_bot.is_engine_move(game, prior_game, board)
+    assert game.snapshot() == ("e2e4 e7e5 g1f3 b8c6",)
@@ -0,0 +1,48 @@
+"""Test the queues shared by the processes of lichess-bot."""
+from multiprocessing import Pool
+from types import SimpleNamespace
+from typing import Any
+from lib import ipc
+from lib.ipc import ChallengerNames
+
+
+def challenges(*names: str) -> list[Any]:
+    """Make challenges with these challengers."""
+    return [SimpleNamespace(challenger=SimpleNamespace(name=name)) for name in names]
+
+
+def game_process_work(game_id: str) -> list[str]:
+    """Do what a game process does: read the challenge queue and tell the main process that the game is over."""
+    queues = ipc.process_queues()
+    queues.control_queue.put({"type": "local_game_done", "game": {"id": game_id}})
+    queues.logging_queue.put(None)
+    return queues.challenger_names.names()
+
+
+def test_challenger_names() -> None:
+    """Test that the names are read in the order of the queue, and that the names that don't fit are left out."""
+    names = ChallengerNames(size=16)
+    assert names.names() == []
+    names.publish(challenges("Alice", "Bob"))
+    assert names.names() == ["Alice", "Bob"]
+    names.publish(challenges("Alice", "Bob", "Carol", "Dave"))
+    assert names.names() == ["Alice", "Bob", "Carol"]
+    names.publish([])
+    assert names.names() == []
+
+
+def test_queues_are_shared_with_the_game_processes() -> None:
+    """Test that the game processes get the queues from the initializer of the pool."""
+    queues = ipc.create_queues()
+    ipc.share_queues(queues)
+    try:
+        queues.challenger_names.publish(challenges("Alice", "Bob"))
+        with Pool(2, initializer=ipc.share_queues, initargs=(queues,)) as pool:
+            results = [pool.apply_async(game_process_work, (game_id,)) for game_id in ("game1", "game2")]
+            assert [result.get(timeout=10) for result in results] == [["Alice", "Bob"], ["Alice", "Bob"]]
+        events = [queues.control_queue.get(), queues.control_queue.get()]
+        assert sorted(event["game"]["id"] for event in events) == ["game1", "game2"]
+        assert queues.control_queue.empty()
+        assert queues.logging_queue.get(timeout=10) is None
+    finally:
+        ipc.share_queues(None)  # type: ignore[arg-type]
@@ -0,0 +1,161 @@
+"""Test the LLM client against a local stub server."""
+import asyncio
+import json
+import threading
+import time
+import chess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections.abc import Callable, Generator
+from typing import Any
+import pytest
+from llm_agents.client import LLMClient, AsyncLLMClient
+from llm_agents.executor import ProposerExecutor
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    """Answer every request like an OpenAI or Anthropic endpoint would."""
+
+    protocol_version = "HTTP/1.1"
+    answer = '{"best_move": "e2e4"}'
+
+    def do_POST(self) -> None:
+        """Record the request and send a canned answer."""
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server: Any = self.server
+        server.requests.append((self.path, self.client_address[1], dict(self.headers), body))
+        if body.get("stream"):
+            self.stream_answer()
+            return
+        response: dict[str, Any]
+        if self.path == "/anthropic":
+            response = {"content": [{"type": "text", "text": self.answer}]}
+        else:
+            response = {"choices": [{"message": {"role": "assistant", "content": self.answer}}]}
+        data = json.dumps(response).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def stream_answer(self) -> None:
+        """Send the answer as an Anthropic event stream. The rationale arrives a while after the move."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        # e7e8 is not legal, so the client has to wait for the second best_move.
+        texts = ['{"best_', 'move": "e7', 'e8"', ', "best_move": "e2', 'e4", "ration', 'ale": "', "Control the center.", '"}']
+        for text in texts:
+            if text == "Control the center.":
+                time.sleep(0.5)
+            event = {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": text}}
+            self.write_chunk(b"event: content_block_delta\ndata: " + json.dumps(event).encode() + b"\n\n")
+        self.write_chunk(b'event: message_stop\ndata: {"type": "message_stop"}\n\n')
+        self.write_chunk(b"")
+
+    def write_chunk(self, data: bytes) -> None:
+        """Send one chunk of a chunked response."""
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, *args: Any) -> None:
+        """Keep the test output quiet."""
+
+
+@pytest.fixture
+def stub_server() -> Generator[Any, None, None]:
+    """Run the stub server on a free local port."""
+    server: Any = ThreadingHTTPServer(("127.0.0.1", 0), StubLLMHandler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_client(server: Any) -> LLMClient:
+    """Create a client that sends every provider's requests to the stub server."""
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    return LLMClient(endpoints={"openai": f"{base}/openai", "groq": f"{base}/groq", "claude": f"{base}/anthropic"})
+
+
+def test_connections_are_reused(stub_server: Any) -> None:
+    """Test that consecutive requests to a provider use the same keep-alive connection."""
+    client = make_client(stub_server)
+    for _ in range(3):
+        assert client.complete("openai", "prompt", model="gpt-4o") == '{"best_move": "e2e4"}'
+    client.close()
+    client_ports = {port for _, port, _, _ in stub_server.requests}
+    assert len(stub_server.requests) == 3
+    assert len(client_ports) == 1
+
+
+def test_providers(stub_server: Any, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test the request format and response parsing of each provider."""
+    monkeypatch.setenv("OPENAI_API_KEY", "openai-key")
+    monkeypatch.setenv("CLAUD_API_KEY", "claude-key")
+    client = make_client(stub_server)
+
+    assert client.complete("openai", "prompt", model="gpt-4o", json_mode=True) == {"best_move": "e2e4"}
+    path, _, headers, body = stub_server.requests[-1]
+    assert path == "/openai"
+    assert headers["Authorization"] == "Bearer openai-key"
+    assert body["response_format"] == {"type": "json_object"}
+    assert body["messages"][0] == {"role": "system", "content": "prompt"}
+
+    assert client.complete("claude", "prompt", model="claude-3", json_mode=True) == {"best_move": "e2e4"}
+    path, _, headers, body = stub_server.requests[-1]
+    assert path == "/anthropic"
+    assert headers["x-api-key"] == "claude-key"
+    assert body["max_tokens"] == 2024
+    assert body["messages"][0]["content"].endswith("do not prepend your response with anything.")
+
+    assert client.complete("claude", "prompt", model="claude-3") == '{"best_move": "e2e4"}'
+    client.close()
+
+
+def test_streaming_returns_the_move_early(stub_server: Any) -> None:
+    """Test that the first legal best_move is returned before the rest of the answer is received."""
+    client = make_client(stub_server)
+    answers: list[str] = []
+    received = threading.Event()
+
+    def save_answer(answer: str) -> None:
+        answers.append(answer)
+        received.set()
+
+    start = time.monotonic()
+    legal_moves = list(chess.Board().legal_moves)
+    assert client.stream_best_move("claude", "prompt", legal_moves, on_complete=save_answer) == "e2e4"
+    assert time.monotonic() - start < 0.4
+    assert not answers
+
+    assert received.wait(5)
+    assert json.loads(answers[0]) == {"best_move": "e2e4", "rationale": "Control the center."}
+    assert stub_server.requests[-1][3]["stream"] is True
+    client.close()
+
+
+def test_async_client(stub_server: Any) -> None:
+    """Test that the asyncio client can run several requests at the same time."""
+    client = AsyncLLMClient(make_client(stub_server), max_workers=3)
+
+    async def ask_all() -> list[Any]:
+        return await asyncio.gather(*(client.complete("openai", f"prompt {i}", json_mode=True) for i in range(3)))
+
+    assert asyncio.run(ask_all()) == [{"best_move": "e2e4"}] * 3
+    client.close()
+    prompts = sorted(body["messages"][0]["content"] for _, _, _, body in stub_server.requests)
+    assert prompts == ["prompt 0", "prompt 1", "prompt 2"]
+
+
+def test_proposer_executor_keeps_order() -> None:
+    """Test that the proposer answers come back in the order the proposers were given."""
+    def square(number: int) -> Callable[[], int]:
+        return lambda: number * number
+
+    executor = ProposerExecutor(max_workers=3)
+    assert executor.gather([square(i) for i in range(5)]) == [0, 1, 4, 9, 16]
+    executor.shutdown()
@@ -0,0 +1,109 @@
+"""Test the LLM move cache."""
+import os
+import time
+import chess
+from llm_agents.move_cache import MoveCache
+
+
+def test_hits_and_misses() -> None:
+    """Test that a position reached by different move orders is answered from the cache."""
+    cache = MoveCache(":memory:")
+    board = chess.Board()
+    for move in ["e2e4", "e7e5", "g1f3"]:
+        board.push_uci(move)
+
+    assert cache.get(board, "SingleAgentLLM", "model") is None
+    cache.put(board, "SingleAgentLLM", "model", "b8c6")
+
+    transposed = chess.Board()
+    for move in ["g1f3", "e7e5", "e2e4"]:
+        transposed.push_uci(move)
+    assert cache.get(transposed, "SingleAgentLLM", "model") == chess.Move.from_uci("b8c6")
+    assert cache.get(transposed, "LLMMultiAgent", "model") is None
+    assert cache.get(transposed, "SingleAgentLLM", "other model") is None
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_illegal_moves_are_not_cached() -> None:
+    """Test that answers that are not legal UCI moves are ignored."""
+    cache = MoveCache(":memory:")
+    board = chess.Board()
+    cache.put(board, "agent", "model", "e4")
+    cache.put(board, "agent", "model", "e2e5")
+    assert cache.get(board, "agent", "model") is None
+
+
+def test_ttl() -> None:
+    """Test that old moves are asked for again."""
+    cache = MoveCache(":memory:", ttl=0.05)
+    board = chess.Board()
+    cache.put(board, "agent", "model", "d2d4")
+    assert cache.get(board, "agent", "model") == chess.Move.from_uci("d2d4")
+    time.sleep(0.1)
+    assert cache.get(board, "agent", "model") is None
+
+
+def test_lru_and_persistence(tmp_path: str) -> None:
+    """Test that the least recently used moves are evicted and that the others are saved to disk."""
+    path = os.path.join(tmp_path, "cache.sqlite")
+    cache = MoveCache(path, max_entries=2, memory_entries=1)
+    boards = []
+    for first_move in ["e2e4", "d2d4", "c2c4"]:
+        board = chess.Board()
+        board.push_uci(first_move)
+        boards.append(board)
+        cache.put(board, "agent", "model", "g8f6")
+        time.sleep(0.01)
+    cache.close()
+
+    reopened = MoveCache(path, max_entries=2)
+    assert reopened.get(boards[0], "agent", "model") is None
+    assert reopened.get(boards[1], "agent", "model") == chess.Move.from_uci("g8f6")
+    assert reopened.get(boards[2], "agent", "model") == chess.Move.from_uci("g8f6")
+    reopened.close()
+
+
+def test_memory_hits_keep_moves_on_disk(tmp_path: str) -> None:
+    """Test that a move read from memory counts as used, so it isn't the one deleted when the disk cache is full."""
+    cache = MoveCache(os.path.join(tmp_path, "cache.sqlite"), max_entries=2)
+    boards = []
+    for first_move in ["e2e4", "d2d4", "c2c4"]:
+        board = chess.Board()
+        board.push_uci(first_move)
+        boards.append(board)
+
+    cache.put(boards[0], "agent", "model", "g8f6")
+    time.sleep(0.01)
+    cache.put(boards[1], "agent", "model", "g8f6")
+    time.sleep(0.01)
+    assert cache.get(boards[0], "agent", "model") == chess.Move.from_uci("g8f6")
+    time.sleep(0.01)
+    cache.put(boards[2], "agent", "model", "g8f6")
+
+    rows = cache.connection.execute("SELECT zobrist FROM moves").fetchall()
+    assert sorted(row[0] for row in rows) == sorted(cache.key(board, "agent", "model")[0] for board in (boards[0], boards[2]))
+    cache.close()
+
+
+def test_moves_are_only_evicted_when_the_cache_is_full(tmp_path: str) -> None:
+    """Test that saving a move only deletes from the disk when there are more than `max_entries` moves."""
+    path = os.path.join(tmp_path, "cache.sqlite")
+    cache = MoveCache(path, max_entries=3)
+    statements: list[str] = []
+    cache.connection.set_trace_callback(statements.append)
+    board = chess.Board()
+    cache.put(board, "agent", "model", "d2d4")
+    for move in ["e2e4", "e7e5"]:
+        cache.put(board, "agent", "model", move)  # Replaces the move saved for the starting position.
+        board.push_uci(move)
+    cache.put(board, "agent", "model", "g1f3")
+    assert cache.entries == 3
+    assert not [statement for statement in statements if statement.startswith("DELETE")]
+    cache.close()
+
+    reopened = MoveCache(path, max_entries=3)
+    assert reopened.entries == 3
+    reopened.put(chess.Board(), "agent", "other model", "d2d4")
+    assert reopened.entries == 3
+    assert reopened.connection.execute("SELECT COUNT(*) FROM moves").fetchone()[0] == 3
+    reopened.close()
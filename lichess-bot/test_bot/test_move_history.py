@@ -0,0 +1,75 @@
+"""Test the incremental board of a game."""
+import chess
+import pytest
+from lib.move_history import MoveHistory
+
+
+def test_update_only_plays_new_moves(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that each update only plays the moves that weren't played before, and that takebacks are handled."""
+    history = MoveHistory(chess.Board())
+    board = history.update("e2e4 e7e5 g1f3")
+    assert board is history.board
+    assert history.san_text(chess.WHITE) == "e4 Nf3"
+    assert history.san_text(chess.BLACK) == "e5"
+
+    pushed: list[chess.Move] = []
+    push = history.push
+
+    def record_push(move: chess.Move) -> None:
+        pushed.append(move)
+        push(move)
+
+    monkeypatch.setattr(history, "push", record_push)
+    assert history.update("e2e4 e7e5 g1f3 b8c6").fen() == "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3"
+    assert pushed == [chess.Move.from_uci("b8c6")]
+    assert history.san_text(chess.BLACK) == "e5 Nc6"
+
+    # A takeback starts over from the starting position.
+    assert history.update("e2e4 e7e5").move_stack == [chess.Move.from_uci("e2e4"), chess.Move.from_uci("e7e5")]
+    assert history.san_text(chess.WHITE) == "e4"
+    assert history.update("").fen() == chess.STARTING_FEN
+    assert history.update("d2d4 d7d5 c2c4").move_stack[-1] == chess.Move.from_uci("c2c4")
+    assert history.moves[chess.WHITE] == [chess.Move.from_uci("d2d4"), chess.Move.from_uci("c2c4")]
+
+
+def test_illegal_moves_are_ignored() -> None:
+    """Test that an illegal move from the server is skipped, as when the board was set up from scratch."""
+    history = MoveHistory(chess.Board())
+    board = history.update("e2e4 e2e4 e7e5")
+    assert [move.uci() for move in board.move_stack] == ["e2e4", "e7e5"]
+    assert history.update("e2e4 e2e4 e7e5 d2d4").move_stack[-1] == chess.Move.from_uci("d2d4")
+
+
+def test_sync_with_another_board() -> None:
+    """Test following the moves of a board, starting from a position with black to move."""
+    fen = "4k3/8/8/8/8/8/4P3/4K3 b - - 0 1"
+    board = chess.Board(fen)
+    history = MoveHistory(board.root())
+    for move in ["e8d7", "e2e4", "d7e6"]:
+        board.push_uci(move)
+        history.sync(board)
+    assert history.board.fen() == board.fen()
+    assert history.san_text(chess.BLACK) == "Kd7 Ke6"
+    assert history.san_text(chess.WHITE) == "e4"
+
+    other_game = chess.Board()
+    other_game.push_uci("g1f3")
+    assert history.sync(other_game).fen() == other_game.fen()
+    assert history.san_text(chess.WHITE) == "Nf3"
+    assert history.san_text(chess.BLACK) == ""
+
+
+def test_sync_undoes_different_moves(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that only the moves after the last one in common are undone, as when switching between pondered positions."""
+    board = chess.Board()
+    for move in ["e2e4", "e7e5", "g1f3", "b8c6"]:
+        board.push_uci(move)
+    history = MoveHistory(chess.Board())
+    history.sync(board)
+    monkeypatch.setattr(history, "reset", lambda board=None: pytest.fail("The history should not start over."))
+
+    board.pop()
+    board.push_uci("g8f6")
+    assert history.sync(board).fen() == board.fen()
+    assert history.san_text(chess.BLACK) == "e5 Nf6"
+    assert history.san_text(chess.WHITE) == "e4 Nf3"
@@ -0,0 +1,104 @@
+"""Test the timing of the stages of the moves, and its export."""
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from lib import move_timing
+from lib.config import Configuration
+from lib.engine_wrapper import EngineWrapper
+from lib.move_timing import MoveTimings, MoveTrace, current_trace, span
+
+
+def test_spans_of_a_move() -> None:
+    """Test that the spans add up in the trace of the move being played, and do nothing outside of a move."""
+    with span("llm"):
+        pass
+
+    trace = MoveTrace()
+    token = current_trace.set(trace)
+    try:
+        with trace.span("search"):
+            for _ in range(2):
+                with span("llm"):
+                    time.sleep(0.01)
+    finally:
+        current_trace.reset(token)
+    assert list(trace.stages) == ["llm", "search"]
+    assert 0.02 <= trace.stages["llm"] <= trace.stages["search"]
+    trace.add("book", 0.0001)
+    assert trace.summary() == f"llm {trace.stages['llm'] * 1000:.0f}ms, search {trace.stages['search'] * 1000:.0f}ms"
+
+
+def test_export() -> None:
+    """Test the Prometheus text and the JSON object of the histograms."""
+    timings = MoveTimings()
+    for search_time in (0.05, 0.3, 20.0):
+        trace = MoveTrace()
+        trace.add("search", search_time)
+        trace.add("make_move", 0.08)
+        timings.record(trace)
+
+    text = timings.prometheus('process="7"')
+    assert 'lichess_bot_move_stage_seconds_bucket{stage="search",le="0.05",process="7"} 1' in text
+    assert 'lichess_bot_move_stage_seconds_bucket{stage="search",le="0.5",process="7"} 2' in text
+    assert 'lichess_bot_move_stage_seconds_bucket{stage="search",le="+Inf",process="7"} 3' in text
+    assert 'lichess_bot_move_stage_seconds_count{stage="make_move",process="7"} 3' in text
+    assert 'lichess_bot_moves_total{process="7"} 3' in text
+    assert "lichess_bot_moves_total 3" in timings.prometheus()
+
+    search = timings.to_json()["stages"]["search"]
+    assert (search["count"], search["max"], search["buckets"]["10.0"], search["buckets"]["+Inf"]) == (3, 20.0, 2, 3)
+    assert timings.to_json()["moves"] == 3
+
+
+def test_write_move_timings(tmp_path: Any, monkeypatch: Any) -> None:
+    """Test that the timings of the process are written to a file named after the process."""
+    timings = MoveTimings()
+    trace = MoveTrace()
+    trace.add("total", 1.5)
+    timings.record(trace)
+    monkeypatch.setattr(move_timing, "move_timings", timings)
+
+    move_timing.write_move_timings(str(tmp_path), "json")
+    move_timing.write_move_timings(str(tmp_path), "prometheus")
+    assert sorted(os.listdir(tmp_path)) == [f"lichess_bot_{os.getpid()}.json", f"lichess_bot_{os.getpid()}.prom"]
+    with open(tmp_path / f"lichess_bot_{os.getpid()}.json") as timings_file:
+        assert json.load(timings_file)["stages"]["total"]["sum"] == 1.5
+
+
+def test_write_move_timings_from_many_threads(tmp_path: Any, monkeypatch: Any, caplog: Any) -> None:
+    """Test that the games of a process can write the timings at the same time."""
+    timings = MoveTimings()
+    trace = MoveTrace()
+    trace.add("total", 1.5)
+    timings.record(trace)
+    monkeypatch.setattr(move_timing, "move_timings", timings)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda _: move_timing.write_move_timings(str(tmp_path), "json"), range(200)))
+    assert not [record for record in caplog.records if record.levelno >= logging.ERROR]
+    assert os.listdir(tmp_path) == [f"lichess_bot_{os.getpid()}.json"]
+    with open(tmp_path / f"lichess_bot_{os.getpid()}.json") as timings_file:
+        assert json.load(timings_file)["stages"]["total"]["sum"] == 1.5
+
+
+def test_stages_in_the_stats() -> None:
+    """Test that the stats of the engine show the stages of the last move."""
+    engine = EngineWrapper({}, Configuration({}))
+    assert not any(line.startswith("Stages") for line in engine.get_stats())
+    trace = MoveTrace()
+    trace.add("search", 1.234)
+    trace.add("make_move", 0.085)
+    engine.move_timings.record(trace)
+    assert "Stages: search 1.2s, make_move 85ms" in engine.get_stats(for_chat=True)
+
+    # During a move, its own stages are shown.
+    current = MoveTrace()
+    current.add("book", 0.002)
+    token = current_trace.set(current)
+    try:
+        assert engine.move_timings.stages() == "book 2ms"
+    finally:
+        current_trace.reset(token)
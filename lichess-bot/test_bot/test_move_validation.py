@@ -0,0 +1,62 @@
+"""Test the validation and repair of the LLMs' moves."""
+import chess
+import chess.engine
+import pytest
+import homemade
+from lib.config import Configuration
+from llm_agents.move_validation import LegalMoveIndex, ValidationStats, answer_text
+
+
+@pytest.mark.parametrize("answer, expected", [("Nf3", "g1f3"), ("nf3", "g1f3"), ("1. Nf3!", "g1f3"), ("G1F3", "g1f3"),
+                                              ("Ng1-f3", "g1f3"), ("e2-e4", "e2e4"), ("'e4'", "e2e4")])
+def test_repairs(answer: str, expected: str) -> None:
+    """Test that the common formatting slips are repaired."""
+    board = chess.Board()
+    index = LegalMoveIndex(board, list(board.legal_moves))
+    assert index.exact(answer) is None
+    assert index.repair(answer) == chess.Move.from_uci(expected)
+
+
+@pytest.mark.parametrize("answer", ["O-O", "0-0", "e1h1", "o-o"])
+def test_castling_repairs(answer: str) -> None:
+    """Test that the other castling notations are recognized."""
+    board = chess.Board("r1bqk1nr/pppp1ppp/2n5/2b1p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4")
+    index = LegalMoveIndex(board, list(board.legal_moves))
+    assert index.repair(answer) == chess.Move.from_uci("e1g1")
+    assert index.repair("Bxf7+") == chess.Move.from_uci("c4f7")
+
+
+def test_promotion_and_unknown_moves() -> None:
+    """Test that a promotion without a piece is a queen promotion and that illegal moves are not repaired."""
+    board = chess.Board("8/4P3/8/8/8/8/k7/7K w - - 0 1")
+    index = LegalMoveIndex(board, list(board.legal_moves))
+    assert index.repair("e7e8") == chess.Move.from_uci("e7e8q")
+    assert index.exact("e7e8n") == chess.Move.from_uci("e7e8n")
+    assert index.repair("e7e6") is None
+    assert index.repair("I resign") is None
+
+
+def test_answer_text() -> None:
+    """Test that the move is found in the different shapes of answers."""
+    assert answer_text({"best_move": " e2e4 ", "rationale": "..."}) == "e2e4"
+    assert answer_text("d2d4\n") == "d2d4"
+
+
+def test_requery(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that an unrecognizable answer is asked for again with the list of legal moves."""
+    prompts: list[str] = []
+
+    def agent(prompt: str, *args: object, **kwargs: object) -> str:
+        prompts.append(prompt)
+        return "the knight to the center" if len(prompts) == 1 else "g1f3"
+
+    monkeypatch.setattr(homemade, "get_llm_best_move_claude", agent)
+    stats = ValidationStats()
+    monkeypatch.setattr(homemade, "validation_stats", stats)
+    engine = homemade.SingleAgentLLM([], {"llm_move_cache": False}, None, Configuration({}))
+    result = engine.search(chess.Board(), chess.engine.Limit(time=60), False, False, chess.engine.PlayResult(None, None))
+    assert result.move == chess.Move.from_uci("g1f3")
+    assert len(prompts) == 2
+    assert "the knight to the center" in prompts[1] and "g1f3" in prompts[1]
+    assert (stats.valid, stats.repaired, stats.requeried, stats.failed) == (0, 0, 1, 0)
+    assert "LLM answers: 0 valid, 0 repaired, 1 re-queried, 0 unusable" in engine.get_stats()
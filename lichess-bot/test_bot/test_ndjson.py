@@ -0,0 +1,41 @@
+"""Test the reader of the newline-delimited JSON streams of lichess.org."""
+import requests
+from collections.abc import Iterator
+from lib import ndjson
+
+STREAM = [b'{"type": "gameFull", "state": {"moves": "e2e4"}}\n{"ty', b'pe": "chatLine", "text": "\xc3\xa9"}\n', b"\n",
+          b'{"type": "gameState",', b' "moves": "e2e4 e7e5"}\n', b"\n\n", b'{"type": "gameState"}']
+EVENTS = [{"type": "gameFull", "state": {"moves": "e2e4"}}, {"type": "chatLine", "text": "é"}, {},
+          {"type": "gameState", "moves": "e2e4 e7e5"}, {}, {}, {"type": "gameState"}]
+
+
+class RecordedStream:
+    """The raw stream of a chunked response, which gives each chunk as it arrives."""
+
+    def __init__(self, chunks: list[bytes]) -> None:
+        """:param chunks: The chunks of the response."""
+        self.chunks = chunks
+
+    def stream(self, chunk_size: int, decode_content: bool = True) -> Iterator[bytes]:
+        """Give the chunks, cut at `chunk_size` bytes."""
+        for chunk in self.chunks:
+            for start in range(0, len(chunk), chunk_size):
+                yield chunk[start:start + chunk_size]
+
+
+def test_read_lines() -> None:
+    """Test that the lines are cut at the newlines whatever the pieces, and that the keep-alive lines are kept."""
+    lines = [b'{"type": "gameFull", "state": {"moves": "e2e4"}}', b'{"type": "chatLine", "text": "\xc3\xa9"}', b"",
+             b'{"type": "gameState", "moves": "e2e4 e7e5"}', b"", b"", b'{"type": "gameState"}']
+    assert list(ndjson.read_lines(STREAM)) == lines
+    assert list(ndjson.read_lines([bytes([byte]) for byte in b"".join(STREAM)])) == lines
+    assert list(ndjson.read_lines([b"".join(STREAM)])) == lines
+
+
+def test_read_events() -> None:
+    """Test that the events of a response are the same with both decoders, and that a keep-alive line is an empty dict."""
+    for decoder in (ndjson.json_decoder, ndjson.json_loads):
+        response = requests.Response()
+        response.raw = RecordedStream(STREAM)
+        assert list(ndjson.read_events(response.iter_content(ndjson.CHUNK_SIZE), decoder)) == EVENTS
+    assert ndjson.parse_line(b"\r") == {}
@@ -0,0 +1,187 @@
+"""Test the cache of the online move sources."""
+import logging
+import os
+import time
+import chess
+import pytest
+from typing import Any, Optional, Union
+from lib.config import Configuration
+from lib.engine_wrapper import get_chessdb_move
+from lib.lichess import Lichess
+from lib.online_cache import OnlineCache, open_online_cache
+from lib.types import OnlineType
+from tools.warm_online_cache import CacheWarmer, opening_positions, warm_up, warm_up_game
+
+CHESSDB = "https://www.chessdb.cn/cdb.php"
+TABLEBASE = "https://tablebase.lichess.ovh/standard"
+
+
+class FakeResponse:
+    """An answer of an online source."""
+
+    def __init__(self, data: OnlineType) -> None:
+        """:param data: The JSON answer."""
+        self.data = data
+
+    def json(self) -> OnlineType:
+        """Get the JSON answer."""
+        return self.data
+
+
+class FakeSession:
+    """A session that answers every request with the same move and counts the requests."""
+
+    def __init__(self) -> None:
+        """Start without requests."""
+        self.requests: list[tuple[str, Optional[dict[str, Any]]]] = []
+
+    def get(self, path: str, timeout: int, params: Optional[dict[str, Any]] = None, stream: bool = False) -> FakeResponse:
+        """Answer a request."""
+        self.requests.append((path, params))
+        return FakeResponse({"status": "ok", "move": "e2e4"})
+
+
+def test_move_counters_are_ignored() -> None:
+    """Test that a position reached at another move number is answered from the cache, except by the tablebase."""
+    cache = OnlineCache(":memory:")
+    cache.put(CHESSDB, {"action": "querybest", "board": "8/8/8/8/8/2k5/8/K1R5 w - - 0 1", "json": 1}, {"status": "ok"})
+    cache.put(TABLEBASE, {"fen": "8/8/8/8/8/2k5/8/K1R5 w - - 0 1"}, {"category": "win"})
+
+    later: dict[str, Union[str, int]] = {"json": 1, "board": "8/8/8/8/8/2k5/8/K1R5 w - - 12 40", "action": "querybest"}
+    assert cache.get(CHESSDB, later) == {"status": "ok"}
+    assert cache.get(CHESSDB, {"action": "queryall", "board": "8/8/8/8/8/2k5/8/K1R5 w - - 0 1", "json": 1}) is None
+    assert cache.get(TABLEBASE, {"fen": "8/8/8/8/8/2k5/8/K1R5 w - - 0 1"}) == {"category": "win"}
+    assert cache.get(TABLEBASE, {"fen": "8/8/8/8/8/2k5/8/K1R5 w - - 90 60"}) is None
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_ttl_per_site() -> None:
+    """Test that the answers of each site are kept for the time set for that site."""
+    cache = OnlineCache(":memory:", ttls={"chessdb": 0.05})
+    params = {"fen": chess.STARTING_FEN}
+    cache.put(CHESSDB, params, {"status": "ok"})
+    cache.put(TABLEBASE, params, {"category": "draw"})
+    time.sleep(0.1)
+    assert cache.get(CHESSDB, params) is None
+    assert cache.get(TABLEBASE, params) == {"category": "draw"}
+    assert len(cache) == 1
+
+
+def test_answers_without_a_move_expire_sooner() -> None:
+    """Test that the errors and the positions a site doesn't know are asked for again sooner than the other answers."""
+    cache = OnlineCache(":memory:", negative_ttl=0.05)
+    answers: dict[str, OnlineType] = {"unknown": {"status": "unknown"}, "error": {"error": "Not found"},
+                                      "no moves": {"white": 0, "black": 0, "draws": 0, "moves": []},
+                                      "move": {"status": "ok", "move": "e2e4"}}
+    for name, answer in answers.items():
+        cache.put(CHESSDB, {"board": name}, answer)
+    assert all(cache.get(CHESSDB, {"board": name}) == answer for name, answer in answers.items())
+    time.sleep(0.1)
+    assert [name for name in answers if cache.get(CHESSDB, {"board": name}) is not None] == ["move"]
+
+
+def test_other_sites_are_not_cached() -> None:
+    """Test that only the online move sources are saved."""
+    cache = OnlineCache(":memory:")
+    cache.put("https://lichess.org/api/account", {}, {"status": "ok"})
+    assert cache.get("https://lichess.org/api/account", {}) is None
+    assert len(cache) == 0
+
+
+def test_lru_and_persistence(tmp_path: str) -> None:
+    """Test that the least recently used answers are deleted and that the others are saved to disk."""
+    path = os.path.join(tmp_path, "online_cache.sqlite")
+    cache = OnlineCache(path, max_entries=2)
+    for index in range(3):
+        cache.put(CHESSDB, {"board": str(index)}, {"move": str(index)})
+        time.sleep(0.01)
+    cache.close()
+
+    reopened = OnlineCache(path, max_entries=2)
+    assert reopened.get(CHESSDB, {"board": "0"}) is None
+    assert reopened.get(CHESSDB, {"board": "2"}) == {"move": "2"}
+    reopened.close()
+
+
+def test_failed_downloads_are_not_saved() -> None:
+    """Test that an exception while asking a site is raised and nothing is saved."""
+    cache = OnlineCache(":memory:")
+
+    def download() -> OnlineType:
+        raise ConnectionError
+
+    with pytest.raises(ConnectionError):
+        cache.fetch(CHESSDB, {}, download)
+    assert len(cache) == 0
+    assert cache.fetch(CHESSDB, {}, lambda: {"status": "ok"}) == {"status": "ok"}
+    assert cache.fetch(CHESSDB, {}, download) == {"status": "ok"}
+
+
+def logged_in(online_cache_cfg: Configuration) -> Lichess:
+    """Make a `Lichess` whose token is accepted without asking lichess.org."""
+    return Lichess("token", "https://lichess.org/", "1.0", logging.INFO, 1, online_cache_cfg)
+
+
+def test_online_book_get(tmp_path: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that `Lichess.online_book_get` only asks a site once per position, but always streams the player explorer."""
+    monkeypatch.setattr(Lichess, "api_post", lambda *args, **kwargs: {"token": {"scopes": "bot:play"}})
+    li = logged_in(Configuration({"path": os.path.join(tmp_path, "cache.sqlite"), "max_entries": 100, "ttl": {}}))
+    session = FakeSession()
+    li.other_session = session  # type: ignore[assignment]
+    params: dict[str, Union[str, int]] = {"action": "querybest", "board": chess.STARTING_FEN, "json": 1}
+    assert li.online_book_get(CHESSDB, params) == {"status": "ok", "move": "e2e4"}
+    assert li.online_book_get(CHESSDB, params) == {"status": "ok", "move": "e2e4"}
+    li.online_book_get("https://explorer.lichess.ovh/player", {"fen": chess.STARTING_FEN}, True)
+    li.online_book_get("https://explorer.lichess.ovh/player", {"fen": chess.STARTING_FEN}, True)
+    assert len(session.requests) == 3
+
+    disabled = logged_in(Configuration({"path": "", "max_entries": 100, "ttl": {}}))
+    disabled.other_session = session  # type: ignore[assignment]
+    disabled.online_book_get(CHESSDB, params)
+    assert len(session.requests) == 4
+
+
+def write_pgn(directory: str) -> str:
+    """Write three short games to a PGN file and get its path."""
+    pgn_path = os.path.join(directory, "games.pgn")
+    with open(pgn_path, "w") as pgn:
+        pgn.write("1. e4 e5 2. Nf3 Nc6 *\n\n1. e4 e5 2. Nf3 Nf6 *\n\n1. Nf3 Nc6 2. e4 e5 *\n")
+    return pgn_path
+
+
+def test_warm_up(tmp_path: str) -> None:
+    """Test that the warm-up asks the enabled books once per distinct opening position."""
+    pgn_path = write_pgn(tmp_path)
+    li = CacheWarmer(1, open_online_cache(os.path.join(tmp_path, "cache.sqlite")))
+    session = FakeSession()
+    li.session = session  # type: ignore[assignment]
+    online_moves_cfg = Configuration({"priority": ["chessdb_book", "lichess_cloud_analysis"],
+                                      "chessdb_book": {"enabled": True, "min_time": 20, "move_quality": "good"},
+                                      "lichess_cloud_analysis": {"enabled": False}})
+
+    # The positions before each of the first 4 moves: the start, 1. e4, 1. e4 e5 and 1. e4 e5 2. Nf3 in the first two
+    # games, and 1. Nf3, 1. Nf3 Nc6 and 1. Nf3 Nc6 2. e4 in the third one.
+    assert warm_up(li, opening_positions([pgn_path], 4), online_moves_cfg, 0) == 7
+    assert len(session.requests) == 7
+    assert all(path == CHESSDB for path, _ in session.requests)
+    warm_up(li, opening_positions([pgn_path], 4), online_moves_cfg, 0)
+    assert len(session.requests) == 7
+
+
+def test_games_use_the_warmed_up_answers(tmp_path: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the answers saved by the warm-up are the ones a game of the bot looks for."""
+    path = os.path.join(tmp_path, "cache.sqlite")
+    warmer = CacheWarmer(1, open_online_cache(path))
+    warmer.session = FakeSession()  # type: ignore[assignment]
+    online_moves_cfg = Configuration({"priority": ["chessdb_book"],
+                                      "chessdb_book": {"enabled": True, "min_time": 20, "move_quality": "good"}})
+    warm_up(warmer, opening_positions([write_pgn(tmp_path)], 2), online_moves_cfg, 0)
+
+    monkeypatch.setattr(Lichess, "api_post", lambda *args, **kwargs: {"token": {"scopes": "bot:play"}})
+    li = logged_in(Configuration({"path": path, "max_entries": 100, "ttl": {}}))
+    session = FakeSession()
+    li.other_session = session  # type: ignore[assignment]
+    board = chess.Board()
+    board.push_uci("e2e4")
+    assert get_chessdb_move(li, board, warm_up_game(), online_moves_cfg.chessdb_book)[0] == "e2e4"
+    assert session.requests == []
@@ -0,0 +1,115 @@
+"""Test asking the online opening books at the same time."""
+import copy
+import time
+import chess
+import chess.engine
+import pytest
+import yaml
+from types import SimpleNamespace
+from typing import cast
+from lib import engine_wrapper, model
+from lib.config import Configuration, insert_default_values, validate_config
+
+NO_LICHESS = cast(engine_wrapper.LICHESS_TYPE, None)
+"""The online sources of the tests don't make requests."""
+GAME = cast(model.Game, SimpleNamespace(id="abcdefgh", state={"wtime": 60000}))
+
+
+def source(move: str, delay: float, calls: list[str]) -> engine_wrapper.ONLINE_SOURCE_TYPE:
+    """Make an online source that answers `move` after `delay` seconds."""
+    def get_move(li: object, board: chess.Board, game: object, cfg: Configuration) -> tuple[str, chess.engine.InfoDict]:
+        calls.append(move)
+        time.sleep(delay)
+        return move, {"string": f"lichess-bot-source:{move}"}
+    return get_move
+
+
+def race(sources: list[tuple[str, float, bool]], deadline: float) -> tuple[object, float, list[str]]:
+    """Race the sources and return the move, the time it took and the sources that were called."""
+    calls: list[str] = []
+    online_sources = [(source(move, delay, calls), Configuration({"enabled": enabled})) for move, delay, enabled in sources]
+    start = time.monotonic()
+    best_move, comment = engine_wrapper.race_online_sources(NO_LICHESS, chess.Board(), GAME, online_sources, deadline)
+    return best_move, time.monotonic() - start, calls
+
+
+def test_highest_priority_answer_wins() -> None:
+    """Test that a faster source with a lower priority doesn't win over a source that answers in time."""
+    best_move, elapsed, calls = race([("e2e4", 0.2, True), ("d2d4", 0.0, True)], deadline=2)
+    assert best_move == "e2e4"
+    assert elapsed < 1
+    assert sorted(calls) == ["d2d4", "e2e4"]
+
+
+def test_sources_are_asked_at_the_same_time() -> None:
+    """Test that the lower priority answer is used when the first source has no move, without waiting twice."""
+    calls: list[str] = []
+    online_sources = [(source("", 0.3, calls), Configuration({"enabled": True})),
+                      (source("c2c4", 0.3, calls), Configuration({"enabled": True}))]
+    start = time.monotonic()
+    best_move, _ = engine_wrapper.race_online_sources(NO_LICHESS, chess.Board(), GAME, online_sources, 2)
+    assert best_move == "c2c4"
+    assert time.monotonic() - start < 0.55
+
+
+def test_deadline() -> None:
+    """Test that slow sources are dropped at the deadline, and that disabled sources are not asked."""
+    best_move, elapsed, calls = race([("e2e4", 1.0, True), ("d2d4", 0.0, True), ("g1f3", 0.0, False)], deadline=0.2)
+    assert best_move == "d2d4"
+    assert elapsed < 0.5
+    assert "g1f3" not in calls
+
+    best_move, elapsed, calls = race([("e2e4", 0.6, True)], deadline=0.1)
+    assert best_move is None
+    assert elapsed < 0.4
+
+
+@pytest.mark.parametrize("racing", [False, True])
+def test_get_online_move_priority(racing: bool, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the priority decides between the online books, with and without racing."""
+    calls: list[str] = []
+    monkeypatch.setattr(engine_wrapper, "get_chessdb_move", source("e2e4", 0.0, calls))
+    monkeypatch.setattr(engine_wrapper, "get_opening_explorer_move", source("d2d4", 0.0, calls))
+    monkeypatch.setattr(engine_wrapper, "get_lichess_cloud_move", source("c2c4", 0.0, calls))
+    online_moves_cfg = Configuration({"online_egtb": {"enabled": False, "min_time": 20, "max_pieces": 7},
+                                      "max_out_of_book_moves": 10, "max_depth": 10, "racing": racing, "race_deadline": 1,
+                                      "priority": ["lichess_opening_explorer", "chessdb_book", "lichess_cloud_analysis"],
+                                      "chessdb_book": {"enabled": True}, "lichess_cloud_analysis": {"enabled": True},
+                                      "lichess_opening_explorer": {"enabled": True}})
+    result = engine_wrapper.get_online_move(NO_LICHESS, chess.Board(), GAME, online_moves_cfg, Configuration({}))
+    assert isinstance(result, chess.engine.PlayResult)
+    assert result.move == chess.Move.from_uci("d2d4")
+    if not racing:
+        assert calls == ["d2d4"]
+
+
+def test_failed_source_is_skipped() -> None:
+    """Test that a source that raises an exception doesn't stop the race."""
+    def broken(li: object, board: chess.Board, game: object, cfg: Configuration) -> tuple[str, chess.engine.InfoDict]:
+        raise ConnectionError("The book is down.")
+
+    online_sources = [(broken, Configuration({"enabled": True})),
+                      (source("d2d4", 0.1, []), Configuration({"enabled": True}))]
+    best_move, _ = engine_wrapper.race_online_sources(NO_LICHESS, chess.Board(), GAME, online_sources, 2)
+    assert best_move == "d2d4"
+
+
+def test_priority_in_the_config() -> None:
+    """Test that the enabled books missing from the priority are used last, and that a book can't be listed twice."""
+    def validated_priority(priority: list[str]) -> list[str]:
+        with open("config.yml.default") as config_file:
+            raw_config = yaml.safe_load(config_file)
+        raw_config["engine"].update({"dir": ".", "protocol": "homemade", "name": "AlphaBetaEngine"})
+        online_moves = raw_config["engine"]["online_moves"]
+        online_moves["priority"] = priority
+        for book in ["chessdb_book", "lichess_cloud_analysis"]:
+            online_moves[book]["enabled"] = True
+        insert_default_values(raw_config)
+        default_config = copy.deepcopy(raw_config)
+        validate_config(raw_config)
+        assert raw_config == default_config  # The books missing from the priority are added with the default values.
+        return list(raw_config["engine"]["online_moves"]["priority"])
+
+    assert validated_priority(["lichess_cloud_analysis"]) == ["lichess_cloud_analysis", "chessdb_book"]
+    with pytest.raises(Exception, match="more than once"):
+        validated_priority(["chessdb_book", "lichess_cloud_analysis", "chessdb_book"])
@@ -0,0 +1,141 @@
+"""Test the index of the online bots and the download of their public data in the background."""
+import random
+import threading
+import yaml
+from typing import Any
+from lib import matchmaking
+from lib.config import Configuration, insert_default_values
+from lib.opponent_index import OpponentIndex, OpponentIndexService
+from lib.timer import Timer, minutes
+from lib.types import PublicDataType, UserProfileType
+
+
+def make_bot(username: str, **ratings: int) -> UserProfileType:
+    """Make an online bot with a rating in some game types."""
+    return {"username": username, "perfs": {game_type: {"games": 10, "rating": rating}
+                                            for game_type, rating in ratings.items()}}
+
+
+class OnlineBots:
+    """Gives the online bots, and their public data when `answer` is set."""
+
+    def __init__(self, online_bots: list[UserProfileType], blocking: set[str]) -> None:
+        """
+        Create the online bots.
+
+        :param online_bots: The online bots.
+        :param blocking: The names of the bots that block us.
+        """
+        self.online_bots = online_bots
+        self.blocking = blocking
+        self.answer = threading.Event()
+        self.public_data_requests: list[str] = []
+        self.challenges: list[str] = []
+
+    def get_online_bots(self) -> list[UserProfileType]:
+        """Get the online bots."""
+        return self.online_bots
+
+    def get_public_data(self, user_name: str) -> PublicDataType:
+        """Get the public data of a bot, once `answer` is set."""
+        self.public_data_requests.append(user_name)
+        self.answer.wait(10)
+        if user_name == "broken":
+            raise ConnectionError("No answer.")
+        return {"username": user_name, "blocking": user_name in self.blocking}
+
+    def challenge(self, username: str, payload: Any) -> dict[str, Any]:
+        """Create a challenge."""
+        self.challenges.append(username)
+        return {"challenge": {"id": f"challenge{len(self.challenges)}"}}
+
+
+def test_bots_in_range() -> None:
+    """Test that the bots in a rating range are the ones a filter on all the bots finds."""
+    generator = random.Random(1)
+    bots = [make_bot(f"bot{index}", blitz=generator.randint(600, 3000), bullet=generator.randint(600, 3000))
+            for index in range(500)]
+    bots.append({"username": "newcomer", "perfs": {"blitz": {"games": 0, "rating": 1500}}})
+    index = OpponentIndex(bots)
+    for min_rating, max_rating in [(600, 3000), (1500, 1500), (1200, 1800), (2900, 4000), (100, 500)]:
+        expected = {bot["username"] for bot in bots
+                    if bot["perfs"]["blitz"]["games"] and min_rating <= bot["perfs"]["blitz"]["rating"] <= max_rating}
+        assert {bot["username"] for bot in index.bots_in_range("blitz", min_rating, max_rating)} == expected
+    assert index.bots_in_range("atomic", 600, 4000) == []
+
+
+def test_failed_refresh_keeps_the_index() -> None:
+    """Test that the index isn't emptied when the list of online bots can't be downloaded."""
+    li = OnlineBots([make_bot("bot1", blitz=1500), make_bot("bot2", blitz=1600)], set())
+    service = OpponentIndexService(li, minutes(5), minutes(60))  # type: ignore[arg-type]
+    try:
+        service.refresh()
+        assert service.index.size == 2
+
+        li.online_bots = []
+        service.refresh()
+        assert service.index.size == 2
+
+        def broken() -> list[UserProfileType]:
+            raise ConnectionError("No answer.")
+
+        li.get_online_bots = broken  # type: ignore[method-assign]
+        service.refresh()
+        assert [bot["username"] for bot in service.bots_in_range("blitz", 1550, 1650)] == ["bot2"]
+    finally:
+        service.close()
+
+
+def test_public_data_are_cached() -> None:
+    """Test that the public data are downloaded once in the background, and again after a failure."""
+    li = OnlineBots([], set())
+    service = OpponentIndexService(li, minutes(5), minutes(60))  # type: ignore[arg-type]
+    try:
+        first = service.public_data("bot1")
+        failed = service.public_data("broken")
+        assert not first.done()
+        li.answer.set()
+        assert first.result(timeout=10) == {"username": "bot1", "blocking": False}
+        assert failed.exception(timeout=10) is not None
+        assert service.public_data("bot1") is first
+        service.public_data("broken").exception(timeout=10)
+        assert li.public_data_requests == ["bot1", "broken", "broken"]
+    finally:
+        service.close()
+
+
+def matchmaking_config() -> Configuration:
+    """Get the default config, with matchmaking allowed and no wait before the first challenge."""
+    with open("config.yml.default") as config_file:
+        config = yaml.safe_load(config_file)
+    config["matchmaking"].update({"allow_matchmaking": True, "challenge_timeout": 1, "challenge_mode": "casual",
+                                  "challenge_variant": "standard", "challenge_initial_time": [60],
+                                  "challenge_increment": [1], "opponent_rating_difference": None})
+    insert_default_values(config)
+    return Configuration(config)
+
+
+def test_challenge_does_not_wait_for_the_public_data(monkeypatch: Any) -> None:
+    """Test that a challenge is created after the public data of the opponent are downloaded, without waiting for them."""
+    monkeypatch.setattr(matchmaking, "read_daily_challenges", lambda: [])
+    monkeypatch.setattr(matchmaking, "write_daily_challenges", lambda daily_challenges: None)
+    li = OnlineBots([make_bot("blocker", bullet=2000), make_bot("friend", bullet=2000)], {"blocker"})
+    config = matchmaking_config()
+    matchmaker = matchmaking.Matchmaking(li, config, {"username": "me", "perfs": {}})  # type: ignore[arg-type]
+    try:
+        assert matchmaker.opponent_index.refreshed.wait(10)
+        matchmaker.last_game_ended_delay = Timer(minutes(0))
+        monkeypatch.setattr(matchmaker, "min_wait_time", minutes(0))
+
+        matchmaker.challenge(set(), [], 1)
+        assert matchmaker.pending_challenge is not None and li.challenges == []
+        li.answer.set()
+        opponent = matchmaker.pending_challenge[0]
+        assert opponent is not None
+        matchmaker.opponent_index.public_data(opponent).result(timeout=10)
+        matchmaker.challenge(set(), [], 1)
+        assert matchmaker.pending_challenge is None
+        assert li.challenges == ([] if opponent == "blocker" else ["friend"])
+        assert matchmaker.in_block_list("blocker") == (opponent == "blocker")
+    finally:
+        matchmaker.close()
@@ -0,0 +1,147 @@
+"""Test the pondering of the LLM agents."""
+import threading
+import time
+import chess
+import chess.engine
+import pytest
+from typing import Optional
+import homemade
+from lib.config import Configuration
+from llm_agents import ponder
+from llm_agents.alphabeta import Searcher
+
+
+def test_guess_replies() -> None:
+    """Test that the local search guesses the obvious recapture."""
+    board = chess.Board("4k3/8/8/3r4/8/8/8/3QK3 b - - 0 1")
+    board.push_uci("d5d1")
+    assert ponder.guess_replies(board, 1, Searcher()) == [chess.Move.from_uci("e1d1")]
+    assert len(ponder.guess_replies(board, 5, Searcher())) == 3
+
+
+def test_ponder_hit_and_miss(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that a guessed reply is answered without asking the LLM again, and that other replies are asked for."""
+    calls: list[str] = []
+    lock = threading.Lock()
+
+    def agent(prompt: str, possible_moves: list[chess.Move], **kwargs: object) -> str:
+        with lock:
+            calls.append(prompt)
+        return possible_moves[0].uci()
+
+    monkeypatch.setattr(homemade, "get_llm_best_move_claude", agent)
+    monkeypatch.setattr(ponder, "guess_replies", lambda board, count, searcher: list(board.legal_moves)[:count])
+    engine = homemade.SingleAgentLLM([], {"llm_move_cache": False, "llm_ponder_moves": 1}, None, Configuration({}))
+    limit = chess.engine.Limit(time=30)
+    board = chess.Board()
+
+    first = engine.search(board, limit, True, False, chess.engine.PlayResult(None, None))
+    assert first.move is not None
+    board.push(first.move)
+    board.push(next(iter(board.legal_moves)))
+    second = engine.search(board, limit, True, False, chess.engine.PlayResult(None, None))
+    assert second.move == next(iter(board.legal_moves))
+    assert len(calls) == 2
+    assert str(engine.ponderer) == "1 hits, 0 misses, 0 timeouts, 0 failures"
+
+    board.push(second.move)
+    board.push(list(board.legal_moves)[-1])
+    third = engine.search(board, limit, False, False, chess.engine.PlayResult(None, None))
+    assert third.move == next(iter(board.legal_moves))
+    assert len(calls) == 4
+    assert str(engine.ponderer) == "1 hits, 1 misses, 0 timeouts, 0 failures"
+    engine.quit()
+
+
+def test_late_and_failed_answers_are_not_hits(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the answers that are not ready in time, fail or are illegal are counted apart from the hits."""
+    monkeypatch.setattr(ponder, "guess_replies", lambda board, count, searcher: list(board.legal_moves)[:count])
+    release = threading.Event()
+    board = chess.Board()
+    reply = next(iter(board.legal_moves))
+    board.push(reply)
+
+    def late(position: chess.Board) -> Optional[chess.Move]:
+        release.wait(5)
+        return next(iter(position.legal_moves))
+
+    def failing(position: chess.Board) -> Optional[chess.Move]:
+        raise RuntimeError("The LLM is down.")
+
+    def illegal(position: chess.Board) -> Optional[chess.Move]:
+        return chess.Move.from_uci("e1e8")
+
+    ponderer = ponder.Ponderer(1)
+    try:
+        for think in (late, failing, illegal):
+            ponderer.start(chess.Board(), think)
+            assert ponderer.take(board, 0.2) is None
+        release.set()
+    finally:
+        ponderer.shutdown()
+    assert str(ponderer) == "0 hits, 0 misses, 1 timeouts, 2 failures"
+
+
+def test_take_waits_once(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the time to guess the replies and the time to prepare the answer share the timeout of `take`."""
+    def slow_guesses(board: chess.Board, count: int, searcher: Searcher) -> list[chess.Move]:
+        time.sleep(0.3)
+        return list(board.legal_moves)[:count]
+
+    def slow_think(position: chess.Board) -> Optional[chess.Move]:
+        time.sleep(1)
+        return None
+
+    monkeypatch.setattr(ponder, "guess_replies", slow_guesses)
+    board = chess.Board()
+    board.push(next(iter(board.legal_moves)))
+    ponderer = ponder.Ponderer(1)
+    try:
+        ponderer.start(chess.Board(), slow_think)
+        start = time.monotonic()
+        assert ponderer.take(board, 0.4) is None
+        assert time.monotonic() - start < 0.6
+    finally:
+        ponderer.shutdown()
+    assert ponderer.timeouts == 1
+
+
+def test_stale_calls_do_not_hold_up_the_next_answers(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the LLM calls of cancelled guesses don't keep the next guesses waiting for a worker thread."""
+    monkeypatch.setattr(ponder, "guess_replies", lambda board, count, searcher: list(board.legal_moves)[:count])
+    release = threading.Event()
+    board = chess.Board()
+    board.push(next(iter(board.legal_moves)))
+
+    def stuck(position: chess.Board) -> Optional[chess.Move]:
+        release.wait(5)
+        return None
+
+    def quick(position: chess.Board) -> Optional[chess.Move]:
+        return next(iter(position.legal_moves))
+
+    ponderer = ponder.Ponderer(1)
+    try:
+        for think in (stuck, stuck):
+            ponderer.start(chess.Board(), think)
+            time.sleep(0.1)
+        ponderer.start(chess.Board(), quick)
+        assert ponderer.take(board, 1) == next(iter(board.legal_moves))
+    finally:
+        release.set()
+        ponderer.shutdown()
+
+
+def test_no_pondering_without_ponder_option(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the LLMs are not asked about the opponent's replies unless pondering is enabled."""
+    calls: list[str] = []
+
+    def agent(prompt: str, possible_moves: list[chess.Move], **kwargs: object) -> str:
+        calls.append(prompt)
+        return possible_moves[0].uci()
+
+    monkeypatch.setattr(homemade, "get_llm_best_move_claude", agent)
+    engine = homemade.SingleAgentLLM([], {"llm_move_cache": False, "llm_ponder_moves": 0}, None, Configuration({}))
+    assert engine.ponderer is None
+    engine.search(chess.Board(), chess.engine.Limit(time=30), True, False, chess.engine.PlayResult(None, None))
+    assert len(calls) == 1
@@ -0,0 +1,61 @@
+"""Test the encodings of the position in the LLM prompts."""
+import sys
+import types
+import chess
+import pytest
+from llm_agents import prompt_encoding
+from llm_agents.prompt_encoding import encode_position, count_tokens, TokenStats
+from llm_agents.prompts import chess_engine_prompt
+
+
+def test_compact_encoding() -> None:
+    """Test the FEN, SAN history and grouped moves of the compact encoding."""
+    board = chess.Board()
+    for move in ["e4", "e5", "Nf3"]:
+        board.push_san(move)
+    fields = encode_position(board, {"moves": "e2e4 e7e5 g1f3"}, list(board.legal_moves), "compact")
+    assert fields["board_state"] == board.fen()
+    assert fields["white_moves"] == "e4 Nf3"
+    assert fields["black_moves"] == "e5"
+    groups = dict(line.split(": ") for line in fields["possible_moves"].splitlines())
+    assert set(groups) == {"King", "Queen", "Bishop", "Knight", "Pawn"}
+    assert sorted(groups["Knight"].split()) == ["b8a6", "b8c6", "g8e7", "g8f6", "g8h6"]
+
+
+def test_compact_prompts_are_smaller() -> None:
+    """Test that the compact encoding uses fewer tokens than the verbose one, and that unknown encodings are refused."""
+    board = chess.Board()
+    for move in ["d4", "Nf6", "c4", "e6", "Nc3", "Bb4", "e3", "O-O", "Bd3", "d5", "Nf3", "c5"]:
+        board.push_san(move)
+    state = {"type": "gameState", "moves": " ".join(move.uci() for move in board.move_stack), "wtime": 60000}
+    sizes = {}
+    for encoding in ["verbose", "compact"]:
+        fields = encode_position(board, state, list(board.legal_moves), encoding)
+        sizes[encoding] = count_tokens(chess_engine_prompt.format(playing_as="White", **fields))
+    assert sizes["compact"] < sizes["verbose"]
+
+    with pytest.raises(ValueError):
+        encode_position(board, state, list(board.legal_moves), "pictures")
+
+
+def test_token_stats() -> None:
+    """Test the averages of the token counts."""
+    stats = TokenStats()
+    stats.add("compact", "a" * 40)
+    stats.add("compact", "a" * 80)
+    assert str(stats) == f"compact: {(count_tokens('a' * 40) + count_tokens('a' * 80)) // 2} tokens/prompt over 2 prompts"
+
+
+def test_tokens_are_estimated_when_tiktoken_fails(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that a tiktoken that can't download its data is only tried once, and that the tokens are estimated."""
+    calls: list[str] = []
+
+    def get_encoding(name: str) -> None:
+        calls.append(name)
+        raise ConnectionError("No network.")
+
+    monkeypatch.setitem(sys.modules, "tiktoken", types.SimpleNamespace(get_encoding=get_encoding))
+    monkeypatch.setattr(prompt_encoding, "token_encoder", None)
+    assert count_tokens("e2e4 " * 10) == 13
+    assert count_tokens("e2e4") == 1
+    assert calls == ["o200k_base"]
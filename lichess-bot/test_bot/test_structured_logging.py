@@ -0,0 +1,109 @@
+"""Test the logging of the games: the lazy queue handler, the sampling of the games, the JSON lines and the transcripts."""
+import asyncio
+import gzip
+import importlib
+import json
+import logging
+import queue
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+from lib.structured_logging import (TRANSCRIPT_LOGGER, GameFilter, JsonLinesFormatter, LazyPformat, LazyQueueHandler,
+                                    current_game, is_sampled, route_transcripts)
+
+lichess_bot = importlib.import_module("lichess-bot")
+
+
+def make_record(msg: str, *args: Any, level: int = logging.INFO, exc_info: Any = None) -> logging.LogRecord:
+    """Create a log record of the logger "homemade"."""
+    return logging.LogRecord("homemade", level, "homemade.py", 1, msg, args, exc_info)
+
+
+def test_messages_are_formatted_by_the_listener() -> None:
+    """Test that the messages with simple arguments are sent unformatted, and the others formatted like `QueueHandler`."""
+    records: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    handler = LazyQueueHandler(records)
+
+    board = {"moves": "e2e4", "wtime": 60000}
+    handler.handle(make_record("BOARD STATE: %s (%d moves)", LazyPformat(board), 1))
+    sent = records.get_nowait()
+    assert isinstance(sent.args, tuple) and isinstance(sent.args[0], LazyPformat)
+    board["moves"] = "e2e4 e7e5"  # The record keeps the board as it was logged.
+    assert sent.getMessage() == "BOARD STATE: {'moves': 'e2e4', 'wtime': 60000} (1 moves)"
+
+    handler.handle(make_record("Object: %s", object()))
+    sent = records.get_nowait()
+    assert sent.args is None and sent.msg.startswith("Object: <object object at")
+
+    try:
+        raise ValueError("no move")
+    except ValueError:
+        handler.handle(make_record("Error: %s", "move", level=logging.ERROR, exc_info=sys.exc_info()))
+    sent = records.get_nowait()
+    assert sent.exc_info is None and "ValueError: no move" in sent.msg
+
+
+def test_games_are_sampled() -> None:
+    """Test that the records are tagged with their game, and that only warnings and errors are kept for unsampled games."""
+    game_ids = [f"game{index:04d}" for index in range(2000)]
+    sampled = [game_id for game_id in game_ids if is_sampled(game_id, 0.1)]
+    assert 100 < len(sampled) < 300
+    assert sampled == [game_id for game_id in game_ids if is_sampled(game_id, 0.1)]
+    assert all(is_sampled(game_id, 1) for game_id in game_ids)
+
+    game_filter = GameFilter(0.1)
+    unsampled = next(game_id for game_id in game_ids if not is_sampled(game_id, 0.1))
+    token = current_game.set(unsampled)
+    try:
+        record = make_record("thinking")
+        assert not game_filter.filter(record)
+        assert getattr(record, "game") == unsampled
+        assert game_filter.filter(make_record("error", level=logging.ERROR))
+        current_game.set(sampled[0])
+        assert game_filter.filter(make_record("thinking"))
+    finally:
+        current_game.reset(token)
+    record = make_record("main loop")
+    assert game_filter.filter(record) and getattr(record, "game") is None
+
+
+def test_json_lines() -> None:
+    """Test that a record is written as one JSON object with its game."""
+    record = make_record("Move %s\nplayed", "e2e4")
+    record.game = "zzzzzzzz"
+    line = JsonLinesFormatter().format(record)
+    assert "\n" not in line
+    entry = json.loads(line)
+    assert entry["message"] == "Move e2e4\nplayed"
+    assert (entry["game"], entry["level"], entry["logger"], entry["line"]) == ("zzzzzzzz", "INFO", "homemade", 1)
+
+
+def test_transcripts_go_to_a_gzip_file(tmp_path: Any) -> None:
+    """Test that the transcripts are written to their gzip file instead of the other handlers."""
+    transcript_file = str(tmp_path / "transcripts.jsonl.gz")
+    transcript_logger = logging.getLogger(TRANSCRIPT_LOGGER)
+    route_transcripts(transcript_file, JsonLinesFormatter())
+    try:
+        assert not transcript_logger.propagate
+        transcript_logger.handle(make_record("AGGREGATOR: %s", "e2e4 " * 1000))
+    finally:
+        route_transcripts(None, JsonLinesFormatter())
+    assert transcript_logger.propagate and not transcript_logger.handlers
+
+    with gzip.open(transcript_file, "rt", encoding="utf-8") as transcripts:
+        entries = [json.loads(line) for line in transcripts]
+    assert [entry["message"] for entry in entries] == ["AGGREGATOR: " + "e2e4 " * 1000]
+
+
+def test_game_threads_know_their_game() -> None:
+    """Test that the calls of a game in the threads of the game runner are in the context of the game."""
+    async def play(game_id: str, executor: ThreadPoolExecutor) -> Optional[str]:
+        current_game.set(game_id)
+        game: Optional[str] = await lichess_bot.run_in_game_thread(executor, current_game.get)
+        return game
+
+    async def play_all() -> list[Optional[str]]:
+        with ThreadPoolExecutor(2) as executor:
+            return list(await asyncio.gather(*(play(f"game{index}", executor) for index in range(10))))
+
+    assert asyncio.run(play_all()) == [f"game{index}" for index in range(10)]
@@ -0,0 +1,106 @@
+"""Test the tablebases that stay open for the whole process."""
+import chess
+import chess.syzygy
+import pytest
+import traceback
+from types import SimpleNamespace
+from typing import cast
+from lib import engine_wrapper, model, tablebases
+from lib.config import Configuration
+from lib.tablebases import ProbeCache, TablebaseService
+
+
+class FakeSyzygy:
+    """A syzygy tablebase where black is mated sooner when the white queen is closer to h8."""
+
+    def __init__(self, directory: str) -> None:
+        """Count the directories and the probes."""
+        self.directories = [directory]
+        self.probes = 0
+
+    def add_directory(self, directory: str) -> None:
+        """Add a directory."""
+        self.directories.append(directory)
+
+    def probe_dtz(self, board: chess.Board) -> int:
+        """Get a DTZ that is smaller when the white queen is closer to h8."""
+        self.probes += 1
+        return -(2 + chess.square_distance(next(iter(board.pieces(chess.QUEEN, chess.WHITE))), chess.H8))
+
+    def probe_wdl(self, board: chess.Board) -> int:
+        """Black is always lost."""
+        self.probes += 1
+        return -2
+
+    def close(self) -> None:
+        """Nothing to close."""
+
+
+def test_probe_cache() -> None:
+    """Test that the results and the missing tables are remembered, and that the oldest results are dropped."""
+    cache = ProbeCache(max_entries=2)
+    probes: list[str] = []
+
+    def probe(board: chess.Board) -> int:
+        probes.append(board.fen())
+        if board.turn == chess.BLACK:
+            raise KeyError("table not found")
+        return len(probes)
+
+    white = chess.Board("8/8/8/8/8/8/k7/6RK w - - 0 1")
+    black = chess.Board("8/8/8/8/8/8/k7/6RK b - - 0 1")
+    assert cache.probe("dtz", "test", white, probe) == 1
+    assert cache.probe("dtz", "test", white, probe) == 1
+    for _ in range(2):
+        with pytest.raises(KeyError):
+            cache.probe("dtz", "test", black, probe)
+    assert len(probes) == 2
+    assert (cache.hits, cache.misses) == (2, 2)
+
+    # Other kinds and tablebases don't share results, and the least recently used result is dropped.
+    assert cache.probe("wdl", "test", white, probe) == 3
+    assert len(cache.results) == 2
+    assert cache.probe("dtz", "test", white, probe) == 4
+
+
+def test_missing_tables_do_not_grow_the_traceback() -> None:
+    """Test that each probe of a missing table raises a new exception, so the tracebacks of older probes are dropped."""
+    cache = ProbeCache()
+
+    def probe(board: chess.Board) -> int:
+        raise KeyError("table not found")
+
+    board = chess.Board("8/8/8/8/8/8/k7/6RK w - - 0 1")
+    depths = []
+    for _ in range(5):
+        with pytest.raises(KeyError, match="table not found") as error:
+            cache.probe("dtz", "test", board, probe)
+        depths.append(len(traceback.extract_tb(error.value.__traceback__)))
+    assert depths[1:] == [depths[1]] * 4
+    assert depths[0] >= depths[1]
+
+
+def test_get_syzygy_reuses_the_tablebase(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that get_syzygy opens the tablebase once and doesn't probe the same positions again."""
+    opened: list[FakeSyzygy] = []
+
+    def open_tablebase(directory: str) -> FakeSyzygy:
+        opened.append(FakeSyzygy(directory))
+        return opened[-1]
+
+    monkeypatch.setattr(chess.syzygy, "open_tablebase", open_tablebase)
+    monkeypatch.setattr(engine_wrapper, "tablebase_service", TablebaseService())
+    config = Configuration({"enabled": True, "paths": ["first", "second"], "max_pieces": 7, "move_quality": "best"})
+    game = cast(model.Game, SimpleNamespace(id="abcdefgh"))
+    board = chess.Board("Q7/8/8/4k3/8/8/8/4K3 w - - 0 1")
+
+    move, wdl = engine_wrapper.get_syzygy(board, game, config)
+    assert (move, wdl) == (chess.Move.from_uci("a8h8"), 2)
+    probes = opened[0].probes
+    assert probes == board.legal_moves.count()
+
+    assert engine_wrapper.get_syzygy(board, game, config) == (move, wdl)
+    assert len(opened) == 1
+    assert opened[0].directories == ["first", "second"]
+    assert opened[0].probes == probes
+    tablebases.tablebase_service.close()
@@ -0,0 +1 @@
+"""Command line tools for the bot. Run them from the lichess-bot directory with `python -m tools.<name>`."""
@@ -0,0 +1,309 @@
+"""
+Build a polyglot opening book from PGN files, such as the games the bot saves in its `pgn_directory`.
+
+Run from the lichess-bot directory:
+    python -m tools.build_book book.bin game_records/ [more.pgn ...] [--player BotName] [--max-plies 24] [--min-games 2]
+
+Every move of the first `--max-plies` plies is counted, with 2 points for a win and 1 for a draw of the side that played
+it, and the points become the weights of the book. With `--player`, only the moves of that player are counted, so the book
+follows the lines the bot has already played successfully. The book can then be used in `engine:polyglot:book`, and the
+engine (the LLM agents included) is not asked about these positions.
+
+The files are read in chunks by several processes. Each process counts the moves of its chunks in memory, and writes its
+counts to a sorted temporary file when it has more than `--max-positions` of them, so the memory used doesn't grow with
+the number of games. The temporary files are merged into the book at the end.
+"""
+import argparse
+import heapq
+import io
+import itertools
+import logging
+import os
+import struct
+import tempfile
+import chess
+import chess.pgn
+import chess.polyglot
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from multiprocessing import Pool
+from typing import Optional
+from lib.book import encode_move, write_sorted_book
+
+logger = logging.getLogger(__name__)
+
+RUN_STRUCT = struct.Struct(">QHII")
+"""A count in a temporary file: the key of the position, the move, the number of games and the points."""
+
+MAX_OPEN_RUNS = 256
+"""The number of temporary files merged at the same time."""
+
+MAX_WEIGHT = 0xFFFF
+POINTS = {"1-0": (2, 0), "0-1": (0, 2), "1/2-1/2": (1, 1)}
+"""The points of white and black for each result."""
+
+Chunk = tuple[str, int, int]
+"""A file and the byte range of whole games in it."""
+
+
+@dataclass(frozen=True)
+class BuildOptions:
+    """What to count."""
+
+    max_plies: int = 24
+    players: frozenset[str] = frozenset()
+    variant: str = "standard"
+    max_positions: int = 1_000_000
+
+
+def variant_name(headers: chess.pgn.Headers) -> str:
+    """Get the name of the variant of a game, as used in `engine:polyglot:book`."""
+    if headers.is_chess960():
+        return "chess960"
+    try:
+        uci_variant = headers.variant().uci_variant
+    except ValueError:
+        return "unknown"
+    return "standard" if uci_variant == "chess" else str(uci_variant)
+
+
+CountedGame = tuple[bool, list[tuple[int, int, int]]]
+"""Whether a game was counted, and the key, move and points of each of its counted moves."""
+
+
+class OpeningVisitor(chess.pgn.BaseVisitor[CountedGame]):
+    """Collect the opening moves of a game, without building the game tree."""
+
+    def __init__(self, options: BuildOptions) -> None:
+        """:param options: What to count."""
+        self.options = options
+        self.headers = chess.pgn.Headers()
+        self.moves: list[tuple[int, int, int]] = []
+        self.points = (0, 0)
+        self.plies = 0
+        self.counted = False
+
+    def begin_headers(self) -> chess.pgn.Headers:
+        """Keep the headers, so that `read_game` sets up the board from them."""
+        return self.headers
+
+    def visit_header(self, tagname: str, tagvalue: str) -> None:
+        """Store a header."""
+        self.headers[tagname] = tagvalue
+
+    def end_headers(self) -> Optional[chess.pgn.SkipType]:
+        """Skip the games with no result, of another variant or without the chosen players."""
+        players = {self.headers.get("White", "").lower(), self.headers.get("Black", "").lower()}
+        self.counted = (self.headers.get("Result") in POINTS
+                        and variant_name(self.headers) == self.options.variant
+                        and not (self.options.players and not self.options.players & players))
+        if not self.counted:
+            return chess.pgn.SKIP
+        self.points = POINTS[self.headers["Result"]]
+        return None
+
+    def begin_variation(self) -> Optional[chess.pgn.SkipType]:
+        """Only count the main line."""
+        return chess.pgn.SKIP
+
+    def visit_move(self, board: chess.Board, move: chess.Move) -> None:
+        """Count a move of the opening."""
+        self.plies += 1
+        if self.plies > self.options.max_plies:
+            return
+        player = self.headers.get("White" if board.turn == chess.WHITE else "Black", "").lower()
+        if not self.options.players or player in self.options.players:
+            points = self.points[0] if board.turn == chess.WHITE else self.points[1]
+            self.moves.append((chess.polyglot.zobrist_hash(board), encode_move(board, move), points))
+
+    def result(self) -> CountedGame:
+        """Get the counted moves."""
+        return self.counted, self.moves
+
+
+def pgn_files(paths: Iterable[str]) -> Iterator[str]:
+    """Get the PGN files, looking into the directories."""
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, filenames in sorted(os.walk(path)):
+                yield from (os.path.join(directory, filename) for filename in sorted(filenames)
+                            if filename.lower().endswith(".pgn"))
+        else:
+            yield path
+
+
+def game_boundary(pgn: io.BufferedReader, offset: int) -> int:
+    """Find the start of the first game at or after `offset`."""
+    if offset:
+        pgn.seek(offset - 1)
+        pgn.readline()  # The rest of a line that may have been cut.
+    while line := pgn.readline():
+        if line.startswith(b"[Event "):
+            return pgn.tell() - len(line)
+    return pgn.tell()
+
+
+def plan_chunks(paths: Iterable[str], chunk_size: int) -> list[list[Chunk]]:
+    """Split the files into tasks of about `chunk_size` bytes. Big files are cut between games, small ones are grouped."""
+    tasks: list[list[Chunk]] = []
+    task: list[Chunk] = []
+    task_size = 0
+    for path in pgn_files(paths):
+        size = os.path.getsize(path)
+        with open(path, "rb") as pgn:
+            cuts = sorted({0, size, *(game_boundary(pgn, offset) for offset in range(chunk_size, size, chunk_size))})
+        for start, end in zip(cuts, cuts[1:]):
+            task.append((path, start, end))
+            task_size += end - start
+            if task_size >= chunk_size:
+                tasks.append(task)
+                task, task_size = [], 0
+    if task:
+        tasks.append(task)
+    return tasks
+
+
+def spill(counts: dict[int, list[int]], directory: str) -> str:
+    """Write the counts to a temporary file, sorted by position and move, and forget them."""
+    with tempfile.NamedTemporaryFile("wb", dir=directory, suffix=".run", delete=False) as run:
+        for key_and_move in sorted(counts):
+            games, points = counts[key_and_move]
+            run.write(RUN_STRUCT.pack(key_and_move >> 16, key_and_move & 0xFFFF, games, points))
+    counts.clear()
+    return run.name
+
+
+def count_chunks(chunks: list[Chunk], options: BuildOptions, directory: str) -> tuple[int, list[str]]:
+    """
+    Count the opening moves of some chunks of PGN files.
+
+    :param chunks: The chunks.
+    :param options: What to count.
+    :param directory: Where to write the temporary files.
+    :return: The number of counted games and the temporary files with the counts.
+    """
+    counts: dict[int, list[int]] = {}
+    runs = []
+    games = 0
+    for path, start, end in chunks:
+        with open(path, "rb") as pgn_file:
+            pgn_file.seek(start)
+            pgn = io.StringIO(pgn_file.read(end - start).decode("utf-8", errors="replace"))
+        while (game := chess.pgn.read_game(pgn, Visitor=lambda: OpeningVisitor(options))) is not None:
+            counted, moves = game
+            if not counted:
+                continue
+            games += 1
+            for key, raw_move, points in moves:
+                count = counts.setdefault(key << 16 | raw_move, [0, 0])
+                count[0] += 1
+                count[1] += points
+            if len(counts) > options.max_positions:
+                runs.append(spill(counts, directory))
+    if counts:
+        runs.append(spill(counts, directory))
+    return games, runs
+
+
+def read_run(path: str) -> Iterator[tuple[int, int, int, int]]:
+    """Read the counts of a temporary file."""
+    with open(path, "rb") as run:
+        while record := run.read(RUN_STRUCT.size):
+            yield RUN_STRUCT.unpack(record)
+
+
+def merge_runs(runs: list[str]) -> Iterator[tuple[int, int, int, int]]:
+    """Merge the counts of temporary files, adding up the counts of the same move in the same position."""
+    merged = heapq.merge(*(read_run(run) for run in runs))
+    for (key, raw_move), move_counts in itertools.groupby(merged, key=lambda count: count[:2]):
+        games = points = 0
+        for count in move_counts:
+            games += count[2]
+            points += count[3]
+        yield key, raw_move, games, points
+
+
+def reduce_runs(runs: list[str], directory: str) -> list[str]:
+    """Merge the temporary files into fewer ones, until they can all be open at the same time."""
+    while len(runs) > MAX_OPEN_RUNS:
+        merged_runs = []
+        for start in range(0, len(runs), MAX_OPEN_RUNS):
+            group = runs[start:start + MAX_OPEN_RUNS]
+            with tempfile.NamedTemporaryFile("wb", dir=directory, suffix=".run", delete=False) as run:
+                for count in merge_runs(group):
+                    run.write(RUN_STRUCT.pack(*count))
+            for path in group:
+                os.remove(path)
+            merged_runs.append(run.name)
+        runs = merged_runs
+    return runs
+
+
+def book_entries(counts: Iterator[tuple[int, int, int, int]], min_games: int) -> Iterator[tuple[int, int, int, int]]:
+    """
+    Turn the counts, sorted by position, into the entries of the book.
+
+    The weights of the moves of a position are scaled down together if the points don't fit in the 16 bits of a weight.
+    Moves played in fewer than `min_games` games and moves that never scored are left out.
+    """
+    for key, position_counts in itertools.groupby(counts, key=lambda count: count[0]):
+        moves = [(raw_move, points) for _, raw_move, games, points in position_counts if games >= min_games and points]
+        most_points = max((points for _, points in moves), default=0)
+        scale = min(1.0, MAX_WEIGHT / most_points) if most_points else 1.0
+        for raw_move, points in moves:
+            weight = int(points * scale)
+            if weight:
+                yield key, raw_move, weight, 0
+
+
+def build_book(output: str, paths: list[str], options: BuildOptions, min_games: int = 1, processes: int = 1,
+               chunk_size: int = 64 * 1024 * 1024) -> tuple[int, int]:
+    """
+    Build a polyglot book from PGN files.
+
+    :param output: The book to write.
+    :param paths: The PGN files and the directories of PGN files.
+    :param options: What to count.
+    :param min_games: The number of games a move must have been played in to be in the book.
+    :param processes: The number of processes that read the files.
+    :param chunk_size: The number of bytes of PGN read by a process at a time.
+    :return: The number of counted games and the number of entries in the book.
+    """
+    with tempfile.TemporaryDirectory(prefix="book-", dir=os.path.dirname(os.path.abspath(output))) as directory:
+        tasks = [(chunks, options, directory) for chunks in plan_chunks(paths, chunk_size)]
+        if processes > 1:
+            with Pool(processes) as pool:
+                results = pool.starmap(count_chunks, tasks)
+        else:
+            results = list(itertools.starmap(count_chunks, tasks))
+        games = sum(task_games for task_games, _ in results)
+        runs = reduce_runs([run for _, task_runs in results for run in task_runs], directory)
+        entries = write_sorted_book(output, book_entries(merge_runs(runs), min_games))
+    return games, entries
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Build the book."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output", help="The polyglot book to write.")
+    parser.add_argument("pgn", nargs="+", help="The PGN files, or directories of PGN files, to read.")
+    parser.add_argument("--player", action="append", default=[], help="Only count the moves of this player (repeatable).")
+    parser.add_argument("--max-plies", type=int, default=24, help="Count the moves of the first n plies of each game.")
+    parser.add_argument("--min-games", type=int, default=1, help="Leave out moves played in fewer games.")
+    parser.add_argument("--variant", default="standard", help="Only read games of this variant, e.g. chess960.")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="The number of processes.")
+    parser.add_argument("--max-positions", type=int, default=1_000_000,
+                        help="The number of counts a process keeps in memory before writing them to a temporary file.")
+    parser.add_argument("--chunk-size", type=int, default=64, help="The megabytes of PGN a process reads at a time.")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    options = BuildOptions(args.max_plies, frozenset(player.lower() for player in args.player), args.variant,
+                           args.max_positions)
+    games, entries = build_book(args.output, args.pgn, options, args.min_games, args.processes,
+                                args.chunk_size * 1024 * 1024)
+    print(f"Wrote {entries} entries from {games} games to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Fill the cache of the online move sources with the positions of PGN files.
+
+Run from the lichess-bot directory:
+    python -m tools.warm_online_cache games.pgn [more.pgn ...] [--config config.yml] [--plies 20] [--delay 0.5]
+
+The enabled online opening books of `engine:online_moves` are asked about the first positions of every game, the same way
+they are asked during a game, and their answers are saved in `engine:online_moves:cache`. Positions that are already in
+the cache are not asked about again, so the tool can be stopped and started again.
+"""
+import argparse
+import logging
+import time
+import backoff
+import chess
+import chess.pgn
+import requests
+from collections.abc import Iterator
+from datetime import timedelta
+from http.client import RemoteDisconnected
+from requests.exceptions import ConnectionError, HTTPError, ReadTimeout
+from typing import Optional, Union, cast
+from lib import model
+from lib.config import Configuration, load_config
+from lib.engine_wrapper import (get_chessdb_move, get_lichess_cloud_move, get_opening_explorer_move, LICHESS_TYPE,
+                                ONLINE_SOURCE_TYPE)
+from lib.lichess import backoff_handler, is_final
+from lib.online_cache import OnlineCache, open_online_cache
+from lib.types import OnlineType
+
+logger = logging.getLogger(__name__)
+
+ONLINE_SOURCES: dict[str, ONLINE_SOURCE_TYPE] = {"chessdb_book": get_chessdb_move,
+                                                 "lichess_cloud_analysis": get_lichess_cloud_move,
+                                                 "lichess_opening_explorer": get_opening_explorer_move}
+
+
+class CacheWarmer:
+    """Ask the online move sources through the cache, without a lichess.org account."""
+
+    def __init__(self, max_retries: int, cache: OnlineCache) -> None:
+        """
+        Start a session for the online sources.
+
+        :param max_retries: The maximum amount of retries of a request.
+        :param cache: The cache to fill.
+        """
+        self.max_retries = max_retries
+        self.cache = cache
+        self.session = requests.Session()
+        self.session.headers.update({"User-Agent": "lichess-bot cache warm-up"})
+
+    def online_book_get(self, path: str, params: Optional[dict[str, Union[str, int]]] = None,
+                        stream: bool = False) -> OnlineType:
+        """Get the answer of an online source from the cache, or ask the source and save its answer."""
+        @backoff.on_exception(backoff.constant,
+                              (RemoteDisconnected, ConnectionError, HTTPError, ReadTimeout),
+                              max_time=60,
+                              max_tries=self.max_retries,
+                              interval=0.1,
+                              giveup=is_final,
+                              on_backoff=backoff_handler,
+                              backoff_log_level=logging.DEBUG,
+                              giveup_log_level=logging.DEBUG)
+        def online_book_get() -> OnlineType:
+            json_response: OnlineType = self.session.get(path, timeout=2, params=params, stream=stream).json()
+            return json_response
+
+        # Streamed answers (the opening explorer of a player) change with every game, so they aren't saved.
+        if stream:
+            return online_book_get()
+        return self.cache.fetch(path, params or {}, online_book_get)
+
+
+def warm_up_game() -> model.Game:
+    """Make a game with enough time on the clocks for every online source to be asked."""
+    ten_hours = 10 * 60 * 60 * 1000
+    return model.Game({"id": "warm-up", "variant": {"key": "standard", "name": "Standard", "short": "Std"},
+                       "createdAt": 0, "white": {"name": "warm-up"}, "black": {"name": "opponent"},
+                       "initialFen": "startpos",
+                       "state": {"type": "gameState", "moves": "", "wtime": ten_hours, "btime": ten_hours, "winc": 0,
+                                 "binc": 0, "status": "started"}},
+                      "warm-up", "https://lichess.org", timedelta(seconds=0))
+
+
+def opening_positions(pgn_paths: list[str], plies: int) -> Iterator[chess.Board]:
+    """Get each distinct position of the first `plies` moves of the games, with the moves that led to it."""
+    seen: set[str] = set()
+    for pgn_path in pgn_paths:
+        with open(pgn_path) as pgn:
+            while (game := chess.pgn.read_game(pgn)) is not None:
+                board = game.board()
+                for move in [*game.mainline_moves()][:plies]:
+                    if board.epd() not in seen:
+                        seen.add(board.epd())
+                        yield board.copy()
+                    board.push(move)
+
+
+def warm_up(li: CacheWarmer, boards: Iterator[chess.Board], online_moves_cfg: Configuration, delay: float) -> int:
+    """
+    Ask the enabled online opening books about the positions.
+
+    :param li: Sends the requests through the cache.
+    :param boards: The positions.
+    :param online_moves_cfg: The `online_moves` config.
+    :param delay: The number of seconds to wait after a position that needed a request, to be kind to the sites.
+    :return: The number of positions.
+    """
+    game = warm_up_game()
+    sources = [(ONLINE_SOURCES[name], online_moves_cfg.lookup(name)) for name in online_moves_cfg.priority
+               if online_moves_cfg.lookup(name).enabled]
+    count = 0
+    for count, board in enumerate(boards, start=1):
+        misses = li.cache.misses
+        for online_source, cfg in sources:
+            # The online sources only send their requests through `online_book_get`.
+            online_source(cast(LICHESS_TYPE, li), board, game, cfg)
+        if li.cache.misses > misses:
+            time.sleep(delay)
+        if count % 100 == 0:
+            logger.info(f"{count} positions, {li.cache.stats()}")
+    return count
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Fill the cache."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pgn", nargs="+", help="The PGN files with the games to take the positions from.")
+    parser.add_argument("--config", default="./config.yml", help="The config of the bot.")
+    parser.add_argument("--plies", type=int, default=20,
+                        help="Use the first n positions of each game. `online_moves:max_depth` is a further limit.")
+    parser.add_argument("--delay", type=float, default=0.5, help="Seconds to wait after each position that was asked.")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    config = load_config(args.config)
+    online_moves_cfg = config.engine.online_moves
+    cache_cfg = online_moves_cfg.cache
+    if not cache_cfg.path:
+        raise SystemExit("The cache is disabled: `engine:online_moves:cache:path` is empty.")
+    cache = open_online_cache(str(cache_cfg.path), int(cache_cfg.max_entries), cache_cfg.ttl.config if cache_cfg.ttl else None)
+    li = CacheWarmer(online_moves_cfg.max_retries, cache)
+    explorer_cfg = online_moves_cfg.lichess_opening_explorer
+    if explorer_cfg.enabled and explorer_cfg.source == "player":
+        logger.warning("The opening explorer of a player changes with every game, so its answers are not saved.")
+
+    # The books are asked about the positions where the bot is to move, up to and including its `max_depth`-th move.
+    plies = int(min(args.plies, online_moves_cfg.max_depth * 2))
+    count = warm_up(li, opening_positions(args.pgn, plies), online_moves_cfg, args.delay)
+    print(f"{count} positions, {cache.stats()}, {len(cache)} answers in {cache.path}")
+
+
+if __name__ == "__main__":
+    main()